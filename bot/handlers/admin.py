@@ -5,27 +5,41 @@ from aiogram.filters import Command
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import time, datetime
+from typing import Optional
 import re
 
 from db.models import Appointment, AppointmentStatus, Service, WorkSchedule, User
-from services.booking import cancel_booking
+from services.booking import cancel_booking, confirm_booking, complete_booking
 from services.admin import (
     get_all_services, toggle_service_active, create_service, 
     get_work_schedule, update_work_schedule_day, get_admins, set_admin_role,
-    delete_service, update_service, get_setting, set_setting
+    delete_service, update_service, get_setting, get_settings, set_setting,
+    get_schedule_overrides, set_schedule_override, delete_schedule_override
 )
 from services.booking import reschedule_booking, SlotOccupiedError
+from services.waitlist import notify_waitlist
+from services.send_queue import send_queue
+from services.identity import Identity, identity_cache
+from services.catalog import service_catalog
+from services import outbox
+from services.broadcast import create_campaign, start_campaign
+from services.reminders import REMINDER_STAGES_KEY, get_stages, parse_stages, stage_label
+from services.booking import (
+    PENDING_TIMEOUT_KEY, MIN_PENDING_TIMEOUT_MINUTES, MAX_PENDING_TIMEOUT_MINUTES,
+    get_pending_timeout, parse_pending_timeout
+)
 from bot.keyboards.admin import (
     admin_booking_action_kb, admin_menu_kb, admin_services_kb, 
     admin_service_edit_kb, admin_schedule_kb, admins_list_kb, admin_role_kb, manage_admin_kb,
-    admin_settings_kb, edit_info_kb, manual_services_kb
+    admin_settings_kb, edit_info_kb, manual_services_kb, admin_overrides_kb, broadcast_confirm_kb
 )
 from bot.keyboards.client import main_menu_kb
+from bot.handlers.common import BOOKING_CLOSED_TEXT
 from bot.states import AdminState
 from core.config import settings
-from utils.time import from_utc
+from utils.time import from_utc, get_today
 
-router = Router()
+router = Router(name="admin")
 
 # --- HANDLER: ISH VAQTINI O'ZGARTIRISH (SOAT) ---
 @router.callback_query(F.data.startswith("adm_sch_time_"))
@@ -45,7 +59,8 @@ async def admin_sch_time_edit(callback: CallbackQuery, state: FSMContext, sessio
 async def admin_sch_time_start(message: Message, state: FSMContext, session: AsyncSession):
     try:
         start_time = datetime.strptime(message.text.strip(), "%H:%M").time()
-        await state.update_data(edit_schedule_start=start_time)
+        # FSM ma'lumoti JSON sifatida saqlanadi
+        await state.update_data(edit_schedule_start=start_time.strftime("%H:%M"))
         await state.set_state(AdminState.edit_schedule_end)
         await message.answer("Tugash vaqtini kiriting (masalan, 18:00):")
     except Exception:
@@ -57,12 +72,11 @@ async def admin_sch_time_end(message: Message, state: FSMContext, session: Async
         end_time = datetime.strptime(message.text.strip(), "%H:%M").time()
         data = await state.get_data()
         weekday = data['edit_schedule_weekday']
-        start_time = data['edit_schedule_start']
+        start_time = datetime.strptime(data['edit_schedule_start'], "%H:%M").time()
         # Update schedule in DB
         # Get current day_off status
-        query = select(WorkSchedule).where(WorkSchedule.weekday == weekday)
-        res = await session.execute(query)
-        day = res.scalar_one_or_none()
+        days = await get_work_schedule(session)
+        day = next((d for d in days if d.weekday == weekday), None)
         is_day_off = day.is_day_off if day else False
         await update_work_schedule_day(session, weekday, is_day_off, start_time, end_time)
         await state.clear()
@@ -85,16 +99,15 @@ async def admin_edit_work_hours(callback: CallbackQuery, session: AsyncSession):
 async def slot_taken_admin(callback: CallbackQuery):
     await callback.answer("⚠️ Bu vaqt band bo'lib qoladi, iltimos boshqasini tanlang!", show_alert=True)
 
-async def ensure_admin_user(telegram_id: int, session: AsyncSession):
-    stmt = select(User).where(User.telegram_user_id == telegram_id)
-    res = await session.execute(stmt)
-    return res.scalar_one_or_none()
+async def ensure_admin_user(telegram_id: int, session: AsyncSession) -> Optional[Identity]:
+    # IdentityMiddleware allaqachon keshga yuklagan - qo'shimcha so'rov yo'q
+    return await identity_cache.get(session, telegram_id)
 
-def can_access_admin_panel(user: User) -> bool:
+def can_access_admin_panel(user: Identity) -> bool:
     if not user: return False
-    return user.is_superadmin or (user.admin_type is not None)
+    return user.is_admin
 
-def can_manage_admins(user: User) -> bool:
+def can_manage_admins(user: Identity) -> bool:
     # Superadmin only - requirement
     if not user: return False
     return user.is_superadmin
@@ -173,28 +186,18 @@ async def admin_confirm(callback: CallbackQuery, session: AsyncSession):
         return
 
     booking_id = int(callback.data.split("_")[2])
-    booking = await session.get(Appointment, booking_id)
-    
-    if booking:
-        booking.status = AppointmentStatus.CONFIRMED
-        if booking.payment_receipt_url:
-            booking.is_paid = True
-            booking.payment_confirmed_at = datetime.now()
-        await session.commit()
-        
-        success_txt = f"✅ Booking {booking_id} tasdiqlandi."
-        if callback.message.photo:
-            await callback.message.edit_caption(caption=success_txt)
-        else:
-            await callback.message.edit_text(success_txt)
-        
-        try:
-             user_q = await session.get(User, booking.user_id)
-             if user_q:
-                local_start = from_utc(booking.starts_at)
-                await callback.bot.send_message(user_q.telegram_user_id, f"✅ Sizning {local_start.strftime('%m-%d %H:%M')} vaqtidagi uchrashuvingiz tasdiqlandi!")
-        except:
-             pass
+    booking = await confirm_booking(session, booking_id, notify=lambda b: [outbox.to_user(
+        b.user_id, f"✅ Sizning {from_utc(b.starts_at).strftime('%m-%d %H:%M')} vaqtidagi uchrashuvingiz tasdiqlandi!"
+    )])
+    if booking is None:
+        await callback.answer(BOOKING_CLOSED_TEXT, show_alert=True)
+        return
+
+    success_txt = f"✅ Booking {booking_id} tasdiqlandi."
+    if callback.message.photo:
+        await callback.message.edit_caption(caption=success_txt)
+    else:
+        await callback.message.edit_text(success_txt)
 
 @router.callback_query(F.data.startswith("adm_complete_"))
 async def admin_complete(callback: CallbackQuery, session: AsyncSession):
@@ -202,27 +205,18 @@ async def admin_complete(callback: CallbackQuery, session: AsyncSession):
     if not can_access_admin_panel(user): return
 
     booking_id = int(callback.data.split("_")[2])
-    booking = await session.get(Appointment, booking_id)
-    
-    if booking:
-        booking.status = AppointmentStatus.COMPLETED
-        await session.commit()
-        
-        complete_txt = f"🏁 Booking {booking_id} tugallandi deb belgilandi."
-        if callback.message.photo:
-            await callback.message.edit_caption(caption=complete_txt)
-        else:
-            await callback.message.edit_text(complete_txt)
-        
-        try:
-             client = await session.get(User, booking.user_id)
-             if client:
-                await callback.bot.send_message(
-                    client.telegram_user_id, 
-                    f"✅ Buyurtmangiz yakunlandi. Tashrifingiz uchun rahmat! 😊"
-                )
-        except:
-             pass
+    booking = await complete_booking(session, booking_id, notify=lambda b: [outbox.to_user(
+        b.user_id, f"✅ Buyurtmangiz yakunlandi. Tashrifingiz uchun rahmat! 😊"
+    )])
+    if booking is None:
+        await callback.answer(BOOKING_CLOSED_TEXT, show_alert=True)
+        return
+
+    complete_txt = f"🏁 Booking {booking_id} tugallandi deb belgilandi."
+    if callback.message.photo:
+        await callback.message.edit_caption(caption=complete_txt)
+    else:
+        await callback.message.edit_text(complete_txt)
 
 @router.callback_query(F.data.startswith("adm_cancel_"))
 async def admin_cancel(callback: CallbackQuery, session: AsyncSession):
@@ -232,12 +226,20 @@ async def admin_cancel(callback: CallbackQuery, session: AsyncSession):
         return
 
     booking_id = int(callback.data.split("_")[2])
-    await cancel_booking(session, booking_id)
+    booking = await cancel_booking(session, booking_id, notify=lambda b: [outbox.to_user(
+        b.user_id, f"❌ Sizning {from_utc(b.starts_at).strftime('%m-%d %H:%M')} vaqtidagi bookingingiz admin tomonidan bekor qilindi."
+    )])
+    # Allaqachon yopilgan: mijozga xabar ham, navbatga taklif ham yuborilmaydi
+    if booking is None:
+        await callback.answer(BOOKING_CLOSED_TEXT, show_alert=True)
+        return
+
     cancel_txt = f"❌ Booking {booking_id} bekor qilindi."
     if callback.message.photo:
         await callback.message.edit_caption(caption=cancel_txt)
     else:
         await callback.message.edit_text(cancel_txt)
+    await notify_waitlist(session, booking.starts_at, booking.ends_at)
 
 # --- ADMIN RESCHEDULE ---
 @router.callback_query(F.data.startswith("adm_resched_"))
@@ -248,10 +250,14 @@ async def admin_resched_start(callback: CallbackQuery, state: FSMContext, sessio
         return
     
     b_id = int(callback.data.split("_")[2])
+    booking = await session.get(Appointment, b_id)
+    if not booking:
+        await callback.answer("Booking topilmadi.")
+        return
     await state.update_data(resched_booking_id=b_id)
     await state.set_state(AdminState.reschedule_date)
-    from bot.keyboards.client import dates_kb
-    await callback.message.answer("Mijoz uchun YANGI sana tanlang:", reply_markup=dates_kb())
+    from bot.keyboards.client import service_dates_kb
+    await callback.message.answer("Mijoz uchun YANGI sana tanlang:", reply_markup=await service_dates_kb(session, booking.service_id))
 
 @router.callback_query(AdminState.reschedule_date, F.data.startswith("date_"))
 async def admin_resched_date(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
@@ -289,23 +295,16 @@ async def admin_resched_time(callback: CallbackQuery, state: FSMContext, session
         datetime.strptime(date_str, "%Y-%m-%d").date(),
         datetime.strptime(time_str, "%H:%M").time()
     )
+    booking = await session.get(Appointment, b_id)
+    old_start, old_end = (booking.starts_at, booking.ends_at) if booking else (None, None)
     
     try:
-        await reschedule_booking(session, b_id, new_start)
+        await reschedule_booking(session, b_id, new_start, notify=lambda b: [outbox.to_user(
+            b.user_id, f"🔄 Sizning bookingingiz admin tomonidan quyidagi vaqtga ko'chirildi: {date_str} {time_str}"
+        )])
         await callback.message.edit_text(f"✅ Booking #{b_id} {date_str} {time_str}ga ko'chirildi")
         await state.clear()
-        
-        # Notify client
-        booking = await session.get(Appointment, b_id)
-        if booking:
-            client = await session.get(User, booking.user_id)
-            if client:
-                 try:
-                     await callback.bot.send_message(
-                         client.telegram_user_id, 
-                         f"🔄 Sizning bookingingiz admin tomonidan quyidagi vaqtga ko'chirildi: {date_str} {time_str}"
-                     )
-                 except: pass
+        await notify_waitlist(session, old_start, old_end)
     except SlotOccupiedError:
         await callback.answer("⚠️ Vaqt band!", show_alert=True)
     except Exception as e:
@@ -316,8 +315,8 @@ async def admin_resched_time(callback: CallbackQuery, state: FSMContext, session
 async def admin_services(message: Message, session: AsyncSession):
     user = await ensure_admin_user(message.from_user.id, session)
     if not can_access_admin_panel(user): return
-    services = await get_all_services(session)
-    await message.answer("Xizmatlarni boshqarish:", reply_markup=admin_services_kb(services))
+    kb = await service_catalog.markup(session, "admin_services", admin_services_kb)
+    await message.answer("Xizmatlarni boshqarish:", reply_markup=kb)
 
 @router.callback_query(F.data == "adm_srv_add")
 async def admin_srv_add_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
@@ -359,8 +358,8 @@ async def admin_srv_add_duration(message: Message, state: FSMContext, session: A
         await create_service(session, data['name'], data['price'], duration)
         await message.answer("✅ Xizmat yaratildi!")
         await state.clear()
-        services = await get_all_services(session)
-        await message.answer("Xizmatlarni boshqarish:", reply_markup=admin_services_kb(services))
+        kb = await service_catalog.markup(session, "admin_services", admin_services_kb)
+        await message.answer("Xizmatlarni boshqarish:", reply_markup=kb)
     except:
         await message.answer("Noto'g'ri davomiylik. Iltimos, daqiqalarda raqam kiriting.")
 
@@ -496,8 +495,8 @@ async def admin_srv_del(callback: CallbackQuery, session: AsyncSession):
         s_id = int(callback.data.split("_")[2])
         await delete_service(session, s_id)
         await callback.message.edit_text("Xizmat o'chirildi.")
-        services = await get_all_services(session)
-        await callback.message.answer("Xizmatlarni boshqarish:", reply_markup=admin_services_kb(services))
+        kb = await service_catalog.markup(session, "admin_services", admin_services_kb)
+        await callback.message.answer("Xizmatlarni boshqarish:", reply_markup=kb)
     except:
         await callback.answer("Xato")
 
@@ -505,8 +504,8 @@ async def admin_srv_del(callback: CallbackQuery, session: AsyncSession):
 async def admin_srv_back(callback: CallbackQuery, session: AsyncSession):
     user = await ensure_admin_user(callback.from_user.id, session)
     if not can_access_admin_panel(user): return
-    services = await get_all_services(session)
-    await callback.message.edit_text("Xizmatlarni boshqarish:", reply_markup=admin_services_kb(services))
+    kb = await service_catalog.markup(session, "admin_services", admin_services_kb)
+    await callback.message.edit_text("Xizmatlarni boshqarish:", reply_markup=kb)
 
 # --- SCHEDULE ---
 @router.message(F.text == "⏰ Jadval")
@@ -525,9 +524,8 @@ async def admin_sch_std_toggle(callback: CallbackQuery, session: AsyncSession):
         return
         
     weekday = int(callback.data.split("_")[3])
-    query = select(WorkSchedule).where(WorkSchedule.weekday == weekday)
-    res = await session.execute(query)
-    day = res.scalar_one_or_none()
+    days = await get_work_schedule(session)
+    day = next((d for d in days if d.weekday == weekday), None)
     
     is_off = not day.is_day_off if day else False # Toggle state
     # Requirement: Fix day IS NONE case (defaults 09-18)
@@ -539,6 +537,95 @@ async def admin_sch_std_toggle(callback: CallbackQuery, session: AsyncSession):
     days = await get_work_schedule(session)
     await callback.message.edit_reply_markup(reply_markup=admin_schedule_kb(days))
 
+# --- SCHEDULE OVERRIDES (bayram, qisqa kun) ---
+@router.callback_query(F.data == "adm_ovr_list")
+async def admin_overrides_list(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+    await state.clear()
+    overrides = await get_schedule_overrides(session, get_today())
+    await callback.message.edit_text(
+        "Istisno kunlar (bayram, qisqa kun, yopilish). O'chirish uchun bosing:",
+        reply_markup=admin_overrides_kb(overrides)
+    )
+
+@router.callback_query(F.data == "adm_ovr_add")
+async def admin_override_add_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+    await state.set_state(AdminState.add_override_date)
+    await callback.message.answer("Sanani kiriting (masalan, 2026-03-21):")
+    await callback.answer()
+
+@router.message(AdminState.add_override_date)
+async def admin_override_add_date(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
+    try:
+        day = datetime.strptime(message.text.strip(), "%Y-%m-%d").date()
+    except (ValueError, AttributeError):
+        await message.answer("Noto'g'ri format. Masalan: 2026-03-21")
+        return
+    if day < get_today():
+        await message.answer("O'tgan sana uchun istisno qo'shib bo'lmaydi.")
+        return
+    await state.update_data(override_day=day.isoformat())
+    await state.set_state(AdminState.add_override_hours)
+    await message.answer(
+        "Ish vaqtini kiriting:\n"
+        "• `dam` - kun yopiq\n"
+        "• `10:00-15:00` - qisqa kun\n"
+        "• `10:00-18:00 13:00-14:00` - tanaffus bilan",
+        parse_mode="Markdown"
+    )
+
+@router.message(AdminState.add_override_hours)
+async def admin_override_add_hours(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
+    text = (message.text or "").strip().lower()
+    data = await state.get_data()
+    day = datetime.strptime(data['override_day'], "%Y-%m-%d").date()
+
+    try:
+        if text == "dam":
+            await set_schedule_override(session, day, True)
+        else:
+            ranges = [
+                [datetime.strptime(t, "%H:%M").time() for t in part.split("-")]
+                for part in text.split()
+            ]
+            start, end = ranges[0]
+            break_start, break_end = ranges[1] if len(ranges) > 1 else (None, None)
+            if start >= end or (break_start and not start <= break_start < break_end <= end):
+                raise ValueError("Invalid range")
+            await set_schedule_override(session, day, False, start, end, break_start, break_end)
+    except ValueError:
+        await message.answer("Noto'g'ri format. Masalan: 10:00-15:00 yoki dam")
+        return
+
+    await state.clear()
+    overrides = await get_schedule_overrides(session, get_today())
+    await message.answer("✅ Istisno saqlandi.", reply_markup=admin_overrides_kb(overrides))
+
+@router.callback_query(F.data.startswith("adm_ovr_del_"))
+async def admin_override_delete(callback: CallbackQuery, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+    override_id = int(callback.data.split("_")[3])
+    await delete_schedule_override(session, override_id)
+    await callback.answer("Istisno o'chirildi")
+    overrides = await get_schedule_overrides(session, get_today())
+    await callback.message.edit_reply_markup(reply_markup=admin_overrides_kb(overrides))
+
 # --- ADMINS MANAGEMENT (SUPERADMIN ONLY) ---
 @router.message(F.text == "👥 Adminlar")
 async def admin_list_admins_cmd(message: Message, session: AsyncSession):
@@ -614,15 +701,11 @@ async def adm_revoke(callback: CallbackQuery, session: AsyncSession):
         await callback.message.edit_text(f"❌ {admin_user.first_name} admin huquqi bekor qilindi.")
         
         # Sobiq adminga xabar yuborish va klaviaturani mijoznikiga o'zgartirish
-        try:
-            from bot.keyboards.client import main_menu_kb
-            await callback.bot.send_message(
-                admin_user.telegram_user_id, 
-                "⚠️ Sizning adminlik huquqingiz bekor qilindi.",
-                reply_markup=main_menu_kb()
-            )
-        except:
-            pass
+        send_queue.send_message(
+            admin_user.telegram_user_id, 
+            "⚠️ Sizning adminlik huquqingiz bekor qilindi.",
+            reply_markup=main_menu_kb()
+        )
     else:
         await callback.answer("Foydalanuvchi topilmadi.")
     
@@ -639,9 +722,11 @@ async def admin_settings(message: Message, session: AsyncSession):
     user = await ensure_admin_user(message.from_user.id, session)
     if not can_access_admin_panel(user): return
     
-    dep_enabled = (await get_setting(session, "deposit_enabled", "false")) == "true"
-    card_num = await get_setting(session, "card_number", "Kiritilmagan")
-    channel = await get_setting(session, "portfolio_channel_id", "Kiritilmagan")
+    values = await get_settings(session, {
+        "deposit_enabled": "false", "card_number": "Kiritilmagan", "portfolio_channel_id": "Kiritilmagan"
+    })
+    dep_enabled = values["deposit_enabled"] == "true"
+    card_num, channel = values["card_number"], values["portfolio_channel_id"]
     
     msg = (
         f"⚙️ **Sozlamalar**\n\n"
@@ -652,20 +737,97 @@ async def admin_settings(message: Message, session: AsyncSession):
     await message.answer(msg, reply_markup=admin_settings_kb(dep_enabled), parse_mode="Markdown")
 
 @router.callback_query(F.data == "set_card_number")
-async def admin_set_card_start(callback: CallbackQuery, state: FSMContext):
+async def admin_set_card_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+
     await state.set_state(AdminState.edit_card_number)
     await callback.message.answer("Karta raqamini kiriting (masalan: 8600...):")
     await callback.answer()
 
 @router.message(AdminState.edit_card_number)
 async def admin_set_card_finish(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
     await set_setting(session, "card_number", message.text)
     await message.answer(f"✅ Karta raqami saqlandi: `{message.text}`", parse_mode="Markdown")
     await state.clear()
     await admin_settings(message, session)
 
+@router.callback_query(F.data == "set_reminder_stages")
+async def admin_set_reminders_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+
+    stages = await get_stages(session)
+    current = ", ".join(stage_label(m) for m in stages) or "o'chirilgan"
+    await state.set_state(AdminState.edit_reminder_stages)
+    await callback.message.answer(
+        f"Hozirgi eslatmalar: {current}\n\n"
+        "Navbatdan necha daqiqa oldin eslatilsin? Vergul bilan kiriting (masalan: 1440,120,15).\n"
+        "Eslatmalarni o'chirish uchun 0 yuboring."
+    )
+    await callback.answer()
+
+@router.message(AdminState.edit_reminder_stages)
+async def admin_set_reminders_finish(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
+    value = (message.text or "").strip()
+    stages = parse_stages(value)
+    if not stages and value != "0":
+        await message.answer("❌ Noto'g'ri format. Masalan: 1440,120,15")
+        return
+    await set_setting(session, REMINDER_STAGES_KEY, ",".join(map(str, stages)))
+    current = ", ".join(stage_label(m) for m in stages) or "o'chirilgan"
+    await message.answer(f"✅ Eslatmalar saqlandi: {current}\n(yangi tasdiqlangan bronlarga qo'llaniladi)")
+    await state.clear()
+    await admin_settings(message, session)
+
+@router.callback_query(F.data == "set_pending_timeout")
+async def admin_set_pending_timeout_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+
+    timeout = await get_pending_timeout(session)
+    await state.set_state(AdminState.edit_pending_timeout)
+    await callback.message.answer(
+        f"Hozir tasdiqlanmagan bronlar {stage_label(timeout)}dan keyin bekor qilinadi.\n"
+        "Yangi muddatni daqiqalarda kiriting (masalan: 120):"
+    )
+    await callback.answer()
+
+@router.message(AdminState.edit_pending_timeout)
+async def admin_set_pending_timeout_finish(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
+    minutes = parse_pending_timeout(message.text or "")
+    if minutes is None:
+        await message.answer(
+            f"❌ {MIN_PENDING_TIMEOUT_MINUTES} dan {MAX_PENDING_TIMEOUT_MINUTES} gacha butun son kiriting (daqiqa)."
+        )
+        return
+    await set_setting(session, PENDING_TIMEOUT_KEY, str(minutes))
+    await message.answer(f"✅ Tasdiqlash muddati saqlandi: {stage_label(minutes)}")
+    await state.clear()
+    await admin_settings(message, session)
+
 @router.callback_query(F.data == "toggle_deposit")
 async def admin_toggle_deposit(callback: CallbackQuery, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+
     current = (await get_setting(session, "deposit_enabled", "false")) == "true"
     new_val = "false" if current else "true"
     await set_setting(session, "deposit_enabled", new_val)
@@ -673,8 +835,8 @@ async def admin_toggle_deposit(callback: CallbackQuery, session: AsyncSession):
     await callback.answer(f"Depozit {'yoqildi' if new_val == 'true' else 'ochirildi'}")
     # Refresh settings view
     dep_enabled = new_val == "true"
-    card_num = await get_setting(session, "card_number", "Kiritilmagan")
-    channel = await get_setting(session, "portfolio_channel_id", "Kiritilmagan")
+    values = await get_settings(session, {"card_number": "Kiritilmagan", "portfolio_channel_id": "Kiritilmagan"})
+    card_num, channel = values["card_number"], values["portfolio_channel_id"]
     
     msg = (
         f"⚙️ **Sozlamalar**\n\n"
@@ -685,13 +847,21 @@ async def admin_toggle_deposit(callback: CallbackQuery, session: AsyncSession):
     await callback.message.edit_text(msg, reply_markup=admin_settings_kb(dep_enabled), parse_mode="Markdown")
 
 @router.callback_query(F.data == "set_portfolio_channel")
-async def admin_set_portfolio_start(callback: CallbackQuery, state: FSMContext):
+async def admin_set_portfolio_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+
     await state.set_state(AdminState.edit_portfolio_channel)
     await callback.message.answer("Portfolio kanali ID sini yoki xabarni ulashing (Forward):\nMasalan: -100123456789")
     await callback.answer()
 
 @router.message(AdminState.edit_portfolio_channel)
 async def admin_set_portfolio_finish(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
     channel_id = None
     if message.forward_from_chat:
         channel_id = str(message.forward_from_chat.id)
@@ -704,13 +874,21 @@ async def admin_set_portfolio_finish(message: Message, state: FSMContext, sessio
     await admin_settings(message, session)
 
 @router.callback_query(F.data == "set_portfolio_link")
-async def admin_set_portfolio_link_start(callback: CallbackQuery, state: FSMContext):
+async def admin_set_portfolio_link_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+
     await state.set_state(AdminState.edit_portfolio_link)
     await callback.message.answer("Portfolio kanali ommaviy linkini kiriting (masalan: https://t.me/kanal_nomi):")
     await callback.answer()
 
 @router.message(AdminState.edit_portfolio_link)
 async def admin_set_portfolio_link_finish(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
     link = message.text
     if not link.startswith("http"):
         link = f"https://t.me/{link.replace('@', '')}"
@@ -720,6 +898,52 @@ async def admin_set_portfolio_link_finish(message: Message, state: FSMContext, s
     await state.clear()
     await admin_settings(message, session)
 
+# --- BROADCAST ---
+@router.message(F.text == "📣 Xabar yuborish")
+async def admin_broadcast_start(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_manage_admins(user): return # Superadmin only
+
+    await state.set_state(AdminState.broadcast_text)
+    await message.answer("Barcha mijozlarga yuboriladigan xabar matnini kiriting:")
+
+@router.message(AdminState.broadcast_text, F.text)
+async def admin_broadcast_text(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_manage_admins(user): return
+
+    await state.update_data(broadcast_text=message.text)
+    await message.answer(f"📣 Xabar:\n\n{message.text}\n\nBarcha mijozlarga yuborilsinmi?", reply_markup=broadcast_confirm_kb())
+
+@router.callback_query(F.data == "adm_bc_send")
+async def admin_broadcast_send(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_manage_admins(user): return
+
+    data = await state.get_data()
+    text = data.get('broadcast_text')
+    await state.clear()
+    if not text:
+        await callback.answer("Sessiya xatosi.")
+        return
+
+    # Kampaniya tasdiqlash xabariga bog'langan: ikkinchi bosish yangisini yaratmaydi
+    campaign = await create_campaign(
+        session, text, callback.from_user.id, callback.message.chat.id, callback.message.message_id
+    )
+    if campaign is None:
+        await callback.answer("Xabar allaqachon yuborilmoqda.")
+        return
+
+    # Shu xabar kampaniya davomida holat bilan yangilanib turadi
+    await callback.message.edit_text("📣 Xabar yuborilmoqda...")
+    start_campaign(callback.bot, campaign.id)
+
+@router.callback_query(F.data == "adm_bc_cancel")
+async def admin_broadcast_cancel(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_text("❌ Xabar yuborish bekor qilindi.")
+
 # --- STATISTICS ---
 @router.message(F.text == "📊 Statistika")
 async def admin_statistics(message: Message, session: AsyncSession):
@@ -760,7 +984,12 @@ async def admin_edit_info_menu(callback: CallbackQuery, session: AsyncSession):
     await callback.message.edit_text("Qaysi ma'lumotni o'zgartirmoqchisiz?", reply_markup=edit_info_kb())
 
 @router.callback_query(F.data.startswith("set_inf_"))
-async def admin_set_info_start(callback: CallbackQuery, state: FSMContext):
+async def admin_set_info_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(callback.from_user.id, session)
+    if not can_access_admin_panel(user): 
+        await callback.answer("Kirish rad etildi", show_alert=True)
+        return
+
     field = callback.data.split("_")[2]
     states = {
         "name": (AdminState.edit_barber_name, "Sartarosh ismini kiriting:"),
@@ -775,6 +1004,9 @@ async def admin_set_info_start(callback: CallbackQuery, state: FSMContext):
 
 @router.message(AdminState.edit_barber_name)
 async def admin_save_barber_name(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
     await set_setting(session, "barber_name", message.text)
     await message.answer(f"✅ Ism saqlandi: {message.text}")
     await state.clear()
@@ -782,6 +1014,9 @@ async def admin_save_barber_name(message: Message, state: FSMContext, session: A
 
 @router.message(AdminState.edit_barber_phone)
 async def admin_save_barber_phone(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
     await set_setting(session, "barber_phone", message.text)
     await message.answer(f"✅ Telefon saqlandi: {message.text}")
     await state.clear()
@@ -789,6 +1024,9 @@ async def admin_save_barber_phone(message: Message, state: FSMContext, session:
 
 @router.message(AdminState.edit_barber_address)
 async def admin_save_barber_address(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
     await set_setting(session, "barber_address", message.text)
     await message.answer(f"✅ Manzil saqlandi: {message.text}")
     await state.clear()
@@ -796,6 +1034,9 @@ async def admin_save_barber_address(message: Message, state: FSMContext, session
 
 @router.message(AdminState.edit_barber_location)
 async def admin_save_barber_location(message: Message, state: FSMContext, session: AsyncSession):
+    user = await ensure_admin_user(message.from_user.id, session)
+    if not can_access_admin_panel(user): return
+
     loc_val = None
     if message.location:
         # Convert location pin to a Google Maps link
@@ -820,21 +1061,22 @@ async def admin_manual_booking_start(message: Message, session: AsyncSession, st
     user = await ensure_admin_user(message.from_user.id, session)
     if not can_access_admin_panel(user): return
     
-    services = await get_all_services(session)
+    services = await get_all_services(session, only_active=True)
     if not services:
         await message.answer("Xizmatlar topilmadi.")
         return
     
     await state.set_state(AdminState.manual_booking_service)
-    await message.answer("Xizmatni tanlang (Manual):", reply_markup=manual_services_kb(services))
+    kb = await service_catalog.markup(session, "manual_services", manual_services_kb)
+    await message.answer("Xizmatni tanlang (Manual):", reply_markup=kb)
 
 @router.callback_query(AdminState.manual_booking_service, F.data.startswith("man_srv_"))
 async def admin_manual_service_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     s_id = int(callback.data.split("_")[2])
     await state.update_data(service_id=s_id)
     await state.set_state(AdminState.manual_booking_date)
-    from bot.keyboards.client import dates_kb
-    await callback.message.edit_text("Sana tanlang (Manual):", reply_markup=dates_kb())
+    from bot.keyboards.client import service_dates_kb
+    await callback.message.edit_text("Sana tanlang (Manual):", reply_markup=await service_dates_kb(session, s_id))
 
 @router.callback_query(AdminState.manual_booking_date, F.data.startswith("date_"))
 async def admin_manual_date_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
@@ -851,12 +1093,13 @@ async def admin_manual_date_selected(callback: CallbackQuery, state: FSMContext,
 @router.callback_query(AdminState.manual_booking_time, F.data.startswith("time_"))
 async def admin_manual_time_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     parts = callback.data.split("_")
+    date_str = parts[1]
     time_str = parts[2]
     data = await state.get_data()
     
     from services.booking import create_booking
     
-    d = datetime.strptime(data['selected_date'], "%Y-%m-%d").date()
+    d = datetime.strptime(date_str, "%Y-%m-%d").date()
     t = datetime.strptime(time_str, "%H:%M").time()
     start_dt = datetime.combine(d, t)
     
@@ -870,11 +1113,10 @@ async def admin_manual_time_selected(callback: CallbackQuery, state: FSMContext,
             start_time=start_dt,
             customer_phone="Noma'lum",
             customer_name="Offline Mijoz",
-            created_by="admin"
+            created_by="admin",
+            status=AppointmentStatus.CONFIRMED
         )
-        booking.status = AppointmentStatus.CONFIRMED
-        await session.commit()
-        await callback.message.edit_text(f"✅ Offline booking muvaffaqiyatli saqlandi!\nVaqt: {data['selected_date']} {time_str}\nID: #{booking.id}")
+        await callback.message.edit_text(f"✅ Offline booking muvaffaqiyatli saqlandi!\nVaqt: {date_str} {time_str}\nID: #{booking.id}")
     except Exception as e:
         await callback.message.edit_text(f"❌ Xato: {str(e)}")
     
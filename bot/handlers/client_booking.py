@@ -4,28 +4,86 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from bot.states import BookingState
-from bot.keyboards.client import services_kb, dates_kb, slots_kb, confirm_kb, phone_req_kb, main_menu_kb
+from bot.states import BookingState, AdminState
+from bot.keyboards.client import services_kb, dates_kb, service_dates_kb, slots_kb, nearest_slots_kb, confirm_kb, phone_req_kb, main_menu_kb, waitlist_windows_kb
 from services.admin import get_all_services, get_setting
-from services.schedule import get_slots
-from services.booking import create_booking, SlotOccupiedError, get_user_bookings
-from db.models import User, Service, Appointment, AppointmentStatus
-from sqlalchemy import select
+from services.catalog import service_catalog
+from services.schedule import get_slots, find_next_available
+from services.booking import create_booking, SlotOccupiedError, get_user_bookings, place_hold, release_holds
+from services.waitlist import add_to_waitlist, close_waitlist_entry
+from services import outbox
+from services.send_queue import send_queue
+from db.models import Appointment, AppointmentStatus, WaitlistEntry
+from typing import Optional
+from services.identity import Identity
+from bot.handlers.common import NOT_REGISTERED_TEXT
 
-router = Router()
+router = Router(name="client_booking")
 
 @router.callback_query(F.data.startswith("taken_"))
 async def slot_taken(callback: CallbackQuery):
     await callback.answer("⚠️ Bu vaqt band, iltimos boshqasini tanlang!", show_alert=True)
 
+@router.callback_query(BookingState.selecting_date, F.data.startswith("dayfull_"))
+async def day_full_waitlist(callback: CallbackQuery):
+    selected_date = date.fromisoformat(callback.data.split("_")[1])
+    await callback.message.edit_text(
+        "Bu sana to'la. Kutish ro'yxatiga yozilasizmi? Vaqt bo'shasa xabar beramiz.\nQulay vaqt oralig'ini tanlang:",
+        reply_markup=waitlist_windows_kb(selected_date)
+    )
+
+@router.callback_query(BookingState.selecting_date, F.data.startswith("wladd_"))
+async def waitlist_add(callback: CallbackQuery, state: FSMContext, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await callback.answer(NOT_REGISTERED_TEXT, show_alert=True)
+        return
+    _, date_str, start_str, end_str = callback.data.split("_")
+    data = await state.get_data()
+
+    await add_to_waitlist(
+        session, identity.id, data['service_id'], date.fromisoformat(date_str),
+        time.fromisoformat(start_str), time.fromisoformat(end_str)
+    )
+    await state.clear()
+    await callback.message.edit_text(f"📋 Siz {date_str} ({start_str}-{end_str}) uchun kutish ro'yxatiga yozildingiz.")
+
+@router.callback_query(F.data.startswith("wlbook_"))
+async def waitlist_book(callback: CallbackQuery, state: FSMContext, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await callback.answer(NOT_REGISTERED_TEXT, show_alert=True)
+        return
+    _, entry_id, time_str = callback.data.split("_")
+    entry = await session.get(WaitlistEntry, int(entry_id))
+    if not entry or entry.user_id != identity.id or not entry.is_active:
+        await callback.answer("Bu taklif endi amal qilmaydi.", show_alert=True)
+        return
+
+    start_dt = datetime.combine(entry.day, time.fromisoformat(time_str))
+    hold = await place_hold(session, callback.from_user.id, entry.service_id, start_dt)
+    if hold is None:
+        await callback.answer("⚠️ Afsuski, bu vaqtni boshqa mijoz band qildi.", show_alert=True)
+        return
+
+    await state.clear()
+    await state.update_data(
+        service_id=entry.service_id,
+        selected_date=entry.day.isoformat(),
+        selected_time=time_str,
+        waitlist_entry_id=entry.id,
+        hold_barber_id=hold.barber_id
+    )
+    await state.set_state(BookingState.confirming)
+    await callback.message.answer("Iltimos, identifikatsiyangizni tasdiqlash uchun telefon raqamingizni ulashing:", reply_markup=phone_req_kb())
+
+@router.callback_query(F.data.startswith("dayfull_"))
+async def day_full(callback: CallbackQuery):
+    await callback.answer("Bu sana uchun vaqt mavjud emas", show_alert=True)
+
 @router.message(F.text == "✂️ Band qilish")
-async def start_booking(message: Message, session: AsyncSession, state: FSMContext):
+async def start_booking(message: Message, session: AsyncSession, state: FSMContext, identity: Optional[Identity]):
     # Check for existing active bookings
-    user_stmt = select(User).where(User.telegram_user_id == message.from_user.id)
-    user = (await session.execute(user_stmt)).scalar_one_or_none()
-    
-    if user:
-        active_bookings = await get_user_bookings(session, user.id)
+    if identity:
+        active_bookings = await get_user_bookings(session, identity.id)
         if active_bookings:
             phone = await get_setting(session, "barber_phone", "+998 90 123 45 67")
             await message.answer(
@@ -35,31 +93,37 @@ async def start_booking(message: Message, session: AsyncSession, state: FSMConte
             )
             return
 
-    services = await get_all_services(session)
+    # Faqat faol xizmatlar; ro'yxat va klaviatura katalog keshidan
+    services = await get_all_services(session, only_active=True)
     if not services:
         await message.answer("Hozirda hech qanday xizmat mavjud emas. Iltimos, keyinroq qayta urinib ko'ring.")
         return
     
     await state.set_state(BookingState.selecting_service)
-    await message.answer("Xizmatni tanlang:", reply_markup=services_kb(services))
+    kb = await service_catalog.markup(session, "client_services", services_kb)
+    await message.answer("Xizmatni tanlang:", reply_markup=kb)
 
 @router.callback_query(F.data == "back_main")
-async def back_main(callback: CallbackQuery, state: FSMContext):
+async def back_main(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    await release_holds(session, callback.from_user.id)
     await state.clear()
     await callback.message.delete()
     await callback.message.answer("🏠 Asosiy menyu", reply_markup=main_menu_kb())
 
 @router.callback_query(F.data == "back_date")
-async def back_date(callback: CallbackQuery, state: FSMContext):
+async def back_date(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    await release_holds(session, callback.from_user.id)
     await state.set_state(BookingState.selecting_date)
-    await callback.message.edit_text("Sana tanlang:", reply_markup=dates_kb())
+    data = await state.get_data()
+    kb = await service_dates_kb(session, data['service_id']) if 'service_id' in data else dates_kb()
+    await callback.message.edit_text("Sana tanlang:", reply_markup=kb)
 
 @router.callback_query(BookingState.selecting_service, F.data.startswith("srv_"))
 async def service_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     service_id = int(callback.data.split("_")[1])
     await state.update_data(service_id=service_id)
     await state.set_state(BookingState.selecting_date)
-    await callback.message.edit_text("Sana tanlang:", reply_markup=dates_kb())
+    await callback.message.edit_text("Sana tanlang:", reply_markup=await service_dates_kb(session, service_id))
 
 @router.callback_query(BookingState.selecting_date, F.data.startswith("date_"))
 async def date_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
@@ -78,12 +142,54 @@ async def date_selected(callback: CallbackQuery, state: FSMContext, session: Asy
     await state.set_state(BookingState.selecting_time)
     await callback.message.edit_text(f"Vaqt tanlang {date_str}:", reply_markup=slots_kb(slots, selected_date))
 
+# Sana tanlash holatidan vaqt tanlash holatiga (mijoz, ko'chirish va admin oqimlari)
+NEAREST_NEXT_STATE = {
+    BookingState.selecting_date.state: BookingState.selecting_time,
+    BookingState.rescheduling_date.state: BookingState.rescheduling_time,
+    AdminState.reschedule_date.state: AdminState.reschedule_time,
+    AdminState.manual_booking_date.state: AdminState.manual_booking_time,
+}
+
+@router.callback_query(F.data == "nearest")
+async def nearest_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    current = await state.get_state()
+    if current not in NEAREST_NEXT_STATE:
+        await callback.answer()
+        return
+
+    data = await state.get_data()
+    if 'resched_booking_id' in data and current != BookingState.selecting_date.state:
+        booking = await session.get(Appointment, data['resched_booking_id'])
+        service_id = booking.service_id if booking else None
+    else:
+        service_id = data.get('service_id')
+
+    slots = await find_next_available(session, service_id, limit=8) if service_id else []
+    if not slots:
+        await callback.answer("Yaqin kunlarda bo'sh vaqt topilmadi", show_alert=True)
+        return
+
+    await state.set_state(NEAREST_NEXT_STATE[current])
+    await callback.message.edit_text("⚡ Eng yaqin bo'sh vaqtlar:", reply_markup=nearest_slots_kb(slots))
+
 @router.callback_query(BookingState.selecting_time, F.data.startswith("time_"))
-async def time_selected(callback: CallbackQuery, state: FSMContext):
+async def time_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     parts = callback.data.split("_")
     date_str = parts[1]
     time_str = parts[2]
-    await state.update_data(selected_date=date_str, selected_time=time_str)
+    data = await state.get_data()
+    selected_date = date.fromisoformat(date_str)
+    start_dt = datetime.combine(selected_date, time.fromisoformat(time_str))
+
+    # Telefon va tasdiqlash vaqtida slot boshqaga o'tib ketmasligi uchun
+    hold = await place_hold(session, callback.from_user.id, data['service_id'], start_dt)
+    if hold is None:
+        await callback.answer("⚠️ Bu vaqt band, iltimos boshqasini tanlang!", show_alert=True)
+        slots = await get_slots(session, data['service_id'], selected_date)
+        await callback.message.edit_text(f"Vaqt tanlang {date_str}:", reply_markup=slots_kb(slots, selected_date))
+        return
+
+    await state.update_data(selected_date=date_str, selected_time=time_str, hold_barber_id=hold.barber_id)
     await state.set_state(BookingState.confirming)
     await callback.message.delete()
     await callback.message.answer("Iltimos, identifikatsiyangizni tasdiqlash uchun telefon raqamingizni ulashing:", reply_markup=phone_req_kb())
@@ -98,7 +204,7 @@ async def phone_shared(message: Message, state: FSMContext, session: AsyncSessio
     await state.update_data(phone=phone)
     data = await state.get_data()
     service_id = data['service_id']
-    service = await session.get(Service, service_id)
+    service = await service_catalog.get(session, service_id)
     
     summary = (
         f"📝 **Bookingni tasdiqlang**\n"
@@ -110,11 +216,16 @@ async def phone_shared(message: Message, state: FSMContext, session: AsyncSessio
     await message.answer(summary, parse_mode="Markdown", reply_markup=confirm_kb())
 
 @router.callback_query(BookingState.confirming, F.data == "confirm_booking")
-async def finalize_booking(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def finalize_booking(callback: CallbackQuery, state: FSMContext, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await callback.answer(NOT_REGISTERED_TEXT, show_alert=True)
+        return
     data = await state.get_data()
-    service = await session.get(Service, data['service_id'])
+    service = await service_catalog.get(session, data['service_id'])
     
     deposit_enabled = (await get_setting(session, "deposit_enabled", "false")) == "true"
+    # Tasdiqlash xabari bir xil - takroriy bosishlar bir xil kalit beradi
+    await state.update_data(confirm_message_id=callback.message.message_id)
     
     if deposit_enabled:
         card_num = await get_setting(session, "card_number", "Kiritilmagan")
@@ -130,28 +241,52 @@ async def finalize_booking(callback: CallbackQuery, state: FSMContext, session:
         await callback.message.edit_text(msg, parse_mode="Markdown")
         await state.set_state(BookingState.paying)
     else:
-        await process_final_booking(callback, state, session)
+        await process_final_booking(callback, state, session, identity)
 
 @router.message(BookingState.paying, F.photo)
-async def receipt_received(message: Message, state: FSMContext, session: AsyncSession):
+async def receipt_received(message: Message, state: FSMContext, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await message.answer(NOT_REGISTERED_TEXT)
+        return
     photo = message.photo[-1].file_id
     await state.update_data(payment_receipt_url=photo)
-    await process_final_booking(message, state, session)
+    await process_final_booking(message, state, session, identity)
 
-async def process_final_booking(event, state: FSMContext, session: AsyncSession):
+def booking_idempotency_key(telegram_user_id: int, data: dict) -> str:
+    return f"tg:{telegram_user_id}:{data['confirm_message_id']}:{data['service_id']}:{data['selected_date']}:{data['selected_time']}"
+
+async def process_final_booking(event, state: FSMContext, session: AsyncSession, user: Identity):
     data = await state.get_data()
     d = date.fromisoformat(data['selected_date'])
     t = time.fromisoformat(data['selected_time'])
     start_dt = datetime.combine(d, t)
     
     user_id = event.from_user.id
-    stmt = select(User).where(User.telegram_user_id == user_id)
-    user = (await session.execute(stmt)).scalar_one()
 
     is_callback = isinstance(event, CallbackQuery)
-    bot = event.bot
     chat_id = event.message.chat.id if is_callback else event.chat.id
 
+    from bot.keyboards.admin import admin_booking_action_kb
+    msg_text = (
+        f"🆕 **Yangi Booking So'rovi**\n"
+        f"Mijoz: {user.first_name} (@{user.username})\n"
+        f"Telefon: {data['phone']}\n"
+        f"Vaqt: {data['selected_date']} {data['selected_time']}\n"
+        f"To'lov: {f'{data.get('payment_amount'):,.0f} so\'m' if 'payment_amount' in data else 'Yo\'q'}"
+    )
+
+    # Adminlarga xabar bron bilan bitta tranzaksiyada outboxga yoziladi
+    def admin_notices(result):
+        action_kb = admin_booking_action_kb(result.id, AppointmentStatus.PENDING.value)
+        for admin_id in result.admin_ids:
+            if 'payment_receipt_url' in data:
+                yield outbox.photo(
+                    admin_id, data['payment_receipt_url'],
+                    caption=msg_text, parse_mode="Markdown", reply_markup=action_kb
+                )
+            else:
+                yield outbox.message(admin_id, msg_text, parse_mode="Markdown", reply_markup=action_kb)
+
     try:
         booking = await create_booking(
             session=session,
@@ -159,14 +294,23 @@ async def process_final_booking(event, state: FSMContext, session: AsyncSession)
             service_id=data['service_id'],
             start_time=start_dt,
             customer_phone=data['phone'],
-            customer_name=user.first_name
+            customer_name=user.first_name,
+            holder_telegram_id=user_id,
+            idempotency_key=booking_idempotency_key(user_id, data),
+            preferred_barber_id=data.get('hold_barber_id'),
+            payment_amount=data.get('payment_amount'),
+            payment_receipt_url=data.get('payment_receipt_url'),
+            notify=admin_notices
         )
-        
-        if 'payment_amount' in data:
-            booking.payment_amount = data['payment_amount']
-            booking.payment_receipt_url = data.get('payment_receipt_url')
 
-        await session.commit()
+        # Takroriy bosish yoki qayta yetkazilgan update - bron allaqachon yaratilgan
+        if booking.replayed:
+            if is_callback:
+                await event.answer("✅ Booking allaqachon qabul qilingan.")
+            return
+
+        if 'waitlist_entry_id' in data:
+            await close_waitlist_entry(session, data['waitlist_entry_id'], user.id)
         
         success_msg = "✅ Booking so'rovi qabul qilindi! Admin tasdiqlashini kuting."
         if is_callback:
@@ -174,7 +318,7 @@ async def process_final_booking(event, state: FSMContext, session: AsyncSession)
         else:
             await event.answer(success_msg)
 
-        service = await session.get(Service, data['service_id'])
+        service = booking.service
         check_text = (
             f"🎫 **ELEKTRON CHEK**\n"
             f"------------------\n"
@@ -187,45 +331,20 @@ async def process_final_booking(event, state: FSMContext, session: AsyncSession)
             f"------------------\n"
             f"Sartaroshga borganda ushbu chekni ko'rsating."
         )
-        await bot.send_message(chat_id, check_text, parse_mode="Markdown")
-        await bot.send_message(chat_id, "🏠 Asosiy menyu", reply_markup=main_menu_kb())
+        # Chek va menyu navbat orqali - handler Telegram limitlarini kutib qolmaydi
+        send_queue.send_message(chat_id, check_text, parse_mode="Markdown")
+        send_queue.send_message(chat_id, "🏠 Asosiy menyu", reply_markup=main_menu_kb())
         await state.clear()
-        
-        from bot.keyboards.admin import admin_booking_action_kb
-        msg_text = (
-            f"🆕 **Yangi Booking So'rovi**\n"
-            f"Mijoz: {user.first_name} (@{user.username})\n"
-            f"Telefon: {data['phone']}\n"
-            f"Vaqt: {data['selected_date']} {data['selected_time']}\n"
-            f"To'lov: {f'{data.get('payment_amount'):,.0f} so\'m' if 'payment_amount' in data else 'Yo\'q'}"
-        )
-        
-        admin_query = select(User.telegram_user_id).where((User.is_superadmin == True) | (User.admin_type.is_not(None)))
-        res = await session.execute(admin_query)
-        admin_ids = res.scalars().all()
-        for admin_id in admin_ids:
-            try:
-                if 'payment_receipt_url' in data:
-                    await bot.send_photo(
-                        admin_id, photo=data['payment_receipt_url'], 
-                        caption=msg_text, parse_mode="Markdown", 
-                        reply_markup=admin_booking_action_kb(booking.id, AppointmentStatus.PENDING.value)
-                    )
-                else:
-                    await bot.send_message(
-                        admin_id, msg_text, parse_mode="Markdown", 
-                        reply_markup=admin_booking_action_kb(booking.id, AppointmentStatus.PENDING.value)
-                    )
-            except: pass
 
     except SlotOccupiedError:
         err_msg = "⚠️ Slot allaqachon band!"
+        kb = await service_dates_kb(session, data['service_id'])
         if is_callback:
             await event.answer(err_msg, show_alert=True)
-            await event.message.edit_text("Bu slot allaqachon band. Sana tanlang:", reply_markup=dates_kb())
+            await event.message.edit_text("Bu slot allaqachon band. Sana tanlang:", reply_markup=kb)
         else:
             await event.answer(err_msg)
-            await event.answer("Bu slot allaqachon band. Sana tanlang:", reply_markup=dates_kb())
+            await event.answer("Bu slot allaqachon band. Sana tanlang:", reply_markup=kb)
         await state.set_state(BookingState.selecting_date)
     except Exception as e:
         final_err = f"Yakunlash xatosi: {str(e)}"
@@ -1,34 +1,36 @@
-
 # bot/handlers/client_my_bookings.py
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from db.models import User, Appointment
+from typing import Optional
+from db.models import Appointment
 from services.booking import get_user_bookings, cancel_booking as cancel_booking_service, reschedule_booking, SlotOccupiedError
 from services.schedule import get_slots
-from bot.keyboards.client import dates_kb, slots_kb
+from services.waitlist import notify_waitlist
+from services.admin import get_admin_telegram_ids
+from services import outbox
+from services.identity import Identity
+from bot.handlers.common import BOOKING_CLOSED_TEXT, NOT_REGISTERED_TEXT
+from bot.keyboards.client import service_dates_kb, slots_kb
 from bot.states import BookingState
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from datetime import date, time as time_type, datetime
 from utils.time import from_utc
 
-router = Router()
+router = Router(name="client_my_bookings")
 
 @router.callback_query(F.data.startswith("taken_"))
 async def slot_taken_my(callback: CallbackQuery):
     await callback.answer("⚠️ Bu vaqt band, iltimos boshqasini tanlang!", show_alert=True)
 
 @router.message(F.text == "📅 Mening buyurtmalarim")
-async def my_bookings(message: Message, session: AsyncSession):
-    stmt = select(User).where(User.telegram_user_id == message.from_user.id)
-    user = (await session.execute(stmt)).scalar_one_or_none()
-    
-    if not user:
+async def my_bookings(message: Message, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await message.answer(NOT_REGISTERED_TEXT)
         return
     
-    bookings = await get_user_bookings(session, user.id)
+    bookings = await get_user_bookings(session, identity.id)
     
     if not bookings:
         await message.answer("Sizda kelgusi buyurtmalar yo'q.")
@@ -53,7 +55,10 @@ async def my_bookings(message: Message, session: AsyncSession):
         await message.answer(text, parse_mode="Markdown", reply_markup=builder.as_markup())
 
 @router.callback_query(F.data.startswith("cancel_me_"))
-async def cancel_my_booking(callback: CallbackQuery, session: AsyncSession):
+async def cancel_my_booking(callback: CallbackQuery, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await callback.answer(NOT_REGISTERED_TEXT, show_alert=True)
+        return
     b_id = int(callback.data.split("_")[2])
     
     # SECURITY: ownership check
@@ -62,21 +67,31 @@ async def cancel_my_booking(callback: CallbackQuery, session: AsyncSession):
         await callback.answer("Booking topilmadi.")
         return
 
-    user_stmt = select(User).where(User.telegram_user_id == callback.from_user.id)
-    user = (await session.execute(user_stmt)).scalar_one_or_none()
-    
-    if not user or booking.user_id != user.id:
+    if booking.user_id != identity.id:
         await callback.answer("Kirish rad etildi.", show_alert=True)
         return
 
-    await cancel_booking_service(session, b_id)
+    local_start = from_utc(booking.starts_at).strftime('%Y-%m-%d %H:%M')
+    admin_ids = await get_admin_telegram_ids(session)
+    cancelled = await cancel_booking_service(session, b_id, notify=lambda b: [
+        outbox.message(admin_id, f"❌ **Booking bekor qilindi!**\n\nMijoz: {identity.first_name}\nVaqt: {local_start}", parse_mode="Markdown")
+        for admin_id in admin_ids
+    ])
+    # Ikkinchi bosish yoki muddati o'tib bekor qilingan: adminlarga qayta xabar bormaydi
+    if cancelled is None:
+        await callback.answer(BOOKING_CLOSED_TEXT, show_alert=True)
+        return
     await callback.answer("Booking bekor qilindi.")
     await callback.message.edit_text(f"❌ Booking {b_id} bekor qilindi.")
+    await notify_waitlist(session, booking.starts_at, booking.ends_at)
 
 # --- RESCHEDULE FLOW ---
 
 @router.callback_query(F.data.startswith("resched_me_"))
-async def resched_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def resched_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await callback.answer(NOT_REGISTERED_TEXT, show_alert=True)
+        return
     b_id = int(callback.data.split("_")[2])
     
     # SECURITY: ownership check
@@ -85,16 +100,13 @@ async def resched_start(callback: CallbackQuery, state: FSMContext, session: Asy
         await callback.answer("Booking topilmadi.")
         return
 
-    user_stmt = select(User).where(User.telegram_user_id == callback.from_user.id)
-    user = (await session.execute(user_stmt)).scalar_one_or_none()
-    
-    if not user or booking.user_id != user.id:
+    if booking.user_id != identity.id:
         await callback.answer("Kirish rad etildi.", show_alert=True)
         return
 
     await state.update_data(resched_booking_id=b_id)
     await state.set_state(BookingState.rescheduling_date)
-    await callback.message.answer("Yangi sana tanlang:", reply_markup=dates_kb())
+    await callback.message.answer("Yangi sana tanlang:", reply_markup=await service_dates_kb(session, booking.service_id))
 
 @router.callback_query(BookingState.rescheduling_date, F.data.startswith("date_"))
 async def resched_date(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
@@ -120,7 +132,10 @@ async def resched_date(callback: CallbackQuery, state: FSMContext, session: Asyn
     await callback.message.edit_text(f"{date_str} uchun vaqt tanlang:", reply_markup=slots_kb(slots, selected_date))
 
 @router.callback_query(BookingState.rescheduling_time, F.data.startswith("time_"))
-async def resched_time(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def resched_time(callback: CallbackQuery, state: FSMContext, session: AsyncSession, identity: Optional[Identity]):
+    if not identity:
+        await callback.answer(NOT_REGISTERED_TEXT, show_alert=True)
+        return
     parts = callback.data.split("_")
     date_str = parts[1]
     time_str = parts[2]
@@ -130,38 +145,34 @@ async def resched_time(callback: CallbackQuery, state: FSMContext, session: Asyn
     
     # SECURITY: ownership check
     booking = await session.get(Appointment, b_id)
-    user_stmt = select(User).where(User.telegram_user_id == callback.from_user.id)
-    user = (await session.execute(user_stmt)).scalar_one_or_none()
     
-    if not user or not booking or booking.user_id != user.id:
+    if not booking or booking.user_id != identity.id:
         await callback.answer("Kirish rad etildi.")
         return
     
     d = date.fromisoformat(date_str)
     t = time_type.fromisoformat(time_str)
     new_start = datetime.combine(d, t)
+    old_start, old_end = booking.starts_at, booking.ends_at
+    
+    admin_ids = await get_admin_telegram_ids(session)
     
     try:
-        await reschedule_booking(session, b_id, new_start)
+        # Adminlarga xabar ko'chirish bilan bitta tranzaksiyada yoziladi
+        await reschedule_booking(session, b_id, new_start, notify=lambda b: [
+            outbox.message(
+                admin_id, 
+                f"🔄 **Booking ko'chirildi!**\n\nMijoz: {identity.first_name}\nYangi vaqt: {date_str} {time_str}",
+                parse_mode="Markdown"
+            )
+            for admin_id in admin_ids
+        ])
         await callback.message.edit_text(f"✅ Booking {date_str} {time_str}ga ko'chirildi")
         await state.clear()
-        
-        # Notify Admins about reschedule
-        admin_query = select(User.telegram_user_id).where((User.is_superadmin == True) | (User.admin_type.is_not(None)))
-        res = await session.execute(admin_query)
-        admin_ids = res.scalars().all()
-        
-        for admin_id in admin_ids:
-            try:
-                await callback.bot.send_message(
-                    admin_id, 
-                    f"🔄 **Booking ko'chirildi!**\n\nMijoz: {user.first_name}\nYangi vaqt: {date_str} {time_str}",
-                    parse_mode="Markdown"
-                )
-            except: pass
+        await notify_waitlist(session, old_start, old_end)
     except SlotOccupiedError:
         await callback.answer("⚠️ Vaqt band!", show_alert=True)
-        await callback.message.edit_text("Boshqa sana tanlang:", reply_markup=dates_kb())
+        await callback.message.edit_text("Boshqa sana tanlang:", reply_markup=await service_dates_kb(session, booking.service_id))
         await state.set_state(BookingState.rescheduling_date)
     except Exception as e:
         await callback.message.edit_text(f"Xato: {e}")
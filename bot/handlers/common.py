@@ -8,9 +8,15 @@ from db.models import User
 from bot.keyboards.client import main_menu_kb
 from bot.keyboards.admin import admin_menu_kb
 from core.config import settings
-from services.admin import get_setting
+from services.admin import get_settings, user_changed
+from services.identity import identity_cache
 
-router = Router()
+router = Router(name="common")
+
+# identity bo'lmasa (foydalanuvchi hali /start bosmagan) handlerlar shu javobni beradi
+NOT_REGISTERED_TEXT = "⚠️ Iltimos, avval /start buyrug'ini yuboring."
+# Holat o'zgarmadi: bron allaqachon tasdiqlangan, bekor qilingan yoki yakunlangan
+BOOKING_CLOSED_TEXT = "⚠️ Bu booking allaqachon yopilgan."
 
 @router.message(CommandStart())
 async def cmd_start(message: Message, session: AsyncSession, state: FSMContext):
@@ -47,7 +53,11 @@ async def cmd_start(message: Message, session: AsyncSession, state: FSMContext):
         if user.username != message.from_user.username:
             user.username = message.from_user.username
 
+    # Profil yoki rol o'zgargan bo'lsa, boshqa replikalardagi kesh ham yangilanadi
+    if user in session.new or session.is_modified(user):
+        await user_changed(session, telegram_id)
     await session.commit()
+    identity_cache.invalidate(telegram_id)
     
     if user.is_superadmin or user.admin_type:
         await message.answer("👋 Xush kelibsiz, Admin! Admin panel ishga tushdi:", reply_markup=admin_menu_kb(user.is_superadmin))
@@ -56,15 +66,17 @@ async def cmd_start(message: Message, session: AsyncSession, state: FSMContext):
 
 @router.message(F.text == "ℹ️ Ma'lumot")
 async def cmd_info(message: Message, session: AsyncSession):
-    name = await get_setting(session, "barber_name", "Sartarosh")
-    phone = await get_setting(session, "barber_phone", "+998 90 123 45 67")
-    addr = await get_setting(session, "barber_address", "Toshkent")
-    loc = await get_setting(session, "barber_location", "https://maps.google.com")
+    info = await get_settings(session, {
+        "barber_name": "Sartarosh",
+        "barber_phone": "+998 90 123 45 67",
+        "barber_address": "Toshkent",
+        "barber_location": "https://maps.google.com",
+    })
     
     msg = (
-        f"💈 **{name}**\n\n"
-        f"📍 Manzil: {addr}\n"
-        f"📞 Telefon: {phone}\n\n"
-        f"📍 [Xaritada ko'rish]({loc})"
+        f"💈 **{info['barber_name']}**\n\n"
+        f"📍 Manzil: {info['barber_address']}\n"
+        f"📞 Telefon: {info['barber_phone']}\n\n"
+        f"📍 [Xaritada ko'rish]({info['barber_location']})"
     )
     await message.answer(msg, parse_mode="Markdown")
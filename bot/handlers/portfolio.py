@@ -10,7 +10,7 @@ from bot.states import AdminState
 logger = logging.getLogger(__name__)
 from services.admin import get_setting
 
-router = Router()
+router = Router(name="portfolio")
 
 @router.callback_query(F.data == "add_portfolio_works")
 async def admin_add_portfolio_start(callback: CallbackQuery, state: FSMContext):
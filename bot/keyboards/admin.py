@@ -14,6 +14,7 @@ def admin_menu_kb(is_superadmin: bool) -> ReplyKeyboardMarkup:
     if is_superadmin:
         kb.button(text="👥 Adminlar")
         kb.button(text="📊 Statistika")
+        kb.button(text="📣 Xabar yuborish")
     kb.adjust(1, 1, 2, 1, 2)
     return kb.as_markup(resize_keyboard=True)
 
@@ -33,7 +34,7 @@ def admin_services_kb(services) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for s in services:
         status = "✅" if s.is_active else "❌"
-        builder.button(text=f"{status} {s.name} ({s.price})", callback_data=f"srv_menu_{s.id}")
+        builder.button(text=f"{status} {s.name} ({s.price:,.0f})", callback_data=f"srv_menu_{s.id}")
     builder.button(text="➕ Xizmat qo'shish", callback_data="adm_srv_add")
     builder.adjust(1)
     builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="adm_main_menu"))
@@ -43,7 +44,7 @@ def manual_services_kb(services) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for s in services:
         if s.is_active:
-            builder.button(text=f"{s.name} ({s.price})", callback_data=f"man_srv_{s.id}")
+            builder.button(text=f"{s.name} ({s.price:,.0f})", callback_data=f"man_srv_{s.id}")
     builder.adjust(1)
     builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="adm_main_menu"))
     return builder.as_markup()
@@ -74,9 +75,25 @@ def admin_schedule_kb(days) -> InlineKeyboardMarkup:
     builder.adjust(2, 2) # 2 columns for days, 2 for time edit
     # Append footer buttons as separate rows
     builder.row(InlineKeyboardButton(text="🔄 Yangilash", callback_data="adm_sch_refresh"))
+    builder.row(InlineKeyboardButton(text="📆 Istisno kunlar", callback_data="adm_ovr_list"))
     builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="adm_main_menu"))
     return builder.as_markup()
 
+def admin_overrides_kb(overrides) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for o in overrides:
+        if o.is_day_off:
+            desc = "Yopiq"
+        else:
+            start = o.start_time.strftime('%H:%M') if o.start_time else "--"
+            end = o.end_time.strftime('%H:%M') if o.end_time else "--"
+            desc = f"{start}-{end}"
+        builder.button(text=f"🗑 {o.day.isoformat()} ({desc})", callback_data=f"adm_ovr_del_{o.id}")
+    builder.button(text="➕ Istisno qo'shish", callback_data="adm_ovr_add")
+    builder.adjust(1)
+    builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="edit_work_hours"))
+    return builder.as_markup()
+
 def admins_list_kb(admins) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for a in admins:
@@ -102,6 +119,13 @@ def manage_admin_kb(admin_id: int) -> InlineKeyboardMarkup:
     builder.button(text="⬅️ Orqaga", callback_data="back_admins")
     return builder.as_markup()
 
+def broadcast_confirm_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text="📣 Yuborish", callback_data="adm_bc_send")
+    builder.button(text="❌ Bekor qilish", callback_data="adm_bc_cancel")
+    builder.adjust(2)
+    return builder.as_markup()
+
 def admin_settings_kb(deposit_enabled: bool) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="💳 Karta raqamini o'zgartirish", callback_data="set_card_number")
@@ -111,6 +135,8 @@ def admin_settings_kb(deposit_enabled: bool) -> InlineKeyboardMarkup:
 
     dep_text = "✅ Depozit (10%): Yoqilgan" if deposit_enabled else "❌ Depozit (10%): O'chirilgan"
     builder.button(text=dep_text, callback_data="toggle_deposit")
+    builder.button(text="🔔 Eslatmalar vaqti", callback_data="set_reminder_stages")
+    builder.button(text="⌛ Tasdiqlash muddati", callback_data="set_pending_timeout")
 
     builder.button(text="📸 Portfoliya kanali (ID)", callback_data="set_portfolio_channel")
     builder.button(text="🔗 Portfoliya linki (t.me/...)", callback_data="set_portfolio_link")
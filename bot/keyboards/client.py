@@ -1,10 +1,12 @@
-
 # bot/keyboards/client.py
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton, ReplyKeyboardMarkup
 from datetime import date, timedelta
+from typing import Dict, Optional
 from utils.time import get_today
 
+DATES_WINDOW_DAYS = 7
+
 def main_menu_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -18,22 +20,37 @@ def main_menu_kb() -> ReplyKeyboardMarkup:
 def services_kb(services) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for s in services:
-        builder.button(text=f"{s.name} - {s.price}", callback_data=f"srv_{s.id}")
+        if s.is_active:
+            builder.button(text=f"{s.name} - {s.price:,.0f}", callback_data=f"srv_{s.id}")
     builder.adjust(1)
     return builder.as_markup()
 
-def dates_kb() -> InlineKeyboardMarkup:
+def dates_kb(free_counts: Optional[Dict[date, int]] = None) -> InlineKeyboardMarkup:
+    """free_counts berilsa, har kun yonida bo'sh slotlar soni ko'rsatiladi va to'la kunlar o'chiriladi."""
     from utils.time import format_date_uz
     builder = InlineKeyboardBuilder()
     today = get_today()
-    for i in range(7):
+    for i in range(DATES_WINDOW_DAYS):
         d = today + timedelta(days=i)
         label = format_date_uz(d)
-        builder.button(text=label, callback_data=f"date_{d.isoformat()}")
+        if free_counts is None:
+            builder.button(text=label, callback_data=f"date_{d.isoformat()}")
+        elif free_counts.get(d, 0) > 0:
+            builder.button(text=f"{label} ({free_counts[d]})", callback_data=f"date_{d.isoformat()}")
+        else:
+            builder.button(text=f"{label} ❌", callback_data=f"dayfull_{d.isoformat()}")
     builder.adjust(2)
+    if free_counts is not None:
+        builder.row(InlineKeyboardButton(text="⚡ Eng yaqin vaqt", callback_data="nearest"))
     builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back_main"))
     return builder.as_markup()
 
+async def service_dates_kb(session, service_id: int) -> InlineKeyboardMarkup:
+    """Xizmat uchun bo'sh slotlar soni bilan sana klaviaturasi (bitta oynaviy so'rov)."""
+    from services.schedule import get_free_slot_counts
+    free_counts = await get_free_slot_counts(session, service_id, get_today(), DATES_WINDOW_DAYS)
+    return dates_kb(free_counts)
+
 def slots_kb(slots, date_obj: date) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     date_str = date_obj.isoformat()
@@ -52,6 +69,35 @@ def slots_kb(slots, date_obj: date) -> InlineKeyboardMarkup:
     builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back_date"))
     return builder.as_markup()
 
+def nearest_slots_kb(slots) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for s in slots:
+        slot_time = s['time']
+        builder.button(
+            text=s['label'],
+            callback_data=f"time_{slot_time.date().isoformat()}_{slot_time.strftime('%H:%M')}"
+        )
+    builder.adjust(1)
+    builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back_date"))
+    return builder.as_markup()
+
+# Navbat uchun vaqt oraliqlari: (matn, boshlanish, tugash)
+WAITLIST_WINDOWS = [
+    ("🌅 Ertalab", "08:00", "12:00"),
+    ("☀️ Kunduzi", "12:00", "17:00"),
+    ("🌙 Kechqurun", "17:00", "23:59"),
+    ("🕐 Istalgan vaqt", "00:00", "23:59"),
+]
+
+def waitlist_windows_kb(date_obj: date) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    date_str = date_obj.isoformat()
+    for text, start, end in WAITLIST_WINDOWS:
+        builder.button(text=text, callback_data=f"wladd_{date_str}_{start}_{end}")
+    builder.adjust(2)
+    builder.row(InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back_date"))
+    return builder.as_markup()
+
 def confirm_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="✅ Bookingni tasdiqlash", callback_data="confirm_booking")
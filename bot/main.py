@@ -2,15 +2,24 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from core.config import settings
 from bot.middlewares.db_session import DbSessionMiddleware
+from bot.middlewares.identity import IdentityMiddleware
+from bot.middlewares.metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware, TelegramRequestMetrics
 from bot.handlers import common, client_booking, client_my_bookings, admin
 
 bot = Bot(token=settings.BOT_TOKEN)
 
-async def main():
-    dp = Dispatcher()
+def create_dispatcher(storage: BaseStorage) -> Dispatcher:
+    """Middlewarelar va routerlar ulangan dispatcher (testlar ham shundan foydalanadi)."""
+    dp = Dispatcher(storage=storage)
+    # Metrikalar doimiy yoqilgan; /metrics serveri faqat METRICS_PORT berilganda ochiladi
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
     dp.update.middleware(DbSessionMiddleware())
+    dp.update.middleware(IdentityMiddleware())
     
     dp.include_router(common.router)
     dp.include_router(client_booking.router)
@@ -18,13 +27,55 @@ async def main():
     dp.include_router(admin.router)
     from bot.handlers import portfolio
     dp.include_router(portfolio.router)
+    return dp
+
+async def main():
+    from bot.storage import create_storage
+    storage = create_storage()
+    dp = create_dispatcher(storage)
+    bot.session.middleware(TelegramRequestMetrics())
     
-    # Scheduler ishga tushirish
+    # Fon xabarlari navbati va scheduler
+    from services.send_queue import send_queue
+    send_queue.start(bot)
+    from services.outbox import run_dispatcher
+    outbox_task = asyncio.create_task(run_dispatcher())
+    # Scheduler faqat yetakchi nusxada ishlaydi (bir nechta replika bo'lishi mumkin)
     from services.scheduler import setup_scheduler
-    setup_scheduler(bot)
+    leader = setup_scheduler(bot, storage)
+    leader_task = asyncio.create_task(leader.run())
+    metrics_runner = None
+    if settings.METRICS_PORT:
+        from bot.monitoring import register_gauges, start_metrics_server
+        register_gauges(storage, leader)
+        metrics_runner = await start_metrics_server()
+
+    # Kelgusi haftalar kalendarini oldindan hisoblab qo'yamiz
+    from db.session import async_session
+    from services.calendar import effective_calendar, CALENDAR_HORIZON_DAYS
+    from utils.time import get_today
+    async with async_session() as session:
+        await effective_calendar.get(session, get_today(), CALENDAR_HORIZON_DAYS)
+    # Process keshlarini (sozlamalar, foydalanuvchilar, kalendar, bo'sh vaqtlar) boshqa replikalardagi o'zgarishlar bilan yangilaydi
+    from services.invalidation import run_listener
+    listener_task = asyncio.create_task(run_listener())
     
     logging.info("Starting bot...")
-    await dp.start_polling(bot)
+    try:
+        if settings.use_webhook:
+            from bot.webhook import run_webhook
+            await run_webhook(dp, bot, leader)
+        else:
+            # Development uchun: polling bitta nusxada ishlaydi
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        leader_task.cancel()
+        listener_task.cancel()
+        outbox_task.cancel()
+        await send_queue.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 if __name__ == "__main__":
     from core.logger import setup_logger
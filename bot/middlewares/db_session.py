@@ -1,8 +1,68 @@
 # bot/middlewares/db_session.py
-from typing import Callable, Awaitable, Dict, Any
+import logging
+from typing import Callable, Awaitable, Dict, Any, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
-from db.session import get_db_session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from core.config import settings
+from db.session import async_session
+from core.metrics import query_budget_exceeded_total
+from db.stats import QueryBudgetExceeded, QueryStats, track_queries
+
+logger = logging.getLogger(__name__)
+
+# Handler (router.handler) uchun keshlar iliq holatda ruxsat etilgan SQL so'rovlar soni,
+# FSM storage hisobga olinmaydi. Har bir update'da tekshiriladi (check_query_budget).
+QUERY_BUDGETS = {
+    "client_booking.date_selected": 2,
+    "client_booking.nearest_selected": 3,
+    # Bron, adminlar ro'yxati va band qilishni bo'shatish bitta CTE da, so'ng outbox yozuvi;
+    # navbatdan kelgan bronda kutish yozuvi ham yopiladi
+    "client_booking.finalize_booking": 3,
+    "client_my_bookings.my_bookings": 2,
+}
+
+def check_query_budget(stats: QueryStats, update_type: str):
+    """
+    Takroriy so'rovlar (N+1) logga yoziladi. Byudjetdan oshish metrikaga tushadi va
+    DB_QUERY_BUDGET_STRICT bo'lsa QueryBudgetExceeded, aks holda ogohlantirish.
+    """
+    handler = stats.handler or update_type
+    for statement, count in stats.repeated():
+        logger.warning(f"{handler}: same statement executed {count}x in one update: {' '.join(statement.split())[:300]}")
+
+    budget = QUERY_BUDGETS.get(stats.handler)
+    if budget is None or stats.handler_queries <= budget:
+        return
+    query_budget_exceeded_total.inc(handler)
+    message = f"{handler}: {stats.handler_queries} queries, budget {budget}"
+    if settings.DB_QUERY_BUDGET_STRICT:
+        details = "\n".join(f"  {count}x {statement}" for statement, count in stats.repeated(1))
+        raise QueryBudgetExceeded(f"{message}:\n{details}")
+    logger.warning(message)
+
+class LazySession:
+    """
+    AsyncSession o'rinbosari: sessiya birinchi murojaatda yaratiladi, ulanish esa birinchi
+    so'rovda puldan olinadi. DB ga tegmaydigan handlerlar (slot_taken va h.k.) pulni band qilmaydi.
+    """
+
+    def __init__(self, factory: async_sessionmaker):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
 
 class DbSessionMiddleware(BaseMiddleware):
     async def __call__(
@@ -11,6 +71,22 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async for session in get_db_session():
+        session = LazySession(async_session)
+        update_type = getattr(event, 'event_type', type(event).__name__)
+        # So'rov matnlari SQLAlchemy keshidagi satrlar - sanash arzon, shuning uchun doim yoqiq
+        with track_queries(statements=True) as stats:
             data["session"] = session
-            return await handler(event, data)
+            data["db_stats"] = stats
+            try:
+                result = await handler(event, data)
+            finally:
+                # Ulanish pulga handler tugashi bilan qaytadi
+                await session.close()
+                if session.started:
+                    logger.debug(
+                        f"{update_type}: {stats.queries} queries in {stats.query_time * 1000:.1f}ms, "
+                        f"{stats.checkouts} checkouts held {stats.checkout_held * 1000:.1f}ms"
+                    )
+        # Handler xato bilan tugasa, byudjet tekshiruvi asl xatoni yashirmaydi
+        check_query_budget(stats, update_type)
+        return result
@@ -0,0 +1,21 @@
+# bot/middlewares/identity.py
+from typing import Callable, Awaitable, Dict, Any
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from services.identity import identity_cache
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Foydalanuvchini (rollari bilan) har bir update uchun bir marta aniqlaydi va handlerlarga
+    "identity" sifatida beradi. Keshda bo'lsa, so'rov yuborilmaydi. DbSessionMiddleware dan keyin.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        data["identity"] = await identity_cache.get(data["session"], from_user.id) if from_user else None
+        return await handler(event, data)
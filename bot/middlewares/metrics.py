@@ -0,0 +1,78 @@
+# bot/middlewares/metrics.py
+import time as _time
+from typing import Callable, Awaitable, Dict, Any
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+from core.metrics import (
+    updates_total, handler_seconds, handler_errors_total, handler_queries,
+    telegram_request_seconds, telegram_errors_total
+)
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """dp.update.outer_middleware - har bir update turini sanaydi."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        updates_total.inc(getattr(event, "event_type", "unknown"))
+        return await handler(event, data)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Dispatcher observer'lariga (message, callback_query) ichki middleware sifatida ulanadi -
+    aiogram uni ichki routerlardagi handlerlarga ham qo'llaydi.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        router = data.get("event_router")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        router_name = router.name if router is not None else "unknown"
+        # DbSessionMiddleware update darajasida ochgan hisoblagich
+        stats = data.get("db_stats")
+        if stats is not None:
+            stats.handler = f"{router_name}.{name}"
+            queries_before = stats.queries
+
+        started_at = _time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors_total.inc(router_name, name)
+            raise
+        finally:
+            handler_seconds.observe(_time.perf_counter() - started_at, router_name, name)
+            if stats is not None:
+                stats.handler_queries = stats.queries - queries_before
+                handler_queries.observe(stats.handler_queries, router_name, name)
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """bot.session.middleware - Bot API chaqiruvlari vaqti va xatolari, metod bo'yicha."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        method_name = type(method).__name__
+        started_at = _time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramAPIError as e:
+            telegram_errors_total.inc(method_name, type(e).__name__)
+            raise
+        finally:
+            telegram_request_seconds.observe(_time.perf_counter() - started_at, method_name)
@@ -0,0 +1,64 @@
+# bot/monitoring.py
+import logging
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiohttp import web
+from core.config import settings
+from core.metrics import registry
+from db.session import engine
+from services.leader import LeaderElection
+from services.send_queue import send_queue
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def register_gauges(storage: BaseStorage, leader: LeaderElection):
+    """Scrape paytida o'qiladigan qiymatlar: ulanishlar puli, yuborish navbati, FSM holatlari."""
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        registry.gauge("db_pool_size", "Puldagi doimiy ulanishlar", pool.size)
+        registry.gauge("db_pool_checked_out", "Band ulanishlar", pool.checkedout)
+        registry.gauge("db_pool_checked_in", "Bo'sh ulanishlar", pool.checkedin)
+        registry.gauge("db_pool_overflow", "Pul hajmidan ortiq ochilgan ulanishlar", pool.overflow)
+
+    registry.gauge("send_queue_depth", "Yuborilishi kutilayotgan xabarlar", lambda: send_queue.depth)
+    registry.gauge(
+        "send_queue_messages", "Yuborish navbati hisoblagichlari (ishga tushgandan beri)",
+        lambda: {
+            ("sent",): send_queue.stats.sent,
+            ("failed",): send_queue.stats.failed,
+            ("retried",): send_queue.stats.retried,
+            ("dropped",): send_queue.stats.dropped,
+        },
+        ["result"]
+    )
+    registry.gauge("scheduler_leader", "Shu nusxa yetakchimi (1/0)", lambda: int(leader.is_leader))
+
+    async def fsm_states():
+        if hasattr(storage, "state_counts"):
+            counts = await storage.state_counts()
+        elif isinstance(storage, MemoryStorage):
+            counts = {}
+            for record in storage.storage.values():
+                if record.state is not None:
+                    counts[record.state] = counts.get(record.state, 0) + 1
+        else:
+            counts = {}
+        return {(state,): count for state, count in counts.items()}
+
+    registry.gauge("fsm_states", "Har bir FSM holatidagi foydalanuvchilar", fsm_states, ["state"])
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(body=(await registry.render()).encode(), headers={"Content-Type": CONTENT_TYPE})
+
+async def start_metrics_server() -> web.AppRunner:
+    """Webhook portidan alohida: /metrics faqat ichki tarmoqdan scrape qilinadi."""
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, settings.METRICS_HOST, settings.METRICS_PORT).start()
+    logger.info(f"Metrics server listening on {settings.METRICS_HOST}:{settings.METRICS_PORT}{METRICS_PATH}")
+    return runner
@@ -21,6 +21,8 @@ class AdminState(StatesGroup):
     edit_schedule_start = State()
     edit_schedule_end = State()
     edit_schedule_time = State()
+    add_override_date = State()
+    add_override_hours = State()
     
     # Admin Management
     add_admin_id = State()
@@ -35,6 +37,8 @@ class AdminState(StatesGroup):
     edit_portfolio_channel = State()
     edit_portfolio_link = State()
     edit_deposit_val = State() 
+    edit_reminder_stages = State()
+    edit_pending_timeout = State()
     
     # Barber Info Management
     edit_barber_name = State()
@@ -49,3 +53,6 @@ class AdminState(StatesGroup):
     manual_booking_time = State()
     manual_booking_name = State()
     manual_booking_phone = State()
+
+    # Broadcast
+    broadcast_text = State()
@@ -0,0 +1,127 @@
+# bot/storage.py
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping, Optional
+import pytz
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import select, update, delete, or_, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.config import settings
+from db.models import FsmState
+from db.session import engine
+from db.stats import FSM_QUERY_OPTION
+
+logger = logging.getLogger(__name__)
+
+
+def _key(key: StorageKey) -> str:
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id:
+        parts.append(f"t{key.thread_id}")
+    business_connection_id = getattr(key, "business_connection_id", None)
+    if business_connection_id:
+        parts.append(f"b{business_connection_id}")
+    if key.destiny != "default":
+        parts.append(key.destiny)
+    return ":".join(parts)
+
+def _state(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM holati fsm_states jadvalida: har bir kalit uchun bitta qator (state + JSONB data).
+    Har bir amal bitta so'rov; update_data JSONB || bilan o'qimasdan birlashtiradi.
+    Tozalangan va TTL dan eski qatorlarni sweep() o'chiradi (scheduler, yetakchida).
+    """
+
+    def __init__(self, db_engine: AsyncEngine = engine, ttl_hours: int = settings.FSM_TTL_HOURS):
+        self.engine = db_engine
+        self.ttl = timedelta(hours=ttl_hours)
+
+    async def _execute(self, stmt):
+        async with self.engine.begin() as conn:
+            return await conn.execute(stmt, execution_options={FSM_QUERY_OPTION: True})
+
+    def _upsert(self, key: StorageKey, **values):
+        values["updated_at"] = datetime.now(pytz.UTC)
+        return pg_insert(FsmState).values(key=_key(key), **values)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = _state(state)
+        if state is None:
+            # Qator bo'lmasa, yaratishning hojati yo'q
+            stmt = (
+                update(FsmState)
+                .where(FsmState.key == _key(key))
+                .values(state=None, updated_at=datetime.now(pytz.UTC))
+            )
+        else:
+            stmt = self._upsert(key, state=state)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FsmState.key],
+                set_={"state": stmt.excluded.state, "updated_at": stmt.excluded.updated_at}
+            )
+        await self._execute(stmt)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        result = await self._execute(select(FsmState.state).where(FsmState.key == _key(key)))
+        return result.scalar()
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        data = dict(data)
+        if not data:
+            stmt = (
+                update(FsmState)
+                .where(FsmState.key == _key(key))
+                .values(data={}, updated_at=datetime.now(pytz.UTC))
+            )
+        else:
+            stmt = self._upsert(key, data=data)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FsmState.key],
+                set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at}
+            )
+        await self._execute(stmt)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        result = await self._execute(select(FsmState.data).where(FsmState.key == _key(key)))
+        return dict(result.scalar() or {})
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        stmt = self._upsert(key, data=dict(data))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={"data": FsmState.data.op("||")(stmt.excluded.data), "updated_at": stmt.excluded.updated_at}
+        ).returning(FsmState.data)
+        result = await self._execute(stmt)
+        return dict(result.scalar())
+
+    async def sweep(self) -> int:
+        """Tozalangan (holatsiz va bo'sh) hamda TTL dan eski qatorlarni o'chiradi."""
+        stmt = delete(FsmState).where(or_(
+            FsmState.updated_at < datetime.now(pytz.UTC) - self.ttl,
+            and_(FsmState.state.is_(None), FsmState.data == {})
+        ))
+        result = await self._execute(stmt)
+        return result.rowcount
+
+    async def state_counts(self) -> Dict[str, int]:
+        """Har bir holatda nechta foydalanuvchi turibdi (metrikalar uchun)."""
+        stmt = select(FsmState.state, func.count()).where(FsmState.state.is_not(None)).group_by(FsmState.state)
+        result = await self._execute(stmt)
+        return {state: count for state, count in result.all()}
+
+    async def close(self) -> None:
+        # Umumiy engine - uni db.session boshqaradi
+        pass
+
+
+def create_storage() -> BaseStorage:
+    if settings.FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return PostgresStorage()
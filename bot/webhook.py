@@ -0,0 +1,60 @@
+# bot/webhook.py
+import asyncio
+import logging
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+from sqlalchemy import text
+from core.config import settings
+from db.session import engine
+from services.leader import LeaderElection
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATH = "/healthz"
+HEALTH_DB_TIMEOUT = 2
+
+def build_app(dp: Dispatcher, bot: Bot, leader: LeaderElection) -> web.Application:
+    """
+    Webhook va health endpoint. Bir nechta replika reverse proxy orqasida bir xil
+    WEBHOOK_PATH ga ulanadi; so'rovlar secret token bilan tekshiriladi.
+    """
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=settings.webhook_secret).register(
+        app, path=settings.WEBHOOK_PATH
+    )
+
+    async def health(request: web.Request) -> web.Response:
+        # Bazaga ulana olmaydigan replikani proxy trafikdan chiqarishi uchun 503
+        try:
+            async with engine.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), HEALTH_DB_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Health check failed: {e}")
+            return web.json_response({"status": "db_unavailable", "leader": leader.is_leader}, status=503)
+        return web.json_response({"status": "ok", "leader": leader.is_leader})
+
+    app.router.add_get(HEALTH_PATH, health)
+    return app
+
+async def run_webhook(dp: Dispatcher, bot: Bot, leader: LeaderElection):
+    # Har bir replika bir xil URL ni o'rnatadi - takroriy chaqiruv zararsiz
+    await bot.set_webhook(
+        settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+        secret_token=settings.webhook_secret,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    await dp.emit_startup(bot=bot)
+
+    runner = web.AppRunner(build_app(dp, bot, leader))
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBAPP_HOST, settings.WEBAPP_PORT)
+    await site.start()
+    logger.info(f"Webhook server listening on {settings.WEBAPP_HOST}:{settings.WEBAPP_PORT}{settings.WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Webhook o'chirilmaydi: boshqa replikalar trafikni qabul qilishda davom etadi
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
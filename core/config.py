@@ -1,6 +1,6 @@
-
 # core/config.py    
 from pydantic_settings import BaseSettings, SettingsConfigDict
+import hashlib
 from typing import List
 
 class Settings(BaseSettings):
@@ -9,6 +9,35 @@ class Settings(BaseSettings):
     SUPERADMIN_IDS: str = "" # Comma-separated string from env
     TZ: str = "Asia/Tashkent"
 
+    # Webhook rejimi: WEBHOOK_URL berilsa (masalan https://bot.example.com), polling o'rniga ishlatiladi
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBAPP_HOST: str = "0.0.0.0"
+    WEBAPP_PORT: int = 8080
+
+    # FSM holati: "postgres" (replikalar va qayta ishga tushirish uchun) yoki "memory" (development)
+    FSM_STORAGE: str = "postgres"
+    # Shuncha soat tegilmagan FSM holati tozalanadi
+    FSM_TTL_HOURS: int = 48
+
+    # Prometheus /metrics uchun alohida port (0 - o'chirilgan); tashqariga ochilmasligi kerak
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 0
+
+    # Handler so'rov byudjetidan oshsa: true - QueryBudgetExceeded (testlar, development),
+    # false - ogohlantirish va metrika (production: javob allaqachon yuborilgan)
+    DB_QUERY_BUDGET_STRICT: bool = False
+
+    @property
+    def use_webhook(self) -> bool:
+        return bool(self.WEBHOOK_URL)
+
+    @property
+    def webhook_secret(self) -> str:
+        # Barcha replikalar bir xil tokenni hisoblaydi; Telegram faqat [A-Za-z0-9_-] qabul qiladi
+        return self.WEBHOOK_SECRET or hashlib.sha256(self.BOT_TOKEN.encode()).hexdigest()
+
     @property
     def timezone_name(self) -> str:
         # Ba'zi serverlarda TZ ': /etc/localtime' kabi noto'g'ri bo'lishi mumkin
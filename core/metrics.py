@@ -0,0 +1,142 @@
+# core/metrics.py
+import bisect
+import inspect
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple, Union
+
+# Prometheus text formatidagi yengil metrikalar (tashqi kutubxonasiz).
+# Yozish - bitta dict qidiruv va qo'shish, shuning uchun doimiy yoqilgan holda qoldirsa bo'ladi.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+Labels = Tuple[str, ...]
+GaugeValue = Union[float, Dict[Labels, float]]
+Collector = Callable[[], Union[GaugeValue, Awaitable[GaugeValue]]]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [har bucket soni..., +Inf], summa
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[labels] = self._sums.get(labels, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for labels, counts in list(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {self._sums[labels]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Qiymat scrape paytida collect() dan olinadi (navbat uzunligi, pul holati va h.k.)."""
+
+    def __init__(self, name: str, doc: str, collect: Collector, labels: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.collect = collect
+
+    async def render(self) -> List[str]:
+        value = self.collect()
+        if inspect.isawaitable(value):
+            value = await value
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        values = value if isinstance(value, dict) else {(): value}
+        for labels, v in values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {v}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram, Gauge]] = {}
+
+    def counter(self, name: str, doc: str, labels: Iterable[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, doc, labels))
+
+    def histogram(self, name: str, doc: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, doc, labels, buckets))
+
+    def gauge(self, name: str, doc: str, collect: Collector, labels: Iterable[str] = ()) -> Gauge:
+        # Qayta ro'yxatdan o'tkazilsa (masalan, storage almashsa), yangisi ishlatiladi
+        gauge = self._metrics[name] = Gauge(name, doc, collect, labels)
+        return gauge
+
+    async def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            if isinstance(metric, Gauge):
+                lines.extend(await metric.render())
+            else:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Handlerlar va update'lar
+updates_total = registry.counter("bot_updates_total", "Qabul qilingan update'lar", ["type"])
+handler_seconds = registry.histogram("bot_handler_seconds", "Handler bajarilish vaqti", ["router", "handler"])
+handler_errors_total = registry.counter("bot_handler_errors_total", "Xato bilan tugagan handlerlar", ["router", "handler"])
+
+# Baza
+db_query_seconds = registry.histogram("db_query_seconds", "SQL so'rov vaqti", buckets=DB_BUCKETS)
+handler_queries = registry.histogram(
+    "bot_handler_queries", "Bitta handler bajargan SQL so'rovlar soni (FSM dan tashqari)",
+    ["router", "handler"], buckets=QUERY_COUNT_BUCKETS
+)
+query_budget_exceeded_total = registry.counter(
+    "bot_query_budget_exceeded_total", "So'rov byudjetidan oshgan handler chaqiruvlari", ["handler"]
+)
+
+# Telegram Bot API
+telegram_request_seconds = registry.histogram("telegram_request_seconds", "Bot API so'rov vaqti", ["method"])
+telegram_errors_total = registry.counter("telegram_errors_total", "Bot API xatolari", ["method", "error"])
+
+# Scheduler
+job_seconds = registry.histogram("scheduler_job_seconds", "Scheduler job bajarilish vaqti", ["job"])
+job_errors_total = registry.counter("scheduler_job_errors_total", "Xato bilan tugagan joblar", ["job"])
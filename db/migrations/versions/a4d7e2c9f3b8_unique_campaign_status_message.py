@@ -0,0 +1,25 @@
+"""unique campaign status message
+
+Revision ID: a4d7e2c9f3b8
+Revises: f8c2a6d1b9e4
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d7e2c9f3b8'
+down_revision: Union[str, None] = 'f8c2a6d1b9e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint('uq_campaigns_status_message', 'campaigns', ['status_chat_id', 'status_message_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_campaigns_status_message', 'campaigns', type_='unique')
@@ -0,0 +1,28 @@
+"""add appointment idempotency key
+
+Revision ID: a7d3e9f1c2b4
+Revises: f5c8d2e4b9a1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9f1c2b4'
+down_revision: Union[str, None] = 'f5c8d2e4b9a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('appointments', sa.Column('idempotency_key', sa.String(), nullable=True))
+    op.create_unique_constraint('appointments_idempotency_key_key', 'appointments', ['idempotency_key'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('appointments_idempotency_key_key', 'appointments', type_='unique')
+    op.drop_column('appointments', 'idempotency_key')
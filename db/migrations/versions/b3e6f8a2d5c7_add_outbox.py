@@ -0,0 +1,43 @@
+"""add outbox
+
+Revision ID: b3e6f8a2d5c7
+Revises: a7d3e9f1c2b4
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e6f8a2d5c7'
+down_revision: Union[str, None] = 'a7d3e9f1c2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox',
+        sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('method', sa.String(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_outbox_pending', 'outbox', ['next_attempt_at'],
+        unique=False, postgresql_where=sa.text('delivered_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_pending', table_name='outbox')
+    op.drop_table('outbox')
@@ -0,0 +1,91 @@
+"""add barbers and per-barber schedule
+
+Revision ID: c4f1d2a9e7b3
+Revises: ba393b93f14b
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1d2a9e7b3'
+down_revision: Union[str, None] = 'ba393b93f14b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('barbers',
+        sa.Column('id', sa.Integer(), sa.Identity(always=False), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('telegram_user_id', sa.BigInteger(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default='true'),
+        sa.Column('sort_order', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('barber_services',
+        sa.Column('barber_id', sa.Integer(), nullable=False),
+        sa.Column('service_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['barber_id'], ['barbers.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['service_id'], ['services.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('barber_id', 'service_id')
+    )
+
+    # Mavjud jadval va bronlar standart sartaroshga biriktiriladi
+    op.execute("INSERT INTO barbers (name) VALUES ('Asosiy sartarosh')")
+
+    op.add_column('work_schedule', sa.Column('barber_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE work_schedule SET barber_id = (SELECT min(id) FROM barbers)")
+    op.alter_column('work_schedule', 'barber_id', nullable=False)
+    op.create_foreign_key('work_schedule_barber_id_fkey', 'work_schedule', 'barbers', ['barber_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('work_schedule_weekday_key', 'work_schedule', type_='unique')
+    op.create_unique_constraint('uq_work_schedule_barber_weekday', 'work_schedule', ['barber_id', 'weekday'])
+
+    op.add_column('appointments', sa.Column('barber_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE appointments SET barber_id = (SELECT min(id) FROM barbers)")
+    op.alter_column('appointments', 'barber_id', nullable=False)
+    op.create_foreign_key('appointments_barber_id_fkey', 'appointments', 'barbers', ['barber_id'], ['id'])
+
+    # Kesishish taqiqi endi har bir sartarosh uchun alohida
+    op.execute("ALTER TABLE appointments DROP CONSTRAINT no_overlap")
+    op.execute(
+        """
+        ALTER TABLE appointments
+        ADD CONSTRAINT no_overlap
+        EXCLUDE USING GIST (
+            barber_id WITH =,
+            tstzrange(starts_at, ends_at, '[)') WITH &&
+        )
+        WHERE (status IN ('pending', 'confirmed'));
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE appointments DROP CONSTRAINT no_overlap")
+    op.execute(
+        """
+        ALTER TABLE appointments
+        ADD CONSTRAINT no_overlap
+        EXCLUDE USING GIST (
+            tstzrange(starts_at, ends_at, '[)') WITH &&
+        )
+        WHERE (status IN ('pending', 'confirmed'));
+        """
+    )
+    op.drop_constraint('appointments_barber_id_fkey', 'appointments', type_='foreignkey')
+    op.drop_column('appointments', 'barber_id')
+
+    op.drop_constraint('uq_work_schedule_barber_weekday', 'work_schedule', type_='unique')
+    op.execute("DELETE FROM work_schedule WHERE barber_id <> (SELECT min(id) FROM barbers)")
+    op.create_unique_constraint('work_schedule_weekday_key', 'work_schedule', ['weekday'])
+    op.drop_constraint('work_schedule_barber_id_fkey', 'work_schedule', type_='foreignkey')
+    op.drop_column('work_schedule', 'barber_id')
+
+    op.drop_table('barber_services')
+    op.drop_table('barbers')
@@ -0,0 +1,50 @@
+"""add broadcast campaigns
+
+Revision ID: c9a4b7e3f1d6
+Revises: b3e6f8a2d5c7
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9a4b7e3f1d6'
+down_revision: Union[str, None] = 'b3e6f8a2d5c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('campaigns',
+        sa.Column('id', sa.Integer(), sa.Identity(always=False), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='running'),
+        sa.Column('created_by', sa.BigInteger(), nullable=False),
+        sa.Column('status_chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('status_message_id', sa.Integer(), nullable=False),
+        sa.Column('last_user_id', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('blocked', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('campaign_deliveries',
+        sa.Column('campaign_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['campaign_id'], ['campaigns.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('campaign_id', 'user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('campaign_deliveries')
+    op.drop_table('campaigns')
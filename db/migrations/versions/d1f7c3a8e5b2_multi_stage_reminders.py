@@ -0,0 +1,51 @@
+"""multi-stage reminders
+
+Revision ID: d1f7c3a8e5b2
+Revises: c9a4b7e3f1d6
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f7c3a8e5b2'
+down_revision: Union[str, None] = 'c9a4b7e3f1d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('appointments', sa.Column('next_reminder_at', sa.DateTime(timezone=True), nullable=True))
+    # Yuborilmagan eslatmalar eski 1 soatlik qoida bo'yicha ko'chiriladi
+    op.execute(
+        """
+        UPDATE appointments
+        SET next_reminder_at = starts_at - interval '60 minutes'
+        WHERE status = 'confirmed' AND NOT reminder_sent AND starts_at > now()
+        """
+    )
+    op.drop_column('appointments', 'reminder_sent')
+    op.create_index(
+        'ix_appointments_reminder_due', 'appointments', ['next_reminder_at'],
+        unique=False, postgresql_include=['id', 'starts_at'],
+        postgresql_where=sa.text("status = 'confirmed' AND next_reminder_at IS NOT NULL")
+    )
+    op.create_table('reminder_log',
+        sa.Column('appointment_id', sa.BigInteger(), nullable=False),
+        sa.Column('stage_minutes', sa.Integer(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['appointment_id'], ['appointments.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('appointment_id', 'stage_minutes')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('reminder_log')
+    op.drop_index('ix_appointments_reminder_due', table_name='appointments')
+    op.add_column('appointments', sa.Column('reminder_sent', sa.Boolean(), server_default='false', nullable=False))
+    op.execute("UPDATE appointments SET reminder_sent = (next_reminder_at IS NULL)")
+    op.drop_column('appointments', 'next_reminder_at')
@@ -0,0 +1,39 @@
+"""add schedule overrides
+
+Revision ID: d8a3b5c6f2e1
+Revises: c4f1d2a9e7b3
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a3b5c6f2e1'
+down_revision: Union[str, None] = 'c4f1d2a9e7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('schedule_overrides',
+        sa.Column('id', sa.Integer(), sa.Identity(always=False), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('is_day_off', sa.Boolean(), nullable=False, server_default='false'),
+        sa.Column('start_time', sa.Time(), nullable=True),
+        sa.Column('end_time', sa.Time(), nullable=True),
+        sa.Column('break_start', sa.Time(), nullable=True),
+        sa.Column('break_end', sa.Time(), nullable=True),
+        sa.Column('note', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_schedule_overrides_day'), 'schedule_overrides', ['day'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_schedule_overrides_day'), table_name='schedule_overrides')
+    op.drop_table('schedule_overrides')
@@ -0,0 +1,50 @@
+"""add slot holds
+
+Revision ID: e2b7c9d1a4f8
+Revises: d8a3b5c6f2e1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7c9d1a4f8'
+down_revision: Union[str, None] = 'd8a3b5c6f2e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('slot_holds',
+        sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+        sa.Column('barber_id', sa.Integer(), nullable=False),
+        sa.Column('holder_telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('starts_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('ends_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['barber_id'], ['barbers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_slot_holds_holder_telegram_id'), 'slot_holds', ['holder_telegram_id'], unique=False)
+    op.create_index(op.f('ix_slot_holds_expires_at'), 'slot_holds', ['expires_at'], unique=False)
+    op.execute(
+        """
+        ALTER TABLE slot_holds
+        ADD CONSTRAINT no_hold_overlap
+        EXCLUDE USING GIST (
+            barber_id WITH =,
+            tstzrange(starts_at, ends_at, '[)') WITH &&
+        );
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_slot_holds_expires_at'), table_name='slot_holds')
+    op.drop_index(op.f('ix_slot_holds_holder_telegram_id'), table_name='slot_holds')
+    op.drop_table('slot_holds')
@@ -0,0 +1,34 @@
+"""add open booking indexes
+
+Revision ID: e6b9d4f2a7c1
+Revises: d1f7c3a8e5b2
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b9d4f2a7c1'
+down_revision: Union[str, None] = 'd1f7c3a8e5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_appointments_pending_created', 'appointments', ['created_at'],
+        unique=False, postgresql_where=sa.text("status = 'pending'")
+    )
+    op.create_index(
+        'ix_appointments_confirmed_ends', 'appointments', ['ends_at'],
+        unique=False, postgresql_where=sa.text("status = 'confirmed'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_confirmed_ends', table_name='appointments')
+    op.drop_index('ix_appointments_pending_created', table_name='appointments')
@@ -0,0 +1,44 @@
+"""add waitlist
+
+Revision ID: f5c8d2e4b9a1
+Revises: e2b7c9d1a4f8
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c8d2e4b9a1'
+down_revision: Union[str, None] = 'e2b7c9d1a4f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('waitlist_entries',
+        sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('service_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('window_start', sa.Time(), nullable=False),
+        sa.Column('window_end', sa.Time(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default='true'),
+        sa.Column('notified_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['service_id'], ['services.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_waitlist_active_day_window', 'waitlist_entries', ['day', 'window_start', 'window_end'],
+        unique=False, postgresql_where=sa.text('is_active')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_waitlist_active_day_window', table_name='waitlist_entries')
+    op.drop_table('waitlist_entries')
@@ -0,0 +1,35 @@
+"""add fsm states
+
+Revision ID: f8c2a6d1b9e4
+Revises: e6b9d4f2a7c1
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8c2a6d1b9e4'
+down_revision: Union[str, None] = 'e6b9d4f2a7c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('fsm_states',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_fsm_states_updated_at', 'fsm_states', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fsm_states_updated_at', table_name='fsm_states')
+    op.drop_table('fsm_states')
@@ -1,10 +1,10 @@
 # db/models.py
 import enum
-from datetime import datetime, time
+from datetime import date, datetime, time
 from typing import Optional
-from sqlalchemy import BigInteger, String, Boolean, Integer, Numeric, Time, ForeignKey, DateTime, func, Identity
+from sqlalchemy import BigInteger, String, Boolean, Integer, Numeric, Time, Date, ForeignKey, DateTime, func, Identity, UniqueConstraint, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, JSONB
 
 class Base(DeclarativeBase):
     pass
@@ -45,11 +45,29 @@ class Service(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+class Barber(Base):
+    __tablename__ = "barbers"
+
+    id: Mapped[int] = mapped_column(Integer, Identity(always=False), primary_key=True)
+    name: Mapped[str] = mapped_column(String)
+    telegram_user_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, server_default="true")
+    sort_order: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class BarberService(Base):
+    # Sartarosh bajara oladigan xizmatlar. Sartarosh uchun qator bo'lmasa - barcha xizmatlar
+    __tablename__ = "barber_services"
+
+    barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id", ondelete="CASCADE"), primary_key=True)
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+
 class WorkSchedule(Base):
     __tablename__ = "work_schedule"
     
     id: Mapped[int] = mapped_column(Integer, Identity(always=False), primary_key=True)
-    weekday: Mapped[int] = mapped_column(Integer, unique=True) # 0=Monday, 6=Sunday
+    barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id", ondelete="CASCADE"))
+    weekday: Mapped[int] = mapped_column(Integer) # 0=Monday, 6=Sunday
     start_time: Mapped[time] = mapped_column(Time)
     end_time: Mapped[time] = mapped_column(Time)
     break_start: Mapped[Optional[time]] = mapped_column(Time, nullable=True)
@@ -57,12 +75,32 @@ class WorkSchedule(Base):
     is_day_off: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        UniqueConstraint("barber_id", "weekday", name="uq_work_schedule_barber_weekday"),
+    )
+
+class ScheduleOverride(Base):
+    # Haftalik jadvaldan istisno: bayram, qisqa kun yoki bir martalik yopilish.
+    # Bo'sh (NULL) maydonlar haftalik jadvaldan olinadi
+    __tablename__ = "schedule_overrides"
+
+    id: Mapped[int] = mapped_column(Integer, Identity(always=False), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, unique=True, index=True)
+    is_day_off: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
+    start_time: Mapped[Optional[time]] = mapped_column(Time, nullable=True)
+    end_time: Mapped[Optional[time]] = mapped_column(Time, nullable=True)
+    break_start: Mapped[Optional[time]] = mapped_column(Time, nullable=True)
+    break_end: Mapped[Optional[time]] = mapped_column(Time, nullable=True)
+    note: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
 class Appointment(Base):
     __tablename__ = "appointments"
     
     id: Mapped[int] = mapped_column(BigInteger, Identity(always=False), primary_key=True)
     service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id"))
     
     status: Mapped[str] = mapped_column(String, default=AppointmentStatus.PENDING.value, server_default=AppointmentStatus.PENDING.value)
     
@@ -72,6 +110,8 @@ class Appointment(Base):
     customer_phone: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     customer_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created_by: Mapped[str] = mapped_column(String) # client/admin
+    # Ikki marta bosish va qayta yetkazilgan update'lar ikkinchi bron yaratmasligi uchun
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String, nullable=True, unique=True)
     
     # Payment fields
     payment_amount: Mapped[Optional[float]] = mapped_column(Numeric(10, 2), nullable=True)
@@ -79,8 +119,8 @@ class Appointment(Base):
     is_paid: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
     payment_confirmed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
-    # Reminder fields
-    reminder_sent: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
+    # Keyingi eslatma vaqti; NULL - boshqa eslatma yo'q (bosqichlar reminder_stages sozlamasida)
+    next_reminder_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -88,21 +128,148 @@ class Appointment(Base):
     # Relationships
     service: Mapped["Service"] = relationship()
     user: Mapped["User"] = relationship()
+    barber: Mapped["Barber"] = relationship()
     
     __table_args__ = (
+        # Bir sartarosh bir vaqtda faqat bitta mijozga xizmat qiladi
         ExcludeConstraint(
+            (barber_id, '='),
             (func.tstzrange(starts_at, ends_at, '[)'), '&&'),
             where=(status.in_(('pending', 'confirmed'))),
             name='no_overlap'
         ),
+        # Faqat kutilayotgan eslatmali tasdiqlangan bronlar - tarix o'sgani bilan indeks kattalashmaydi
+        Index(
+            "ix_appointments_reminder_due", "next_reminder_at",
+            postgresql_include=["id", "starts_at"],
+            postgresql_where=((status == 'confirmed') & (next_reminder_at.is_not(None)))
+        ),
+        # Avtomatik bekor qilish / yakunlash ishlari faqat ochiq bronlarni ko'radi
+        Index("ix_appointments_pending_created", "created_at", postgresql_where=(status == 'pending')),
+        Index("ix_appointments_confirmed_ends", "ends_at", postgresql_where=(status == 'confirmed')),
+    )
+
+class ReminderLog(Base):
+    # Yuborilgan eslatma bosqichlari - bir bosqich ikki marta yuborilmaydi
+    __tablename__ = "reminder_log"
+
+    appointment_id: Mapped[int] = mapped_column(ForeignKey("appointments.id", ondelete="CASCADE"), primary_key=True)
+    stage_minutes: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class SlotHold(Base):
+    # Vaqt tanlangandan keyin bron yakunlangunga qadar qisqa muddatli band qilish
+    __tablename__ = "slot_holds"
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(always=False), primary_key=True)
+    barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id", ondelete="CASCADE"))
+    holder_telegram_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    starts_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    ends_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        ExcludeConstraint(
+            (barber_id, '='),
+            (func.tstzrange(starts_at, ends_at, '[)'), '&&'),
+            name='no_hold_overlap'
+        ),
     )
 
+class WaitlistEntry(Base):
+    # To'la kun uchun navbat: bron bekor qilinsa, mos oynadagi mijozlarga xabar beriladi
+    __tablename__ = "waitlist_entries"
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(always=False), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id", ondelete="CASCADE"))
+    day: Mapped[date] = mapped_column(Date)
+    window_start: Mapped[time] = mapped_column(Time)
+    window_end: Mapped[time] = mapped_column(Time)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, server_default="true")
+    notified_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    user: Mapped["User"] = relationship()
+    service: Mapped["Service"] = relationship()
+
+    __table_args__ = (
+        # Bo'shagan oraliq bo'yicha moslash faqat shu sananing faol yozuvlarini o'qiydi
+        Index(
+            "ix_waitlist_active_day_window", "day", "window_start", "window_end",
+            postgresql_where=(is_active == True)
+        ),
+    )
+
+class OutboxMessage(Base):
+    # Bron o'zgarishi bilan bitta tranzaksiyada yoziladigan xabarlar; dispatcher yuboradi
+    __tablename__ = "outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(always=False), primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    method: Mapped[str] = mapped_column(String) # send_message/send_photo
+    payload: Mapped[dict] = mapped_column(JSONB)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Dispatcher faqat yuborilmaganlarni o'qiydi
+        Index("ix_outbox_pending", "next_attempt_at", postgresql_where=(delivered_at.is_(None))),
+    )
+
+class Campaign(Base):
+    # Barcha mijozlarga xabar yuborish; last_user_id - qayta ishga tushganda davom etish nuqtasi
+    __tablename__ = "campaigns"
+
+    id: Mapped[int] = mapped_column(Integer, Identity(always=False), primary_key=True)
+    text: Mapped[str] = mapped_column(String)
+    status: Mapped[str] = mapped_column(String, default="running", server_default="running") # running/done
+    created_by: Mapped[int] = mapped_column(BigInteger) # admin telegram id
+    status_chat_id: Mapped[int] = mapped_column(BigInteger)
+    status_message_id: Mapped[int] = mapped_column(Integer)
+    last_user_id: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+    sent: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    failed: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    blocked: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Tasdiqlash xabari bitta kampaniyaga aylanadi - ikki marta bosish ikkinchisini yaratmaydi
+        UniqueConstraint("status_chat_id", "status_message_id", name="uq_campaigns_status_message"),
+    )
+
+class CampaignDelivery(Base):
+    __tablename__ = "campaign_deliveries"
+
+    campaign_id: Mapped[int] = mapped_column(ForeignKey("campaigns.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status: Mapped[str] = mapped_column(String) # sent/failed/blocked
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
 class Settings(Base):
     __tablename__ = "settings"
     key: Mapped[str] = mapped_column(String, primary_key=True)
     value: Mapped[str] = mapped_column(String)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+class FsmState(Base):
+    # aiogram FSM holati - deploy/crashdan keyin ham saqlanadi, replikalar uchun umumiy
+    __tablename__ = "fsm_states"
+    key: Mapped[str] = mapped_column(String, primary_key=True) # bot:chat:user[:thread][:destiny]
+    state: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    data: Mapped[dict] = mapped_column(JSONB, default=dict, server_default="{}")
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # TTL tozalovchisi uchun
+        Index("ix_fsm_states_updated_at", "updated_at"),
+    )
+
 class PortfolioItem(Base):
     __tablename__ = "portfolio_items"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
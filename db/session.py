@@ -8,3 +8,7 @@ async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit
 async def get_db_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+# Har bir update uchun so'rovlar soni va ulanish ushlab turilgan vaqt (db/stats.py)
+from db.stats import instrument
+instrument(engine)
@@ -0,0 +1,119 @@
+# db/stats.py
+import time as _time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.metrics import db_query_seconds
+
+# Shu execution option bilan bajarilgan so'rovlar (FSM storage) handler byudjetiga kirmaydi
+FSM_QUERY_OPTION = "fsm_storage"
+# Bitta update ichida bir xil so'rov shuncha marta takrorlansa - N+1 shubhasi
+REPEATED_STATEMENT_THRESHOLD = 3
+
+@dataclass
+class QueryStats:
+    """Bitta update (yoki fon ishi) davomidagi DB hisoblagichlari."""
+    queries: int = 0
+    query_time: float = 0.0
+    fsm_queries: int = 0
+    # Puldan olingan ulanishlar va ular qancha vaqt ushlab turilgani
+    checkouts: int = 0
+    checkout_held: float = 0.0
+    # Update'ni qaysi handler qayta ishlagani va u bajargan so'rovlar (metrics middleware to'ldiradi)
+    handler: Optional[str] = None
+    handler_queries: int = 0
+    # So'rov matni -> necha marta; faqat statements=True bilan kuzatilganda
+    statements: Optional[Dict[str, int]] = None
+
+    def merge(self, other: "QueryStats"):
+        """Ichki hisoblagich (masalan, middleware ichidagi) tashqi kuzatuvga qo'shiladi."""
+        self.queries += other.queries
+        self.query_time += other.query_time
+        self.fsm_queries += other.fsm_queries
+        self.checkouts += other.checkouts
+        self.checkout_held += other.checkout_held
+        if self.statements is not None and other.statements:
+            for statement, count in other.statements.items():
+                self.statements[statement] = self.statements.get(statement, 0) + count
+
+    def repeated(self, threshold: int = REPEATED_STATEMENT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Parametrlari boshqa, lekin matni bir xil so'rovlar - odatda sikl ichidagi lazy yuklash."""
+        if not self.statements:
+            return []
+        return sorted(
+            ((statement, count) for statement, count in self.statements.items() if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+@contextmanager
+def track_queries(statements: bool = False):
+    """Ichma-ich ishlatilsa, ichki blokdagi so'rovlar tashqisiga ham qo'shiladi."""
+    parent = current_stats.get()
+    stats = QueryStats(statements={} if statements else None)
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+        if parent is not None:
+            parent.merge(stats)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@contextmanager
+def query_budget(limit: int):
+    """
+    Skriptlar va testlar uchun: blok ichida `limit` dan ko'p so'rov bajarilsa, xato beradi.
+    FSM storage so'rovlari hisobga olinmaydi.
+
+        with query_budget(2):
+            await driver.callback(user_id, "date_2030-01-01")
+    """
+    with track_queries(statements=True) as stats:
+        yield stats
+    if stats.queries > limit:
+        details = "\n".join(f"  {count}x {statement}" for statement, count in stats.repeated(1))
+        raise QueryBudgetExceeded(f"{stats.queries} queries, budget {limit}:\n{details}")
+
+def instrument(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started_at"] = _time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = _time.perf_counter() - conn.info.pop("query_started_at", _time.perf_counter())
+        db_query_seconds.observe(elapsed)
+        stats = current_stats.get()
+        if stats is None:
+            return
+        if context is not None and context.execution_options.get(FSM_QUERY_OPTION):
+            stats.fsm_queries += 1
+            return
+        stats.queries += 1
+        stats.query_time += elapsed
+        if stats.statements is not None:
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        stats = current_stats.get()
+        record.info["stats"] = stats
+        record.info["checked_out_at"] = _time.perf_counter()
+        if stats is not None:
+            stats.checkouts += 1
+
+    @event.listens_for(sync_engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        stats = record.info.pop("stats", None)
+        checked_out_at = record.info.pop("checked_out_at", None)
+        if stats is not None and checked_out_at is not None:
+            stats.checkout_held += _time.perf_counter() - checked_out_at
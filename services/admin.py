@@ -1,14 +1,19 @@
-
 # services/admin.py
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, or_
-from db.models import Service, WorkSchedule, User
-from datetime import time
+from db.models import Service, WorkSchedule, User, Barber, ScheduleOverride
+from services.availability import availability_index, availability_changed, days_payload, weekday_payload
+from services.calendar import effective_calendar, calendar_changed
+from services.catalog import service_catalog, CATALOG_CHANNEL
+from services.settings_cache import settings_cache, SETTINGS_CHANNEL
+from services.identity import identity_cache, IDENTITY_CHANNEL
+from services.invalidation import notify
+from datetime import time, date
+from typing import Dict, Optional
 
-async def get_all_services(session: AsyncSession):
-    query = select(Service).order_by(Service.sort_order)
-    res = await session.execute(query)
-    return res.scalars().all()
+async def get_all_services(session: AsyncSession, only_active: bool = False):
+    # Katalog keshidan - odatda so'rovsiz
+    return await service_catalog.get_all(session, only_active=only_active)
 
 async def get_service(session: AsyncSession, service_id: int):
     return await session.get(Service, service_id)
@@ -23,46 +28,144 @@ async def create_service(session: AsyncSession, name: str, price: float, duratio
         sort_order=0
     )
     session.add(service)
+    await notify(session, CATALOG_CHANNEL, "")
     await session.commit()
     await session.refresh(service)
+    service_catalog.invalidate()
     return service
 
 async def update_service(session: AsyncSession, service_id: int, **kwargs):
     stmt = update(Service).where(Service.id == service_id).values(**kwargs)
     await session.execute(stmt)
+    await notify(session, CATALOG_CHANNEL, str(service_id))
     await session.commit()
+    service_catalog.invalidate()
 
 async def delete_service(session: AsyncSession, service_id: int):
     stmt = delete(Service).where(Service.id == service_id)
     await session.execute(stmt)
+    await notify(session, CATALOG_CHANNEL, str(service_id))
     await session.commit()
+    service_catalog.invalidate()
 
 async def toggle_service_active(session: AsyncSession, service_id: int):
     service = await session.get(Service, service_id)
     if service:
         service.is_active = not service.is_active
+        await notify(session, CATALOG_CHANNEL, str(service_id))
         await session.commit()
+        service_catalog.invalidate()
     return service
 
-async def get_work_schedule(session: AsyncSession):
-    query = select(WorkSchedule).order_by(WorkSchedule.weekday)
+async def get_barbers(session: AsyncSession, only_active: bool = True):
+    query = select(Barber).order_by(Barber.sort_order, Barber.id)
+    if only_active:
+        query = query.where(Barber.is_active == True)
     res = await session.execute(query)
     return res.scalars().all()
 
-async def update_work_schedule_day(session: AsyncSession, weekday: int, is_day_off: bool, start: time, end: time):
-    query = select(WorkSchedule).where(WorkSchedule.weekday == weekday)
+async def get_primary_barber_id(session: AsyncSession):
+    query = select(Barber.id).where(Barber.is_active == True).order_by(Barber.sort_order, Barber.id).limit(1)
+    return (await session.execute(query)).scalar_one_or_none()
+
+async def create_barber(session: AsyncSession, name: str, telegram_user_id: int = None):
+    """Yangi sartarosh asosiy sartaroshning haftalik jadvali bilan yaratiladi."""
+    primary_id = await get_primary_barber_id(session)
+    barber = Barber(name=name, telegram_user_id=telegram_user_id)
+    session.add(barber)
+    await session.flush()
+
+    if primary_id is not None:
+        for day in await get_work_schedule(session, primary_id):
+            session.add(WorkSchedule(
+                barber_id=barber.id, weekday=day.weekday, is_day_off=day.is_day_off,
+                start_time=day.start_time, end_time=day.end_time,
+                break_start=day.break_start, break_end=day.break_end
+            ))
+    await calendar_changed(session)
+    await availability_changed(session, "")
+    await session.commit()
+    await session.refresh(barber)
+    effective_calendar.invalidate()
+    availability_index.clear()
+    return barber
+
+async def get_work_schedule(session: AsyncSession, barber_id: int = None):
+    """Sartarosh jadvali; barber_id berilmasa - asosiy sartaroshniki (admin paneli uchun)."""
+    if barber_id is None:
+        barber_id = await get_primary_barber_id(session)
+    query = select(WorkSchedule).where(WorkSchedule.barber_id == barber_id).order_by(WorkSchedule.weekday)
     res = await session.execute(query)
-    day = res.scalar_one_or_none()
-    
-    if day:
-        day.is_day_off = is_day_off
-        day.start_time = start
-        day.end_time = end
+    return res.scalars().all()
+
+async def update_work_schedule_day(session: AsyncSession, weekday: int, is_day_off: bool, start: time, end: time, barber_id: int = None):
+    """barber_id berilmasa, o'zgarish barcha faol sartaroshlarga qo'llanadi (do'kon ish vaqti)."""
+    if barber_id is None:
+        barber_ids = [b.id for b in await get_barbers(session)]
     else:
-        day = WorkSchedule(weekday=weekday, is_day_off=is_day_off, start_time=start, end_time=end)
-        session.add(day)
+        barber_ids = [barber_id]
+
+    query = select(WorkSchedule).where(WorkSchedule.weekday == weekday, WorkSchedule.barber_id.in_(barber_ids))
+    res = await session.execute(query)
+    days = {d.barber_id: d for d in res.scalars().all()}
+    
+    for b_id in barber_ids:
+        day = days.get(b_id)
+        if day:
+            day.is_day_off = is_day_off
+            day.start_time = start
+            day.end_time = end
+        else:
+            day = WorkSchedule(barber_id=b_id, weekday=weekday, is_day_off=is_day_off, start_time=start, end_time=end)
+            session.add(day)
     
+    await calendar_changed(session)
+    await availability_changed(session, weekday_payload(weekday))
     await session.commit()
+    effective_calendar.invalidate()
+    availability_index.invalidate_weekday(weekday)
+
+# --- Schedule Overrides (bayramlar, qisqa kunlar) ---
+async def get_schedule_overrides(session: AsyncSession, from_date: date):
+    query = select(ScheduleOverride).where(ScheduleOverride.day >= from_date).order_by(ScheduleOverride.day)
+    res = await session.execute(query)
+    return res.scalars().all()
+
+async def set_schedule_override(
+    session: AsyncSession, day: date, is_day_off: bool,
+    start: time = None, end: time = None,
+    break_start: time = None, break_end: time = None, note: str = None
+):
+    query = select(ScheduleOverride).where(ScheduleOverride.day == day)
+    override = (await session.execute(query)).scalar_one_or_none()
+    if not override:
+        override = ScheduleOverride(day=day)
+        session.add(override)
+
+    override.is_day_off = is_day_off
+    override.start_time = start
+    override.end_time = end
+    override.break_start = break_start
+    override.break_end = break_end
+    override.note = note
+    await calendar_changed(session)
+    await availability_changed(session, days_payload([day]))
+    await session.commit()
+    effective_calendar.invalidate()
+    availability_index.invalidate(day)
+    return override
+
+async def delete_schedule_override(session: AsyncSession, override_id: int):
+    override = await session.get(ScheduleOverride, override_id)
+    if override:
+        day = override.day
+        await session.delete(override)
+        await calendar_changed(session)
+        await availability_changed(session, days_payload([day]))
+        await session.commit()
+        effective_calendar.invalidate()
+        availability_index.invalidate(day)
+    return override
 
 # --- User Management ---
 async def get_admins(session: AsyncSession):
@@ -71,16 +174,27 @@ async def get_admins(session: AsyncSession):
     res = await session.execute(query)
     return res.scalars().all()
 
+async def get_admin_telegram_ids(session: AsyncSession):
+    query = select(User.telegram_user_id).where(or_(User.is_superadmin == True, User.admin_type.is_not(None)))
+    return (await session.execute(query)).scalars().all()
+
 async def ensure_user(session: AsyncSession, telegram_id: int, first_name: str=None, username: str=None):
     query = select(User).where(User.telegram_user_id == telegram_id)
     user = (await session.execute(query)).scalar_one_or_none()
     if not user:
         user = User(telegram_user_id=telegram_id, first_name=first_name, username=username)
         session.add(user)
+        # Boshqa replikalar keshidagi "ro'yxatdan o'tmagan" (None) yozuvi ham tozalanadi
+        await user_changed(session, telegram_id)
         await session.commit()
         await session.refresh(user) # Refresh added per requirement
+        identity_cache.invalidate(telegram_id)
     return user
 
+async def user_changed(session: AsyncSession, telegram_id: int):
+    """Rol yoki profil o'zgarishidan keyin, commitdan oldin chaqiriladi - barcha replikalar keshni yangilaydi."""
+    await notify(session, IDENTITY_CHANNEL, str(telegram_id))
+
 async def set_admin_role(session: AsyncSession, telegram_id: int, role: str): 
     # Role validation added
     if role not in ('full', 'limited', None):
@@ -88,13 +202,17 @@ async def set_admin_role(session: AsyncSession, telegram_id: int, role: str):
         
     user = await ensure_user(session, telegram_id)
     user.admin_type = role
+    await user_changed(session, telegram_id)
     await session.commit()
+    identity_cache.invalidate(telegram_id)
     return user
 
 async def get_setting(session: AsyncSession, key: str, default: str = None):
-    from db.models import Settings
-    setting = await session.get(Settings, key)
-    return setting.value if setting else default
+    return await settings_cache.get(session, key, default)
+
+async def get_settings(session: AsyncSession, defaults: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    """Bir nechta sozlama bittada: {kalit: standart qiymat} -> {kalit: qiymat}."""
+    return await settings_cache.get_many(session, defaults)
 
 async def set_setting(session: AsyncSession, key: str, value: str):
     from db.models import Settings
@@ -104,4 +222,7 @@ async def set_setting(session: AsyncSession, key: str, value: str):
     else:
         setting = Settings(key=key, value=value)
         session.add(setting)
+    # NOTIFY commit bilan birga yetkaziladi - boshqa replikalar keshni yangilaydi
+    await notify(session, SETTINGS_CHANNEL, key)
     await session.commit()
+    settings_cache.set_local(key, value)
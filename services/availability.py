@@ -0,0 +1,161 @@
+# services/availability.py
+import time as _time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.invalidation import notify, subscribe
+from utils.time import from_utc, get_today
+
+# Boshqa replikalar yoki to'g'ridan-to'g'ri DB o'zgarishlari uchun xavfsizlik chegarasi
+INDEX_TTL_SECONDS = 300
+# Eng ko'p shuncha kun saqlanadi (LRU); o'tgan kunlar kun almashganda o'chiriladi
+INDEX_MAX_DAYS = 120
+# Band/bo'sh vaqt o'zgargan sanalar boshqa replikalarga shu kanal orqali yetkaziladi.
+# Payload: "2026-10-19,2026-10-20" - shu sanalar, "weekday:3" - hafta kuni, "" - hammasi
+AVAILABILITY_CHANNEL = "availability_changed"
+WEEKDAY_PREFIX = "weekday:"
+
+
+@dataclass
+class ResourceDay:
+    """Bitta sartaroshning kunlik jadvali va band oraliqlari (UTC, saralangan)."""
+    barber_id: int
+    start_time: time
+    end_time: time
+    break_start: Optional[time]
+    break_end: Optional[time]
+    busy: List[Tuple[datetime, datetime]]
+    # None - barcha xizmatlarni bajaradi
+    service_ids: Optional[FrozenSet[int]] = None
+
+    def can_serve(self, service_id: int) -> bool:
+        return self.service_ids is None or service_id in self.service_ids
+
+
+@dataclass
+class DaySnapshot:
+    """Bir kunlik ishlayotgan sartaroshlar - DB dan bir marta o'qiladi."""
+    resources: List[ResourceDay]
+    built_at: float = field(default_factory=_time.monotonic)
+    # (service_id, total_duration) -> tayyor slotlar ro'yxati
+    slots: Dict[Tuple[int, int], List[dict]] = field(default_factory=dict)
+
+    @property
+    def is_day_off(self) -> bool:
+        return not self.resources
+
+
+class AvailabilityIndex:
+    """
+    Process ichidagi bo'sh vaqtlar indeksi.
+    Kalit: sana -> DaySnapshot, uning ichida (xizmat, davomiylik) -> slotlar.
+    Yozish yo'llari (booking yaratish/bekor qilish/ko'chirish, jadval) invalidate() chaqiradi.
+    Hajmi INDEX_MAX_DAYS bilan cheklangan, o'tgan sanalar prune() bilan tozalanadi.
+    """
+
+    def __init__(self, ttl: int = INDEX_TTL_SECONDS, maxsize: int = INDEX_MAX_DAYS):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._days: "OrderedDict[date, DaySnapshot]" = OrderedDict()
+        self._generation: Dict[date, int] = {}
+        self._global_generation = 0
+        self._pruned_on: Optional[date] = None
+
+    def generation(self, d: date) -> Tuple[int, int]:
+        return self._global_generation, self._generation.get(d, 0)
+
+    def get_day(self, d: date) -> Optional[DaySnapshot]:
+        snap = self._days.get(d)
+        if snap is None:
+            return None
+        if _time.monotonic() - snap.built_at > self.ttl:
+            self._days.pop(d, None)
+            return None
+        self._days.move_to_end(d)
+        return snap
+
+    def put_day(self, d: date, snap: DaySnapshot, generation: Tuple[int, int]) -> bool:
+        # Qurish paytida invalidate bo'lgan bo'lsa, eskirgan ma'lumotni saqlamaymiz
+        if generation != self.generation(d):
+            return False
+        today = get_today()
+        if self._pruned_on != today:
+            self.prune(today)
+        self._days[d] = snap
+        self._days.move_to_end(d)
+        while len(self._days) > self.maxsize:
+            self._days.popitem(last=False)
+        return True
+
+    def prune(self, today: date):
+        """Bugundan oldingi sanalarni va ularning generation hisoblagichlarini o'chiradi."""
+        for d in [d for d in self._days if d < today]:
+            del self._days[d]
+        for d in [d for d in self._generation if d < today]:
+            del self._generation[d]
+        self._pruned_on = today
+
+    def put_slots(self, d: date, snap: DaySnapshot, key: Tuple[int, int], slots: List[dict]):
+        # Faqat hozir indeksda turgan snapshotga bog'laymiz
+        if self._days.get(d) is snap:
+            snap.slots[key] = slots
+
+    def invalidate(self, *dates: date):
+        for d in dates:
+            self._days.pop(d, None)
+            self._generation[d] = self._generation.get(d, 0) + 1
+
+    def invalidate_range(self, starts_at: datetime, ends_at: datetime):
+        """UTC oraliq tegishli bo'lgan barcha mahalliy sanalarni tozalaydi."""
+        self.invalidate(*local_days(starts_at, ends_at))
+
+    def invalidate_weekday(self, weekday: int):
+        self.invalidate(*[d for d in self._days if d.weekday() == weekday])
+        self._global_generation += 1
+
+    def clear(self):
+        self._days.clear()
+        self._global_generation += 1
+
+    def apply(self, payload: str):
+        """AVAILABILITY_CHANNEL xabarini qo'llaydi."""
+        if not payload:
+            self.clear()
+        elif payload.startswith(WEEKDAY_PREFIX):
+            self.invalidate_weekday(int(payload[len(WEEKDAY_PREFIX):]))
+        else:
+            self.invalidate(*[date.fromisoformat(d) for d in payload.split(",")])
+
+
+def local_days(starts_at: datetime, ends_at: datetime) -> List[date]:
+    """UTC oraliq tegishli bo'lgan mahalliy sanalar."""
+    start_day = from_utc(starts_at).date()
+    end_day = from_utc(ends_at).date()
+    days = [start_day]
+    while days[-1] < end_day:
+        days.append(date.fromordinal(days[-1].toordinal() + 1))
+    return days
+
+def days_payload(days: Iterable[date]) -> str:
+    return ",".join(sorted({d.isoformat() for d in days}))
+
+def range_payload(*intervals: Tuple[datetime, datetime]) -> str:
+    return days_payload(d for starts_at, ends_at in intervals for d in local_days(starts_at, ends_at))
+
+def weekday_payload(weekday: int) -> str:
+    return f"{WEEKDAY_PREFIX}{weekday}"
+
+async def availability_changed(session: AsyncSession, payload: str):
+    """Commitdan oldin chaqiriladi - barcha replikalar indeksdagi shu sanalarni eskirtiradi."""
+    await notify(session, AVAILABILITY_CHANNEL, payload)
+
+
+availability_index = AvailabilityIndex()
+
+async def _on_reconnect():
+    availability_index.clear()
+
+subscribe(AVAILABILITY_CHANNEL, availability_index.apply, _on_reconnect)
@@ -1,16 +1,317 @@
-
 # services/booking.py
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import select
+from sqlalchemy import select, delete, update, func, or_, literal, exists, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
-from db.models import Appointment, AppointmentStatus, User, Service
-from utils.time import to_utc
+from typing import Any, List, Optional
+import pytz
+from db.models import Appointment, AppointmentStatus, User, Barber, SlotHold, ReminderLog
+from services.availability import (
+    AVAILABILITY_CHANNEL, availability_index, availability_changed, range_payload
+)
+from services.catalog import service_catalog, ServiceInfo
+from services.admin import get_setting
+from services.outbox import Notify, stage
+from services.reminders import get_stages, first_reminder_at, schedule_wake
+from services.schedule import load_day_snapshot, free_barbers
+from utils.time import to_utc, from_utc
+
+# Vaqt tanlangandan keyin bron yakunlanishi uchun beriladigan muddat
+HOLD_TTL_MINUTES = 10
+# Admin shu muddat ichida tasdiqlamagan PENDING bron bekor qilinadi (sozlama, daqiqa)
+PENDING_TIMEOUT_KEY = "pending_timeout_minutes"
+DEFAULT_PENDING_TIMEOUT_MINUTES = 120
+# Admin kiritadigan chegaralar: 5 daqiqadan 7 kungacha
+MIN_PENDING_TIMEOUT_MINUTES = 5
+MAX_PENDING_TIMEOUT_MINUTES = 7 * 24 * 60
+# no_overlap cheklovi qamrab oladigan ochiq bronlar
+ACTIVE_STATUSES = (AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED)
+# Yangi holatga faqat shu holatlardan o'tiladi - yopilgan bron qayta ochilmaydi
+ALLOWED_TRANSITIONS = {
+    AppointmentStatus.CONFIRMED: (AppointmentStatus.PENDING,),
+    AppointmentStatus.CANCELLED: ACTIVE_STATUSES,
+    AppointmentStatus.COMPLETED: (AppointmentStatus.CONFIRMED,),
+}
 
 class SlotOccupiedError(Exception):
     pass
 
+async def get_booking_by_idempotency_key(session: AsyncSession, key: str) -> Optional[Appointment]:
+    query = select(Appointment).where(Appointment.idempotency_key == key)
+    return (await session.execute(query)).scalar_one_or_none()
+
+async def candidate_barbers(
+    session: AsyncSession,
+    service_id: int,
+    start_utc: datetime,
+    end_utc: datetime,
+    preferred: Optional[int] = None,
+    only_free: bool = False
+) -> List[int]:
+    """Avtomatik biriktirish uchun sartaroshlar tartibi (kun snapshotidan, qo'shimcha so'rovsiz)."""
+    snap = await load_day_snapshot(session, from_utc(start_utc).date())
+    candidates = free_barbers(snap, service_id, start_utc, end_utc, only_free=only_free)
+    if only_free:
+        return candidates
+    if preferred is not None:
+        candidates = [preferred] + [b for b in candidates if b != preferred]
+    if not candidates:
+        # Dam olish kuni yoki jadvaldan tashqari (masalan, admin qo'lda) - asosiy sartarosh
+        query = select(Barber.id).where(Barber.is_active == True).order_by(Barber.sort_order, Barber.id).limit(1)
+        primary = (await session.execute(query)).scalar_one_or_none()
+        if primary is None:
+            raise ValueError("No active barber")
+        candidates = [primary]
+    return candidates
+
+def _literal_source(table, values: dict):
+    return select(*[literal(v, type_=table.c[c].type) for c, v in values.items()])
+
+def _active_holds(barber_id, starts_at, ends_at):
+    """Sartaroshning oraliq bilan kesishgan amaldagi band qilishlari."""
+    return select(SlotHold.id).where(
+        SlotHold.barber_id == barber_id,
+        SlotHold.starts_at < ends_at,
+        SlotHold.ends_at > starts_at,
+        SlotHold.expires_at > func.now()
+    )
+
+def _active_bookings(barber_id, starts_at, ends_at):
+    """Sartaroshning oraliq bilan kesishgan ochiq bronlari."""
+    return select(Appointment.id).where(
+        Appointment.barber_id == barber_id,
+        Appointment.starts_at < ends_at,
+        Appointment.ends_at > starts_at,
+        Appointment.status.in_(ACTIVE_STATUSES)
+    )
+
+def _insert_hold_stmt(values: dict):
+    """Bitta so'rov: sartaroshda shu vaqtga ochiq bron bo'lmasa INSERT ... RETURNING."""
+    booked = _active_bookings(values["barber_id"], values["starts_at"], values["ends_at"])
+    return (
+        pg_insert(SlotHold)
+        .from_select(list(values), _literal_source(SlotHold.__table__, values).where(~exists(booked)))
+        .returning(SlotHold)
+    )
+
+# --- Slot Holds ---
+async def place_hold(
+    session: AsyncSession,
+    holder_telegram_id: int,
+    service_id: int,
+    start_time: datetime,
+    ttl_minutes: int = HOLD_TTL_MINUTES,
+    keep_other_holds: bool = False
+) -> Optional[SlotHold]:
+    """
+    Tanlangan vaqtni ttl_minutes ga vaqtincha band qiladi. Bo'sh sartarosh bo'lmasa None.
+    Mijozda shu vaqt uchun faol band qilish bo'lsa (masalan, navbatdan), u uzaytirilib qaytariladi.
+    Mijozning boshqa band qilishlari bekor qilinadi (keep_other_holds=True bo'lsa - tegilmaydi).
+    """
+    service = await service_catalog.get(session, service_id)
+    if not service:
+        raise ValueError("Service not found")
+
+    start_utc = to_utc(start_time)
+    end_utc = start_utc + timedelta(minutes=service.total_duration)
+    expires_at = datetime.now(pytz.UTC) + timedelta(minutes=ttl_minutes)
+
+    # O'zining band qilishi snapshotda band ko'rinadi - yangisini qo'yish o'rniga uni olamiz
+    existing = (await session.execute(
+        update(SlotHold)
+        .where(
+            SlotHold.holder_telegram_id == holder_telegram_id,
+            SlotHold.starts_at == start_utc,
+            SlotHold.ends_at == end_utc,
+            SlotHold.expires_at > func.now()
+        )
+        .values(expires_at=func.greatest(SlotHold.expires_at, expires_at))
+        .returning(SlotHold)
+        .execution_options(synchronize_session=False)
+    )).scalars().first()
+    if existing is not None:
+        if not keep_other_holds:
+            released = (await session.execute(
+                delete(SlotHold)
+                .where(SlotHold.holder_telegram_id == holder_telegram_id, SlotHold.id != existing.id)
+                .returning(SlotHold.starts_at, SlotHold.ends_at)
+            )).all()
+            if released:
+                await availability_changed(session, range_payload(*released))
+        await session.commit()
+        return existing
+
+    stale = SlotHold.expires_at <= func.now()
+    if not keep_other_holds:
+        stale = or_(stale, SlotHold.holder_telegram_id == holder_telegram_id)
+
+    candidates = await candidate_barbers(session, service_id, start_utc, end_utc, only_free=True)
+    try:
+        for candidate in candidates:
+            # Eskilari bilan to'qnashmasligi uchun o'zining va muddati o'tganlarini o'chiramiz
+            released = (await session.execute(
+                delete(SlotHold).where(stale).returning(SlotHold.starts_at, SlotHold.ends_at)
+            )).all()
+            await availability_changed(session, range_payload((start_utc, end_utc), *released))
+            values = dict(
+                barber_id=candidate,
+                holder_telegram_id=holder_telegram_id,
+                starts_at=start_utc,
+                ends_at=end_utc,
+                expires_at=expires_at
+            )
+            try:
+                hold = (await session.execute(_insert_hold_stmt(values))).scalars().first()
+            except IntegrityError as e:
+                await session.rollback()
+                if "no_hold_overlap" not in str(e):
+                    raise e
+                continue
+            # Snapshot eskirgan bo'lsa ham - sartaroshda shu vaqtga bron bor
+            if hold is None:
+                continue
+            await session.commit()
+            return hold
+        # Hech biri bo'lmadi - mijozning avvalgi band qilishlari saqlanadi
+        await session.rollback()
+        return None
+    finally:
+        availability_index.invalidate_range(start_utc, end_utc)
+
+async def release_holds(session: AsyncSession, holder_telegram_id: int):
+    stmt = (
+        delete(SlotHold)
+        .where(SlotHold.holder_telegram_id == holder_telegram_id)
+        .returning(SlotHold.starts_at, SlotHold.ends_at)
+    )
+    released = (await session.execute(stmt)).all()
+    if released:
+        await availability_changed(session, range_payload(*released))
+    await session.commit()
+    for starts_at, ends_at in released:
+        availability_index.invalidate_range(starts_at, ends_at)
+
+async def expire_holds(session: AsyncSession) -> int:
+    """Muddati o'tgan barcha band qilishlarni bitta so'rov bilan o'chiradi."""
+    stmt = (
+        delete(SlotHold)
+        .where(SlotHold.expires_at <= func.now())
+        .returning(SlotHold.starts_at, SlotHold.ends_at)
+    )
+    expired = (await session.execute(stmt)).all()
+    if expired:
+        await availability_changed(session, range_payload(*expired))
+    await session.commit()
+    for starts_at, ends_at in expired:
+        availability_index.invalidate_range(starts_at, ends_at)
+    return len(expired)
+
+async def get_pending_timeout(session: AsyncSession) -> int:
+    value = await get_setting(session, PENDING_TIMEOUT_KEY, str(DEFAULT_PENDING_TIMEOUT_MINUTES))
+    minutes = parse_pending_timeout(str(value))
+    return minutes if minutes is not None else DEFAULT_PENDING_TIMEOUT_MINUTES
+
+def parse_pending_timeout(value: str) -> Optional[int]:
+    """Daqiqalar butun son va ruxsat etilgan oraliqda bo'lsa qaytaradi, aks holda None."""
+    value = value.strip()
+    if not value.isascii() or not value.isdigit():
+        return None
+    minutes = int(value)
+    if not MIN_PENDING_TIMEOUT_MINUTES <= minutes <= MAX_PENDING_TIMEOUT_MINUTES:
+        return None
+    return minutes
+
+async def _bulk_set_status(session: AsyncSession, condition, status: AppointmentStatus, notify: Optional[Notify]) -> List[Any]:
+    """Bitta UPDATE ... RETURNING; xabarlar o'sha tranzaksiyada outboxga yoziladi."""
+    stmt = (
+        update(Appointment)
+        .where(condition)
+        .values(status=status.value, next_reminder_at=None)
+        .returning(Appointment.id, Appointment.user_id, Appointment.starts_at, Appointment.ends_at)
+        .execution_options(synchronize_session=False)
+    )
+    rows = (await session.execute(stmt)).all()
+    for row in rows:
+        stage(session, notify, row)
+    if rows:
+        await availability_changed(session, range_payload(*[(row.starts_at, row.ends_at) for row in rows]))
+    await session.commit()
+    for row in rows:
+        availability_index.invalidate_range(row.starts_at, row.ends_at)
+    return rows
+
+async def expire_pending_bookings(
+    session: AsyncSession,
+    timeout_minutes: int,
+    notify: Optional[Notify] = None
+) -> List[Any]:
+    """Muddatida tasdiqlanmagan yoki vaqti o'tib ketgan PENDING bronlarni bekor qiladi."""
+    cutoff = datetime.now(pytz.UTC) - timedelta(minutes=timeout_minutes)
+    condition = (Appointment.status == AppointmentStatus.PENDING.value) & or_(
+        Appointment.created_at <= cutoff,
+        Appointment.starts_at <= func.now()
+    )
+    return await _bulk_set_status(session, condition, AppointmentStatus.CANCELLED, notify)
+
+async def complete_past_bookings(session: AsyncSession, notify: Optional[Notify] = None) -> List[Any]:
+    """Tugash vaqti o'tgan CONFIRMED bronlarni COMPLETED qiladi."""
+    condition = (Appointment.status == AppointmentStatus.CONFIRMED.value) & (Appointment.ends_at <= func.now())
+    return await _bulk_set_status(session, condition, AppointmentStatus.COMPLETED, notify)
+
+@dataclass
+class BookingResult:
+    """Tasdiqlash xabari va admin xabarnomasi uchun kerak bo'lgan hamma narsa."""
+    id: int
+    barber_id: int
+    starts_at: datetime
+    ends_at: datetime
+    service: ServiceInfo
+    admin_ids: List[int] = field(default_factory=list)
+    # True - shu idempotency_key bilan bron avval yaratilgan
+    replayed: bool = False
+
+def _admin_ids_subquery():
+    return (
+        select(func.array_agg(User.telegram_user_id))
+        .where((User.is_superadmin == True) | (User.admin_type.is_not(None)))
+        .scalar_subquery()
+    )
+
+def _insert_booking_stmt(values: dict, holder_telegram_id: Optional[int]):
+    """
+    Bitta so'rov: boshqalarning band qilishi bo'lmasa INSERT ... RETURNING,
+    egasining band qilishini o'chirish va adminlar ro'yxati.
+    """
+    table = Appointment.__table__
+    other_holds = _active_holds(values["barber_id"], values["starts_at"], values["ends_at"])
+    if holder_telegram_id is not None:
+        other_holds = other_holds.where(SlotHold.holder_telegram_id != holder_telegram_id)
+
+    source = _literal_source(table, values).where(~exists(other_holds))
+    inserted = (
+        pg_insert(table)
+        .from_select(list(values), source)
+        .on_conflict_do_nothing(index_elements=[table.c.idempotency_key])
+        .returning(table.c.id)
+        .cte("inserted")
+    )
+    # Faqat qator qo'shilganda bajariladi - boshqa replikalar shu kunlarni eskirtiradi
+    changed = func.pg_notify(AVAILABILITY_CHANNEL, range_payload((values["starts_at"], values["ends_at"])))
+    stmt = select(inserted.c.id, _admin_ids_subquery().label("admin_ids"), changed.label("notified"))
+    if holder_telegram_id is not None:
+        # Band qilish bron bilan bitta tranzaksiyada o'chadi
+        released = (
+            delete(SlotHold)
+            .where(SlotHold.holder_telegram_id == holder_telegram_id)
+            .returning(SlotHold.id)
+            .cte("released")
+        )
+        stmt = stmt.add_cte(released)
+    return stmt
+
 async def create_booking(
     session: AsyncSession,
     user_id: int,
@@ -18,77 +319,214 @@ async def create_booking(
     start_time: datetime,
     customer_phone: str,
     customer_name: str,
-    created_by: str = "client"
-) -> Appointment:
-    service = await session.get(Service, service_id)
+    created_by: str = "client",
+    barber_id: Optional[int] = None,
+    holder_telegram_id: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
+    preferred_barber_id: Optional[int] = None,
+    status: AppointmentStatus = AppointmentStatus.PENDING,
+    payment_amount: Optional[float] = None,
+    payment_receipt_url: Optional[str] = None,
+    notify: Optional[Notify] = None
+) -> BookingResult:
+    """
+    Bron yaratadi: xizmat keshdan, tanlangan sartarosh uchun bitta INSERT ... RETURNING va commit.
+    idempotency_key bilan bron mavjud bo'lsa, yangisi yaratilmaydi - replayed=True qaytadi.
+    notify(BookingResult) qaytargan xabarlar bron bilan bitta tranzaksiyada outboxga yoziladi.
+    """
+    service = await service_catalog.get(session, service_id)
     if not service:
         raise ValueError("Service not found")
-    
+
     start_utc = to_utc(start_time)
-    duration = service.duration_min + service.buffer_min
-    end_utc = start_utc + timedelta(minutes=duration)
-
-    appointment = Appointment(
-        user_id=user_id,
-        service_id=service_id,
-        status=AppointmentStatus.PENDING,
-        starts_at=start_utc,
-        ends_at=end_utc,
-        customer_phone=customer_phone,
-        customer_name=customer_name,
-        created_by=created_by
-    )
-    
-    session.add(appointment)
+    end_utc = start_utc + timedelta(minutes=service.total_duration)
+    next_reminder_at = None
+    if status == AppointmentStatus.CONFIRMED:
+        next_reminder_at = first_reminder_at(start_utc, await get_stages(session))
+
+    if barber_id is not None:
+        candidates = [barber_id]
+    else:
+        candidates = await candidate_barbers(
+            session, service_id, start_utc, end_utc, preferred=preferred_barber_id
+        )
+
     try:
-        await session.commit()
-        await session.refresh(appointment)
-        return appointment
-    except IntegrityError as e:
-        await session.rollback()
-        if "no_overlap" in str(e):
-            raise SlotOccupiedError("This slot is already taken.")
-        raise e
+        # Bo'sh sartaroshlar birinchi; poyga holatida no_overlap keyingisiga o'tkazadi
+        for candidate in candidates:
+            values = {
+                "user_id": user_id,
+                "service_id": service_id,
+                "barber_id": candidate,
+                "status": AppointmentStatus(status).value,
+                "starts_at": start_utc,
+                "ends_at": end_utc,
+                "customer_phone": customer_phone,
+                "customer_name": customer_name,
+                "created_by": created_by,
+                "idempotency_key": idempotency_key,
+                "payment_amount": payment_amount,
+                "payment_receipt_url": payment_receipt_url,
+                "next_reminder_at": next_reminder_at,
+            }
+            try:
+                row = (await session.execute(_insert_booking_stmt(values, holder_telegram_id))).first()
+                if row is not None:
+                    result = BookingResult(row.id, candidate, start_utc, end_utc, service, list(row.admin_ids or []))
+                    stage(session, notify, result)
+                    await schedule_wake(session, next_reminder_at)
+                    await session.commit()
+                    return result
+            except IntegrityError as e:
+                await session.rollback()
+                if "no_overlap" not in str(e):
+                    raise e
+                continue
+
+            # Qator qaytmadi: yo shu kalit bilan bron bor, yo sartaroshni boshqa mijoz band qilgan
+            await session.rollback()
+            if idempotency_key is not None:
+                existing = await get_booking_by_idempotency_key(session, idempotency_key)
+                if existing is not None:
+                    return BookingResult(
+                        existing.id, existing.barber_id, existing.starts_at, existing.ends_at,
+                        service, replayed=True
+                    )
+        raise SlotOccupiedError("This slot is already taken.")
+    finally:
+        # Muvaffaqiyatli bo'lsa ham, band bo'lsa ham indeksdagi kun eskirgan
+        availability_index.invalidate_range(start_utc, end_utc)
 
 async def get_user_bookings(session: AsyncSession, user_id: int):
     query = select(Appointment).options(selectinload(Appointment.service)).where(
         Appointment.user_id == user_id,
-        Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED])
+        Appointment.status.in_(ACTIVE_STATUSES)
     ).order_by(Appointment.starts_at)
     res = await session.execute(query)
     return res.scalars().all()
 
-async def cancel_booking(session: AsyncSession, booking_id: int):
-    appointment = await session.get(Appointment, booking_id)
-    if appointment:
-        appointment.status = AppointmentStatus.CANCELLED
-        await session.commit()
+async def _transition(session: AsyncSession, booking_id: int, status: AppointmentStatus, **values) -> Optional[Appointment]:
+    """
+    Shartli UPDATE ... RETURNING: bron hali ALLOWED_TRANSITIONS dagi holatda bo'lsagina o'zgaradi.
+    None - bron topilmadi yoki allaqachon yopilgan (ikkinchi bosish, muddati o'tgan).
+    """
+    stmt = (
+        update(Appointment)
+        .where(Appointment.id == booking_id, Appointment.status.in_(ALLOWED_TRANSITIONS[status]))
+        .values(status=status.value, **values)
+        .returning(Appointment)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    return (await session.execute(stmt)).scalars().first()
+
+async def set_booking_status(
+    session: AsyncSession,
+    booking_id: int,
+    status: AppointmentStatus,
+    notify: Optional[Notify] = None
+) -> Optional[Appointment]:
+    """Bekor qiladi yoki yakunlaydi; bron allaqachon yopilgan bo'lsa None (xabarlar yozilmaydi)."""
+    # Bekor qilingan yoki yakunlangan bron qisman indeksdan chiqadi
+    appointment = await _transition(session, booking_id, status, next_reminder_at=None)
+    if appointment is None:
+        return None
+    stage(session, notify, appointment)
+    await availability_changed(session, range_payload((appointment.starts_at, appointment.ends_at)))
+    await session.commit()
+    availability_index.invalidate_range(appointment.starts_at, appointment.ends_at)
     return appointment
 
+async def cancel_booking(session: AsyncSession, booking_id: int, notify: Optional[Notify] = None):
+    return await set_booking_status(session, booking_id, AppointmentStatus.CANCELLED, notify)
+
+async def confirm_booking(session: AsyncSession, booking_id: int, notify: Optional[Notify] = None) -> Optional[Appointment]:
+    """PENDING bronni tasdiqlaydi; allaqachon tasdiqlangan yoki yopilgan bo'lsa None."""
+    has_receipt = Appointment.payment_receipt_url.is_not(None)
+    stages = await get_stages(session)
+    appointment = await _transition(
+        session, booking_id, AppointmentStatus.CONFIRMED,
+        is_paid=case((has_receipt, True), else_=Appointment.is_paid),
+        payment_confirmed_at=case((has_receipt, func.now()), else_=Appointment.payment_confirmed_at)
+    )
+    if appointment is None:
+        return None
+    appointment.next_reminder_at = first_reminder_at(appointment.starts_at, stages)
+    stage(session, notify, appointment)
+    await schedule_wake(session, appointment.next_reminder_at)
+    await availability_changed(session, range_payload((appointment.starts_at, appointment.ends_at)))
+    await session.commit()
+    availability_index.invalidate_range(appointment.starts_at, appointment.ends_at)
+    return appointment
+
+async def complete_booking(session: AsyncSession, booking_id: int, notify: Optional[Notify] = None):
+    return await set_booking_status(session, booking_id, AppointmentStatus.COMPLETED, notify)
+
 async def reschedule_booking(
     session: AsyncSession, 
     booking_id: int, 
-    new_start_time: datetime
+    new_start_time: datetime,
+    notify: Optional[Notify] = None
 ) -> Appointment:
     appointment = await session.get(Appointment, booking_id)
     if not appointment:
         raise ValueError("Booking not found")
 
-    service = await session.get(Service, appointment.service_id)
-    duration = service.duration_min + service.buffer_min
-    
+    service = await service_catalog.get(session, appointment.service_id)
+    if not service:
+        raise ValueError("Service not found")
+
     new_start_utc = to_utc(new_start_time)
-    new_end_utc = new_start_utc + timedelta(minutes=duration)
-    
-    appointment.starts_at = new_start_utc
-    appointment.ends_at = new_end_utc
+    new_end_utc = new_start_utc + timedelta(minutes=service.total_duration)
+    old_start_utc, old_end_utc = appointment.starts_at, appointment.ends_at
+    stages = await get_stages(session)
+
+    # Iloji bo'lsa o'sha sartarosh qoladi, aks holda boshqa bo'shiga o'tkaziladi
+    candidates = await candidate_barbers(
+        session, appointment.service_id, new_start_utc, new_end_utc, preferred=appointment.barber_id
+    )
 
+    owner_telegram_id = (
+        select(User.telegram_user_id).where(User.id == Appointment.user_id).scalar_subquery()
+    )
     try:
-        await session.commit()
-        await session.refresh(appointment)
-        return appointment
-    except IntegrityError as e:
-        await session.rollback()
-        if "no_overlap" in str(e):
-            raise SlotOccupiedError("This slot is already taken.")
-        raise e
+        for candidate in candidates:
+            confirmed = appointment.status == AppointmentStatus.CONFIRMED
+            values = dict(barber_id=candidate, starts_at=new_start_utc, ends_at=new_end_utc)
+            # Yangi vaqt uchun eslatmalar bosqichlari boshidan yuboriladi
+            if confirmed:
+                values["next_reminder_at"] = first_reminder_at(new_start_utc, stages)
+            # Boshqa mijozning amaldagi band qilishi ustiga ko'chirilmaydi
+            other_holds = _active_holds(candidate, new_start_utc, new_end_utc).where(
+                SlotHold.holder_telegram_id.is_distinct_from(owner_telegram_id)
+            )
+            stmt = (
+                update(Appointment)
+                .where(Appointment.id == booking_id, ~exists(other_holds))
+                .values(**values)
+                .returning(Appointment.id)
+            )
+            try:
+                moved = (await session.execute(stmt)).scalar_one_or_none()
+            except IntegrityError as e:
+                await session.rollback()
+                if "no_overlap" not in str(e):
+                    raise e
+                await session.refresh(appointment)
+                continue
+            if moved is None:
+                continue
+            # Rollbackdan keyin qo'shilganlar tashlanadi - har urinishda qayta qo'shamiz
+            stage(session, notify, appointment)
+            if confirmed:
+                await session.execute(delete(ReminderLog).where(ReminderLog.appointment_id == booking_id))
+                await schedule_wake(session, values["next_reminder_at"])
+            await availability_changed(
+                session, range_payload((old_start_utc, old_end_utc), (new_start_utc, new_end_utc))
+            )
+            await session.commit()
+            await session.refresh(appointment)
+            return appointment
+        raise SlotOccupiedError("This slot is already taken.")
+    finally:
+        availability_index.invalidate_range(old_start_utc, old_end_utc)
+        availability_index.invalidate_range(new_start_utc, new_end_utc)
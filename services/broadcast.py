@@ -0,0 +1,177 @@
+# services/broadcast.py
+import asyncio
+import logging
+import time as _time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import pytz
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+)
+from sqlalchemy import select, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Campaign, CampaignDelivery, User
+from db.session import async_session
+from services.leader import try_advisory_lock
+from services.send_queue import send_queue
+
+logger = logging.getLogger(__name__)
+
+# Bir vaqtda xotirada turadigan va bitta tranzaksiyada yoziladigan qabul qiluvchilar soni
+CAMPAIGN_CHUNK_SIZE = 200
+# Parallel yuborishlar - umumiy tezlikni send_queue limitlari cheklaydi
+CAMPAIGN_CONCURRENCY = 20
+CAMPAIGN_SEND_ATTEMPTS = 3
+PROGRESS_EDIT_SECONDS = 3
+# Advisory lock sinfi: bitta kampaniyani faqat bitta nusxa yuboradi
+CAMPAIGN_LOCK_CLASS = 2
+
+_running: Dict[int, asyncio.Task] = {}
+
+async def create_campaign(
+    session: AsyncSession,
+    text: str,
+    created_by: int,
+    status_chat_id: int,
+    status_message_id: int
+) -> Optional[Campaign]:
+    """
+    Kampaniya tasdiqlash xabariga bog'lanadi; shu xabar uchun kampaniya bor bo'lsa
+    (ikki marta bosish, qayta yetkazilgan update) yangisi yaratilmaydi - None.
+    """
+    stmt = (
+        pg_insert(Campaign)
+        .values(
+            text=text,
+            created_by=created_by,
+            status_chat_id=status_chat_id,
+            status_message_id=status_message_id
+        )
+        .on_conflict_do_nothing(index_elements=[Campaign.status_chat_id, Campaign.status_message_id])
+        .returning(Campaign)
+    )
+    campaign = await session.scalar(stmt)
+    await session.commit()
+    return campaign
+
+def start_campaign(bot: Bot, campaign_id: int):
+    if campaign_id in _running:
+        return
+    task = asyncio.create_task(run_campaign(bot, campaign_id))
+    _running[campaign_id] = task
+    task.add_done_callback(lambda _: _running.pop(campaign_id, None))
+
+async def resume_campaigns(bot: Bot):
+    """Jarayon to'xtab qolgan kampaniyalarni oxirgi yozilgan joyidan davom ettiradi."""
+    async with async_session() as session:
+        query = select(Campaign.id).where(Campaign.status == "running")
+        campaign_ids = (await session.execute(query)).scalars().all()
+    for campaign_id in campaign_ids:
+        logger.info(f"Resuming campaign {campaign_id}")
+        start_campaign(bot, campaign_id)
+
+async def _deliver(chat_id: int, text: str) -> str:
+    for attempt in range(CAMPAIGN_SEND_ATTEMPTS):
+        try:
+            await send_queue.send_now("send_message", chat_id, text=text)
+            return "sent"
+        except TelegramForbiddenError:
+            return "blocked"
+        except TelegramRetryAfter:
+            # send_now butun navbatni retry_after ga to'xtatib qo'ygan
+            continue
+        except TelegramNetworkError:
+            await asyncio.sleep(2 ** attempt)
+        except TelegramAPIError:
+            return "failed"
+    return "failed"
+
+def progress_text(campaign: Campaign) -> str:
+    header = "✅ Xabar yuborish yakunlandi" if campaign.status == "done" else "📣 Xabar yuborilmoqda..."
+    return (
+        f"{header}\n\n"
+        f"Yuborildi: {campaign.sent}\n"
+        f"Bloklagan: {campaign.blocked}\n"
+        f"Xato: {campaign.failed}"
+    )
+
+async def _report(bot: Bot, campaign: Campaign):
+    try:
+        await bot.edit_message_text(
+            progress_text(campaign),
+            chat_id=campaign.status_chat_id,
+            message_id=campaign.status_message_id
+        )
+    except TelegramAPIError as e:
+        logger.warning(f"Campaign {campaign.id} progress edit failed: {e}")
+
+async def _record(session: AsyncSession, campaign: Campaign, outcomes: List[Tuple[int, str]], last_user_id: int):
+    """To'plam natijalari va davom etish nuqtasi bitta tranzaksiyada yoziladi."""
+    await session.execute(
+        pg_insert(CampaignDelivery)
+        .values([{"campaign_id": campaign.id, "user_id": user_id, "status": status} for user_id, status in outcomes])
+        .on_conflict_do_nothing()
+    )
+    statuses = [status for _, status in outcomes]
+    campaign.sent += statuses.count("sent")
+    campaign.blocked += statuses.count("blocked")
+    campaign.failed += statuses.count("failed")
+    campaign.last_user_id = last_user_id
+    await session.commit()
+
+async def run_campaign(bot: Bot, campaign_id: int):
+    async with try_advisory_lock(CAMPAIGN_LOCK_CLASS, campaign_id) as acquired:
+        # Boshqa nusxa allaqachon yubormoqda
+        if acquired:
+            await _run_campaign(bot, campaign_id)
+
+async def _run_campaign(bot: Bot, campaign_id: int):
+    """
+    Foydalanuvchilarni id bo'yicha sahifalab (keyset) o'qiydi: har sahifa qisqa tranzaksiyada,
+    yuborish paytida tranzaksiya ochiq turmaydi. Har sahifadan keyin natija va last_user_id yoziladi.
+    """
+    async with async_session() as session:
+        campaign = await session.get(Campaign, campaign_id)
+        if campaign is None or campaign.status != "running":
+            return
+        # O'qish tranzaksiyasi birinchi sahifa yuborilayotganda ochiq qolmasin
+        await session.commit()
+
+        text = campaign.text
+        semaphore = asyncio.Semaphore(CAMPAIGN_CONCURRENCY)
+
+        async def send_one(user_id: int, chat_id: int) -> Tuple[int, str]:
+            async with semaphore:
+                return user_id, await _deliver(chat_id, text)
+
+        # Oldingi urinishda yozib ulgurilgan qabul qiluvchilar qayta yuborilmaydi
+        delivered = select(CampaignDelivery.user_id).where(
+            CampaignDelivery.campaign_id == campaign_id,
+            CampaignDelivery.user_id == User.id
+        )
+        page = (
+            select(User.id, User.telegram_user_id)
+            .where(~exists(delivered))
+            .order_by(User.id)
+            .limit(CAMPAIGN_CHUNK_SIZE)
+        )
+
+        last_report = _time.monotonic()
+        while True:
+            chunk = (await session.execute(page.where(User.id > campaign.last_user_id))).all()
+            await session.commit()
+            if not chunk:
+                break
+            outcomes = await asyncio.gather(*[send_one(row.id, row.telegram_user_id) for row in chunk])
+            await _record(session, campaign, outcomes, chunk[-1].id)
+            if _time.monotonic() - last_report >= PROGRESS_EDIT_SECONDS:
+                await _report(bot, campaign)
+                last_report = _time.monotonic()
+
+        campaign.status = "done"
+        campaign.finished_at = datetime.now(pytz.UTC)
+        await session.commit()
+        await _report(bot, campaign)
+        logger.info(f"Campaign {campaign_id} finished: sent={campaign.sent} blocked={campaign.blocked} failed={campaign.failed}")
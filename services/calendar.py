@@ -0,0 +1,152 @@
+# services/calendar.py
+import time as _time
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+from typing import Dict, FrozenSet, List, Optional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Barber, BarberService, WorkSchedule, ScheduleOverride
+from services.invalidation import notify, subscribe
+
+# Oldindan hisoblanadigan kunlar soni (kelgusi haftalar)
+CALENDAR_HORIZON_DAYS = 28
+CALENDAR_TTL_SECONDS = 300
+# Jadval, istisno yoki sartaroshlar o'zgarganda - boshqa replikalar kalendarni qayta quradi
+CALENDAR_CHANNEL = "calendar_changed"
+
+
+@dataclass(frozen=True)
+class WorkingHours:
+    """Bitta sartaroshning aniq sanadagi samarali ish vaqti."""
+    barber_id: int
+    start_time: time
+    end_time: time
+    break_start: Optional[time]
+    break_end: Optional[time]
+    service_ids: Optional[FrozenSet[int]] = None
+
+
+def resolve_day(
+    d: date,
+    barbers: List[tuple],
+    weekly: Dict[tuple, WorkSchedule],
+    override: Optional[ScheduleOverride]
+) -> List[WorkingHours]:
+    """Haftalik jadval va istisnodan sananing samarali jadvalini chiqaradi."""
+    if override is not None and override.is_day_off:
+        return []
+
+    hours = []
+    for barber_id, service_ids in barbers:
+        base = weekly.get((barber_id, d.weekday()))
+        if base is None:
+            continue
+
+        if override is None:
+            if base.is_day_off:
+                continue
+            start, end = base.start_time, base.end_time
+            break_start, break_end = base.break_start, base.break_end
+        else:
+            # Istisnoda ish soati berilgan bo'lsa, haftalik dam olish kuni ham ochiladi
+            if base.is_day_off and not (override.start_time and override.end_time):
+                continue
+            start = override.start_time or base.start_time
+            end = override.end_time or base.end_time
+            if override.start_time or override.end_time:
+                # Istisno ish soatini bergan bo'lsa, tanaffus ham istisnodan: None - tanaffussiz
+                break_start, break_end = override.break_start, override.break_end
+            else:
+                break_start, break_end = base.break_start, base.break_end
+
+        hours.append(WorkingHours(
+            barber_id, start, end, break_start, break_end,
+            frozenset(service_ids) if service_ids else None
+        ))
+    return hours
+
+
+class EffectiveCalendar:
+    """
+    Kelgusi haftalar uchun oldindan hisoblangan samarali kalendar.
+    Haftalik jadval, istisnolar yoki sartaroshlar o'zgarganda invalidate() chaqiriladi.
+    """
+
+    def __init__(self, horizon: int = CALENDAR_HORIZON_DAYS, ttl: int = CALENDAR_TTL_SECONDS):
+        self.horizon = horizon
+        self.ttl = ttl
+        self._days: Dict[date, List[WorkingHours]] = {}
+        self._start: Optional[date] = None
+        self._end: Optional[date] = None
+        self._built_at = 0.0
+        self._generation = 0
+
+    def covers(self, start_date: date, days: int) -> bool:
+        if self._start is None or _time.monotonic() - self._built_at > self.ttl:
+            return False
+        return self._start <= start_date and start_date + timedelta(days=days) <= self._end
+
+    def invalidate(self):
+        self._days = {}
+        self._start = self._end = None
+        self._generation += 1
+
+    async def get(self, session: AsyncSession, start_date: date, days: int) -> Dict[date, List[WorkingHours]]:
+        if self.covers(start_date, days):
+            resolved = self._days
+        else:
+            resolved = await self._rebuild(session, start_date, max(days, self.horizon))
+        return {
+            start_date + timedelta(days=i): resolved.get(start_date + timedelta(days=i), [])
+            for i in range(days)
+        }
+
+    async def _rebuild(self, session: AsyncSession, start_date: date, days: int) -> Dict[date, List[WorkingHours]]:
+        generation = self._generation
+        end_date = start_date + timedelta(days=days)
+
+        qualified_services = (
+            select(func.array_agg(BarberService.service_id))
+            .where(BarberService.barber_id == Barber.id)
+            .scalar_subquery()
+        )
+        barbers_query = (
+            select(Barber.id, qualified_services.label("service_ids"))
+            .where(Barber.is_active == True)
+            .order_by(Barber.sort_order, Barber.id)
+        )
+        barbers = [(row.id, row.service_ids) for row in (await session.execute(barbers_query)).all()]
+
+        weekly_res = await session.execute(select(WorkSchedule))
+        weekly = {(s.barber_id, s.weekday): s for s in weekly_res.scalars().all()}
+
+        overrides_query = select(ScheduleOverride).where(
+            ScheduleOverride.day >= start_date,
+            ScheduleOverride.day < end_date
+        )
+        overrides = {o.day: o for o in (await session.execute(overrides_query)).scalars().all()}
+
+        resolved = {}
+        for i in range(days):
+            d = start_date + timedelta(days=i)
+            resolved[d] = resolve_day(d, barbers, weekly, overrides.get(d))
+
+        # Qurish paytida yozuv bo'lgan bo'lsa - natijani saqlamaymiz, keyingi so'rov qayta quradi
+        if generation == self._generation:
+            self._days = resolved
+            self._start = start_date
+            self._end = end_date
+            self._built_at = _time.monotonic()
+        return resolved
+
+
+effective_calendar = EffectiveCalendar()
+
+async def calendar_changed(session: AsyncSession):
+    """Commitdan oldin chaqiriladi - barcha replikalar kalendarni qayta quradi."""
+    await notify(session, CALENDAR_CHANNEL, "")
+
+async def _on_reconnect():
+    effective_calendar.invalidate()
+
+subscribe(CALENDAR_CHANNEL, lambda payload: effective_calendar.invalidate(), _on_reconnect)
@@ -0,0 +1,99 @@
+# services/catalog.py
+import time as _time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Service
+from services.invalidation import subscribe
+
+CATALOG_TTL_SECONDS = 300
+# Xizmat yozuvlari shu kanalga yuboriladi; barcha replikalar katalogni tashlaydi
+CATALOG_CHANNEL = "catalog_changed"
+
+
+@dataclass(frozen=True)
+class ServiceInfo:
+    """Xizmatning o'zgarmas nusxasi - sessiyaga bog'lanmagan."""
+    id: int
+    name: str
+    price: float
+    duration_min: int
+    buffer_min: int
+    is_active: bool
+    sort_order: int
+
+    @property
+    def total_duration(self) -> int:
+        return self.duration_min + self.buffer_min
+
+
+class ServiceCatalog:
+    """
+    Xizmatlar ro'yxati process ichida saqlanadi (kichik va kam o'zgaradi).
+    services/admin.py dagi xizmat yozuv yo'llari invalidate() chaqiradi.
+    version har yangi yuklashda oshadi; markup() undan tuzilgan klaviaturalarni saqlaydi.
+    """
+
+    def __init__(self, ttl: int = CATALOG_TTL_SECONDS):
+        self.ttl = ttl
+        self.version = 0
+        self._services: Dict[int, ServiceInfo] = {}
+        self._built_at: Optional[float] = None
+        self._generation = 0
+        self._markups: Dict[Tuple[str, int], Any] = {}
+
+    def invalidate(self):
+        self._services = {}
+        self._built_at = None
+        self._generation += 1
+        self._markups = {}
+
+    async def _load(self, session: AsyncSession) -> Dict[int, ServiceInfo]:
+        if self._built_at is not None and _time.monotonic() - self._built_at <= self.ttl:
+            return self._services
+
+        generation = self._generation
+        rows = (await session.execute(select(Service).order_by(Service.sort_order, Service.id))).scalars().all()
+        services = {
+            s.id: ServiceInfo(
+                s.id, s.name, float(s.price), s.duration_min, s.buffer_min or 0, s.is_active, s.sort_order
+            )
+            for s in rows
+        }
+        # Yuklash paytida yozuv bo'lgan bo'lsa, saqlamaymiz
+        if generation == self._generation:
+            self._services = services
+            self._built_at = _time.monotonic()
+            self.version += 1
+            self._markups = {}
+        return services
+
+    async def get(self, session: AsyncSession, service_id: int) -> Optional[ServiceInfo]:
+        return (await self._load(session)).get(service_id)
+
+    async def get_all(self, session: AsyncSession, only_active: bool = False) -> List[ServiceInfo]:
+        services = list((await self._load(session)).values())
+        if only_active:
+            services = [s for s in services if s.is_active]
+        return services
+
+    async def markup(self, session: AsyncSession, name: str, build: Callable[[List[ServiceInfo]], Any]) -> Any:
+        """build(xizmatlar) natijasi (name, version) bo'yicha saqlanadi - katalog o'zgarguncha qayta qurilmaydi."""
+        services = await self._load(session)
+        key = (name, self.version)
+        result = self._markups.get(key)
+        if result is None:
+            result = build(list(services.values()))
+            # Eskirgan ro'yxatdan qurilganini saqlamaymiz
+            if services is self._services:
+                self._markups[key] = result
+        return result
+
+
+service_catalog = ServiceCatalog()
+
+async def _on_reconnect():
+    service_catalog.invalidate()
+
+subscribe(CATALOG_CHANNEL, lambda payload: service_catalog.invalidate(), _on_reconnect)
@@ -0,0 +1,83 @@
+# services/identity.py
+import time as _time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import User
+from services.invalidation import subscribe
+
+IDENTITY_CACHE_SIZE = 10000
+# Boshqa replikadagi o'zgarish NOTIFY bilan keladi; TTL - uzilish holati uchun chegara
+IDENTITY_TTL_SECONDS = 300
+# Rol yoki profil o'zgarganda telegram id shu kanalga yuboriladi
+IDENTITY_CHANNEL = "user_changed"
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Foydalanuvchi va uning roli - sessiyaga bog'lanmagan nusxa."""
+    id: int
+    telegram_user_id: int
+    first_name: Optional[str]
+    last_name: Optional[str]
+    username: Optional[str]
+    is_superadmin: bool
+    admin_type: Optional[str]
+
+    @property
+    def is_admin(self) -> bool:
+        return self.is_superadmin or self.admin_type is not None
+
+
+class IdentityCache:
+    """
+    telegram id -> Identity, LRU (IDENTITY_CACHE_SIZE gacha). Ro'yxatdan o'tmaganlar ham
+    (None) saqlanadi; foydalanuvchi yaratilganda invalidate() chaqiriladi.
+    """
+
+    def __init__(self, maxsize: int = IDENTITY_CACHE_SIZE, ttl: int = IDENTITY_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, Optional[Identity]]]" = OrderedDict()
+        self._generation = 0
+
+    def invalidate(self, telegram_id: int):
+        self._entries.pop(telegram_id, None)
+        self._generation += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+    async def get(self, session: AsyncSession, telegram_id: int) -> Optional[Identity]:
+        entry = self._entries.get(telegram_id)
+        if entry is not None and _time.monotonic() - entry[0] <= self.ttl:
+            self._entries.move_to_end(telegram_id)
+            return entry[1]
+
+        generation = self._generation
+        user = (await session.execute(select(User).where(User.telegram_user_id == telegram_id))).scalar_one_or_none()
+        identity = None
+        if user is not None:
+            identity = Identity(
+                user.id, user.telegram_user_id, user.first_name, user.last_name, user.username,
+                bool(user.is_superadmin), user.admin_type
+            )
+        # Yuklash paytida o'zgarish bo'lgan bo'lsa, saqlamaymiz
+        if generation == self._generation:
+            self._entries[telegram_id] = (_time.monotonic(), identity)
+            self._entries.move_to_end(telegram_id)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return identity
+
+
+identity_cache = IdentityCache()
+
+
+async def _on_reconnect():
+    identity_cache.clear()
+
+subscribe(IDENTITY_CHANNEL, lambda payload: identity_cache.invalidate(int(payload)), _on_reconnect)
@@ -0,0 +1,58 @@
+# services/invalidation.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Tuple
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.session import engine
+
+logger = logging.getLogger(__name__)
+
+LISTENER_PING_SECONDS = 30
+LISTENER_RETRY_SECONDS = 5
+
+OnMessage = Callable[[str], None]
+OnReconnect = Callable[[], Awaitable[None]]
+
+_channels: Dict[str, Tuple[OnMessage, OnReconnect]] = {}
+
+def subscribe(channel: str, on_message: OnMessage, on_reconnect: OnReconnect):
+    """
+    Process ichidagi keshlar shu yerda ro'yxatdan o'tadi. on_reconnect har safar tinglash
+    (qayta) boshlanganda chaqiriladi - uzilish paytidagi xabarlar yo'qolgan bo'lishi mumkin.
+    """
+    _channels[channel] = (on_message, on_reconnect)
+
+async def notify(session: AsyncSession, channel: str, payload: str):
+    # Tranzaksiya ichida: xabar faqat commitdan keyin yetkaziladi
+    await session.execute(select(func.pg_notify(channel, payload)))
+
+async def run_listener():
+    """Barcha kanallarni bitta alohida ulanishda LISTEN qiladi."""
+    def on_notify(connection, pid, channel, payload):
+        handler = _channels.get(channel)
+        if handler is not None:
+            handler[0](payload)
+
+    while True:
+        try:
+            async with engine.connect() as conn:
+                await conn.execution_options(isolation_level="AUTOCOMMIT")
+                raw = (await conn.get_raw_connection()).driver_connection
+                for channel in _channels:
+                    await raw.add_listener(channel, on_notify)
+                try:
+                    # Tinglash boshlangandan keyin yangilaymiz - oradagi o'zgarish yo'qolmaydi
+                    for _, on_reconnect in _channels.values():
+                        await on_reconnect()
+                    while True:
+                        await asyncio.sleep(LISTENER_PING_SECONDS)
+                        await conn.execute(text("SELECT 1"))
+                finally:
+                    for channel in _channels:
+                        await raw.remove_listener(channel, on_notify)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Invalidation listener error: {e}")
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
@@ -0,0 +1,113 @@
+# services/leader.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Barcha nusxalar uchun bitta umumiy kalit ("barb")
+LEADER_LOCK_KEY = 0x62617262
+LEADER_CHECK_SECONDS = 5
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    """
+    Postgres advisory lock orqali yetakchi tanlash: qulfni ushlagan nusxa yetakchi.
+    Qulf alohida ulanishda turadi; jarayon o'lsa yoki ulanish uzilsa, Postgres qulfni
+    o'zi bo'shatadi va keyingi tekshiruvda boshqa nusxa yetakchi bo'ladi.
+    """
+
+    def __init__(
+        self,
+        on_elected: Callback,
+        on_demoted: Callback,
+        key: int = LEADER_LOCK_KEY,
+        interval: float = LEADER_CHECK_SECONDS
+    ):
+        self.key = key
+        self.interval = interval
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._conn: Optional[AsyncConnection] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._conn is not None
+
+    async def _try_acquire(self):
+        conn = await engine.connect()
+        try:
+            # Tranzaksiyasiz - ulanish "idle in transaction" bo'lib qolmaydi
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})).scalar()
+        except Exception:
+            await conn.invalidate()
+            raise
+        if not acquired:
+            await conn.close()
+            return
+        self._conn = conn
+        logger.info("Elected as scheduler leader")
+        await self._on_elected()
+
+    async def _release(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        logger.warning("Lost scheduler leadership")
+        try:
+            await self._on_demoted()
+        finally:
+            # Pulga qaytarilmaydi: session darajasidagi qulf ulanish bilan birga yo'qoladi
+            try:
+                await conn.invalidate()
+            except Exception:
+                pass
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    if self._conn is None:
+                        await self._try_acquire()
+                    else:
+                        # Ulanish tirikligini tekshiramiz - uzilgan bo'lsa, qulf ham yo'q
+                        await self._conn.execute(text("SELECT 1"))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Leader election error: {e}")
+                    await self._release()
+                await asyncio.sleep(self.interval)
+        finally:
+            await self._release()
+
+@asynccontextmanager
+async def try_advisory_lock(classid: int, objid: int):
+    """
+    Bitta obyekt ustidagi ishni faqat bitta nusxa bajarishi uchun (masalan, kampaniya).
+    Qulf olinmasa False beradi; olinsa blok tugaguncha ushlab turiladi.
+    """
+    conn = await engine.connect()
+    acquired = False
+    try:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = (await conn.execute(
+            text("SELECT pg_try_advisory_lock(:classid, :objid)"), {"classid": classid, "objid": objid}
+        )).scalar()
+        yield acquired
+    finally:
+        try:
+            if acquired:
+                await conn.execute(
+                    text("SELECT pg_advisory_unlock(:classid, :objid)"), {"classid": classid, "objid": objid}
+                )
+            await conn.close()
+        except Exception:
+            await conn.invalidate()
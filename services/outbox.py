@@ -0,0 +1,128 @@
+# services/outbox.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, Optional
+import pytz
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramAPIError
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import OutboxMessage, User
+from db.session import async_session
+from services.send_queue import send_queue
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_SECONDS = 1
+OUTBOX_MAX_ATTEMPTS = 8
+# Olingan xabar shu vaqt ichida natijasi yozilmasa (nusxa o'chgan), boshqasi qayta oladi
+OUTBOX_LEASE_SECONDS = 300
+
+# Bron o'zgargandan keyin, commitdan oldin chaqiriladi va yoziladigan xabarlarni qaytaradi
+Notify = Callable[[Any], Iterable[OutboxMessage]]
+
+def _payload(kwargs: dict) -> dict:
+    payload = dict(kwargs)
+    markup = payload.pop("reply_markup", None)
+    if markup is not None:
+        payload["reply_markup"] = markup.model_dump(exclude_none=True)
+        payload["markup_type"] = "inline" if isinstance(markup, InlineKeyboardMarkup) else "reply"
+    return payload
+
+def _kwargs(payload: dict) -> dict:
+    kwargs = dict(payload)
+    markup_type = kwargs.pop("markup_type", None)
+    if "reply_markup" in kwargs:
+        model = InlineKeyboardMarkup if markup_type == "inline" else ReplyKeyboardMarkup
+        kwargs["reply_markup"] = model.model_validate(kwargs["reply_markup"])
+    return kwargs
+
+def message(chat_id, text: str, **kwargs) -> OutboxMessage:
+    return OutboxMessage(chat_id=chat_id, method="send_message", payload=_payload({"text": text, **kwargs}))
+
+def photo(chat_id, photo_id: str, **kwargs) -> OutboxMessage:
+    return OutboxMessage(chat_id=chat_id, method="send_photo", payload=_payload({"photo": photo_id, **kwargs}))
+
+def to_user(user_id: int, text: str, **kwargs) -> OutboxMessage:
+    """Mijozga xabar - telegram id INSERT ichida olinadi, alohida so'rov kerak emas."""
+    chat_id = select(User.telegram_user_id).where(User.id == user_id).scalar_subquery()
+    return message(chat_id, text, **kwargs)
+
+def stage(session: AsyncSession, notify: Optional[Notify], subject: Any):
+    """Xabarlarni sessiyaga qo'shadi - ular bron bilan bitta commitda yoziladi."""
+    if notify is not None:
+        session.add_all(list(notify(subject)))
+
+def _claim_stmt(batch_size: int):
+    due = (
+        select(OutboxMessage.id)
+        .where(
+            OutboxMessage.delivered_at.is_(None),
+            OutboxMessage.attempts < OUTBOX_MAX_ATTEMPTS,
+            OutboxMessage.next_attempt_at <= func.now()
+        )
+        .order_by(OutboxMessage.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(due))
+        .values(
+            attempts=OutboxMessage.attempts + 1,
+            next_attempt_at=func.now() + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        )
+        .returning(OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.method, OutboxMessage.payload, OutboxMessage.attempts)
+        .execution_options(synchronize_session=False)
+    )
+
+async def _send(msg) -> dict:
+    """Bitta xabarni yuboradi va qatorga yoziladigan natijani qaytaradi."""
+    now_utc = datetime.now(pytz.UTC)
+    try:
+        await send_queue.send_now(msg.method, msg.chat_id, **_kwargs(msg.payload))
+        return {"delivered_at": now_utc, "last_error": None}
+    except TelegramRetryAfter as e:
+        return {"next_attempt_at": now_utc + timedelta(seconds=e.retry_after), "last_error": str(e)}
+    except TelegramNetworkError as e:
+        return {"next_attempt_at": now_utc + timedelta(seconds=2 ** msg.attempts), "last_error": str(e)}
+    except (TelegramAPIError, TypeError, ValueError) as e:
+        # Bloklangan bot, yaroqsiz payload va h.k. - qayta urinmaymiz
+        logger.error(f"Outbox message {msg.id} to {msg.chat_id} failed: {e}")
+        return {"attempts": OUTBOX_MAX_ATTEMPTS, "last_error": str(e)}
+    except Exception as e:
+        # Kutilmagan xato (aiogramdan tashqaridagi timeout va h.k.) - kechiktirib qayta urinamiz
+        logger.error(f"Outbox message {msg.id} to {msg.chat_id} failed unexpectedly: {e!r}")
+        return {"next_attempt_at": now_utc + timedelta(seconds=2 ** msg.attempts), "last_error": repr(e)}
+
+async def dispatch_batch(session: AsyncSession, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Yuborilmagan xabarlarni FOR UPDATE SKIP LOCKED bilan oladi, OUTBOX_LEASE_SECONDS ga ijaraga
+    belgilaydi va darhol commit qiladi - yuborish paytida qulf va tranzaksiya ochiq turmaydi.
+    Har bir natija alohida qisqa tranzaksiyada yoziladi, shuning uchun yuborilgan xabar keyingi
+    xato tufayli qayta yuborilmaydi. Nusxa yuborish o'rtasida o'chsa, ijara tugagach qayta olinadi.
+    """
+    claimed = sorted((await session.execute(_claim_stmt(batch_size))).all(), key=lambda m: m.id)
+    await session.commit()
+
+    for msg in claimed:
+        result = await _send(msg)
+        await session.execute(update(OutboxMessage).where(OutboxMessage.id == msg.id).values(**result))
+        await session.commit()
+    return len(claimed)
+
+async def run_dispatcher(poll_seconds: float = OUTBOX_POLL_SECONDS):
+    while True:
+        try:
+            async with async_session() as session:
+                processed = await dispatch_batch(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Outbox dispatcher error: {e}")
+            processed = 0
+        # To'liq to'plam bo'lsa, kutmasdan davom etamiz
+        if processed < OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(poll_seconds)
@@ -0,0 +1,157 @@
+# services/reminders.py
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import select, func, text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.types import Integer
+from db.models import Appointment, AppointmentStatus
+from db.session import async_session
+from services import outbox
+from services.admin import get_setting
+from services.invalidation import notify, subscribe
+from utils.time import from_utc
+
+logger = logging.getLogger(__name__)
+
+# Sozlama: navbatdan necha daqiqa oldin eslatiladi, vergul bilan (masalan "1440,120,15")
+REMINDER_STAGES_KEY = "reminder_stages"
+DEFAULT_REMINDER_STAGES = "60"
+REMINDER_BATCH_SIZE = 100
+DISPATCH_JOB_ID = "reminder_dispatch"
+# Boshqa replikada qo'yilgan eslatma vaqti yetakchiga shu kanal orqali keladi
+REMINDER_CHANNEL = "reminder_scheduled"
+
+# Muddati kelgan eslatmalarni bitta so'rovda band qiladi:
+#  - due: qisman indeks bo'yicha, SKIP LOCKED bilan; bosqich - o'tgan bosqichlarning eng kichigi
+#    (bot to'xtab turgan bo'lsa, eskirgan bosqichlar o'tkazib yuboriladi)
+#  - claimed: next_reminder_at hali kelmagan eng yaqin bosqichga suriladi yoki NULL bo'ladi
+#  - logged: reminder_log bir bosqichni ikki marta yuborishdan saqlaydi
+CLAIM_DUE_SQL = text("""
+WITH due AS (
+    SELECT id, starts_at,
+           (SELECT min(m) FROM unnest(:stages) AS m
+             WHERE starts_at > now() AND starts_at - make_interval(mins => m) <= now()) AS stage
+    FROM appointments
+    WHERE status = 'confirmed' AND next_reminder_at IS NOT NULL AND next_reminder_at <= now()
+    ORDER BY next_reminder_at
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+), claimed AS (
+    UPDATE appointments a
+    SET next_reminder_at = (
+        SELECT due.starts_at - make_interval(mins => max(m)) FROM unnest(:stages) AS m
+         WHERE due.starts_at - make_interval(mins => m) > now()
+    )
+    FROM due
+    WHERE a.id = due.id
+    RETURNING a.id, a.user_id, a.service_id, a.starts_at, due.stage
+), logged AS (
+    INSERT INTO reminder_log (appointment_id, stage_minutes)
+    SELECT id, stage FROM claimed WHERE stage IS NOT NULL
+    ON CONFLICT DO NOTHING
+    RETURNING appointment_id
+)
+SELECT c.id, c.starts_at, c.stage, u.telegram_user_id, s.name AS service_name
+FROM claimed c
+JOIN logged l ON l.appointment_id = c.id
+JOIN users u ON u.id = c.user_id
+JOIN services s ON s.id = c.service_id
+""").bindparams(bindparam("stages", type_=ARRAY(Integer)))
+
+_scheduler: Optional[AsyncIOScheduler] = None
+
+def attach(scheduler: AsyncIOScheduler):
+    global _scheduler
+    _scheduler = scheduler
+
+def parse_stages(value: Optional[str]) -> List[int]:
+    """'1440, 120,15' -> [1440, 120, 15] (kamayish tartibida, takrorlarsiz)."""
+    stages = set()
+    for part in (value or "").split(","):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0:
+            stages.add(int(part))
+    return sorted(stages, reverse=True)
+
+async def get_stages(session: AsyncSession) -> List[int]:
+    return parse_stages(await get_setting(session, REMINDER_STAGES_KEY, DEFAULT_REMINDER_STAGES))
+
+def first_reminder_at(starts_at: datetime, stages: List[int]) -> Optional[datetime]:
+    """Eng erta hali o'tmagan bosqich; hammasi o'tgan bo'lsa - darhol (eng kichik bosqich)."""
+    now_utc = datetime.now(pytz.UTC)
+    if not stages or starts_at <= now_utc:
+        return None
+    for minutes in stages:
+        due = starts_at - timedelta(minutes=minutes)
+        if due > now_utc:
+            return due
+    return now_utc
+
+def stage_label(minutes: int) -> str:
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440} kun"
+    if minutes % 60 == 0:
+        return f"{minutes // 60} soat"
+    return f"{minutes} daqiqa"
+
+def wake_at(when: Optional[datetime]):
+    """Dispatcherni eng yaqin eslatma vaqtiga qo'yadi (mavjud uyg'otish kechroq bo'lsa)."""
+    # Hali yetakchi bo'lmagan nusxa: saylanganda restore_reminders qo'yadi
+    if _scheduler is None or not _scheduler.running or when is None:
+        return
+    job = _scheduler.get_job(DISPATCH_JOB_ID)
+    if job is not None and job.next_run_time is not None and job.next_run_time <= when:
+        return
+    _scheduler.add_job(
+        dispatch_due_reminders, "date", run_date=max(when, datetime.now(pytz.UTC)),
+        id=DISPATCH_JOB_ID, replace_existing=True, misfire_grace_time=None
+    )
+
+async def schedule_wake(session: AsyncSession, when: Optional[datetime]):
+    """Commitdan oldin chaqiriladi: yetakchi (qaysi replikada bo'lmasin) dispatcherni shu vaqtga qo'yadi."""
+    if when is not None:
+        await notify(session, REMINDER_CHANNEL, when.isoformat())
+
+async def next_due_at(session: AsyncSession) -> Optional[datetime]:
+    # Qisman indeksdan index-only o'qiladi
+    query = select(func.min(Appointment.next_reminder_at)).where(
+        Appointment.status == AppointmentStatus.CONFIRMED.value,
+        Appointment.next_reminder_at.is_not(None)
+    )
+    return (await session.execute(query)).scalar()
+
+async def restore_reminders():
+    """Saylanganda va tinglash qayta ulanganda dispatcherni eng yaqin eslatmaga qo'yadi."""
+    if _scheduler is None or not _scheduler.running:
+        return
+    async with async_session() as session:
+        wake_at(await next_due_at(session))
+
+async def dispatch_due_reminders():
+    """Muddati kelganlarni to'plamlab yuboradi, so'ng keyingi uyg'onishni rejalashtiradi."""
+    async with async_session() as session:
+        stages = await get_stages(session)
+        while True:
+            rows = (await session.execute(CLAIM_DUE_SQL, {"stages": stages, "limit": REMINDER_BATCH_SIZE})).all()
+            for row in rows:
+                local_time = from_utc(row.starts_at)
+                msg = (
+                    f"⏰ **Eslatma!**\n"
+                    f"Sizning bookingingizga {stage_label(row.stage)}dan kam vaqt qoldi.\n"
+                    f"Vaqt: {local_time.strftime('%d.%m %H:%M')}\nXizmat: {row.service_name}"
+                )
+                session.add(outbox.message(row.telegram_user_id, msg, parse_mode="Markdown"))
+            await session.commit()
+            if rows:
+                logger.info(f"Queued {len(rows)} reminders")
+            if len(rows) < REMINDER_BATCH_SIZE:
+                break
+
+        next_due = await next_due_at(session)
+    wake_at(next_due)
+
+subscribe(REMINDER_CHANNEL, lambda payload: wake_at(datetime.fromisoformat(payload)), restore_reminders)
@@ -1,98 +1,378 @@
 # services/schedule.py
 from datetime import date, datetime, timedelta, time
-from typing import List, Optional
-from sqlalchemy import select, and_, or_
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, and_, or_, func, union_all, text, bindparam, Integer, DateTime, Interval
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.models import WorkSchedule, Appointment, AppointmentStatus, Service
+from db.models import Appointment, AppointmentStatus, SlotHold
+from services.availability import availability_index, DaySnapshot, ResourceDay
+from services.calendar import effective_calendar, CALENDAR_HORIZON_DAYS
+from services.catalog import service_catalog
 from utils.time import combine_date_time, get_today, now, to_utc, from_utc
 
 SLOT_STEP_MINUTES = 15
+NEXT_AVAILABLE_HORIZON_DAYS = CALENDAR_HORIZON_DAYS
 
-async def get_slots(session: AsyncSession, service_id: int, target_date: date) -> List[dict]:
-    """Returns a list of slots with their availability: [{'time': datetime, 'available': bool}]"""
-    service = await session.get(Service, service_id)
-    if not service or not service.is_active:
-        return []
-    
-    total_duration = service.duration_min + service.buffer_min
+# Ish oynalari parametr sifatida beriladi, bronlar bitta range_agg bilan yig'iladi,
+# har bir oyna ichida slot to'ri generate_series bilan quriladi
+NEXT_AVAILABLE_SQL = text("""
+WITH work AS (
+    SELECT * FROM unnest(:barber_ids, :window_starts, :window_ends, :break_starts, :break_ends)
+        AS w(barber_id, window_start, window_end, break_start, break_end)
+),
+busy AS (
+    SELECT barber_id, range_agg(tstzrange(starts_at, ends_at, '[)')) AS ranges
+    FROM (
+        SELECT barber_id, starts_at, ends_at
+        FROM appointments
+        WHERE status IN ('pending', 'confirmed', 'completed')
+          AND ends_at > :search_start
+          AND starts_at < :search_end
+        UNION ALL
+        SELECT barber_id, starts_at, ends_at
+        FROM slot_holds
+        WHERE expires_at > now()
+          AND ends_at > :search_start
+          AND starts_at < :search_end
+    ) AS taken
+    GROUP BY barber_id
+),
+candidates AS (
+    SELECT
+        w.barber_id,
+        s.slot_start,
+        tstzrange(s.slot_start, s.slot_start + :duration, '[)') AS slot,
+        CASE WHEN w.break_start IS NOT NULL
+             THEN tstzrange(w.break_start, w.break_end, '[)') END AS break_range
+    FROM work w
+    CROSS JOIN LATERAL generate_series(w.window_start, w.window_end - :duration, :duration) AS s(slot_start)
+)
+SELECT DISTINCT ON (c.slot_start) c.slot_start, c.barber_id
+FROM candidates c
+LEFT JOIN busy b ON b.barber_id = c.barber_id
+WHERE NOT coalesce(c.slot && c.break_range, false)
+  AND NOT coalesce(b.ranges && c.slot, false)
+ORDER BY c.slot_start, c.barber_id
+LIMIT :limit
+""").bindparams(
+    bindparam("barber_ids", type_=ARRAY(Integer)),
+    bindparam("window_starts", type_=ARRAY(DateTime(timezone=True))),
+    bindparam("window_ends", type_=ARRAY(DateTime(timezone=True))),
+    bindparam("break_starts", type_=ARRAY(DateTime(timezone=True))),
+    bindparam("break_ends", type_=ARRAY(DateTime(timezone=True))),
+    bindparam("search_start", type_=DateTime(timezone=True)),
+    bindparam("search_end", type_=DateTime(timezone=True)),
+    bindparam("duration", type_=Interval),
+    bindparam("limit", type_=Integer),
+)
 
-    weekday = target_date.weekday()
-    query = select(WorkSchedule).where(WorkSchedule.weekday == weekday)
-    schedule_res = await session.execute(query)
-    schedule = schedule_res.scalar_one_or_none()
+async def load_day_snapshots(session: AsyncSession, start_date: date, days: int) -> Dict[date, DaySnapshot]:
+    """
+    [start_date, start_date + days) oralig'idagi har bir kun uchun snapshot qaytaradi.
+    Ish vaqtlari oldindan hisoblangan samarali kalendardan olinadi, bronlar esa
+    indeksda yo'q kunlar uchun butun oyna bo'yicha bitta so'rov bilan o'qiladi.
+    """
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+    result: Dict[date, DaySnapshot] = {}
+    missing: List[date] = []
+    for d in dates:
+        snap = availability_index.get_day(d)
+        if snap is None:
+            missing.append(d)
+        else:
+            result[d] = snap
 
-    if not schedule or schedule.is_day_off:
-        return []
+    if not missing:
+        return result
 
-    slots: List[datetime] = []
-    
-    start_dt = combine_date_time(target_date, schedule.start_time)
-    end_dt = combine_date_time(target_date, schedule.end_time)
+    generations = {d: availability_index.generation(d) for d in missing}
+
+    span = (missing[-1] - missing[0]).days + 1
+    calendar = await effective_calendar.get(session, missing[0], span)
+
+    open_days = [d for d in missing if calendar[d]]
+    busy_by_barber: Dict[int, List[Tuple[datetime, datetime]]] = {}
+    if open_days:
+        window_start_utc = to_utc(combine_date_time(open_days[0], time(0, 0)))
+        window_end_utc = to_utc(combine_date_time(open_days[-1], time(23, 59, 59)))
+
+        # Fetch appointments that overlap the whole window
+        # Correct overlap logic: App.ends > Window.start AND App.starts < Window.end
+        appointments_query = select(Appointment.barber_id, Appointment.starts_at, Appointment.ends_at).where(
+            and_(
+                Appointment.ends_at > window_start_utc,
+                Appointment.starts_at < window_end_utc,
+                Appointment.status.in_([
+                    AppointmentStatus.PENDING.value, 
+                    AppointmentStatus.CONFIRMED.value,
+                    AppointmentStatus.COMPLETED.value
+                ])
+            )
+        )
+        # Faol vaqtinchalik band qilishlar ham boshqalar uchun band - o'sha so'rovda
+        holds_query = select(SlotHold.barber_id, SlotHold.starts_at, SlotHold.ends_at).where(
+            SlotHold.ends_at > window_start_utc,
+            SlotHold.starts_at < window_end_utc,
+            SlotHold.expires_at > func.now()
+        )
+        appointments_query = union_all(appointments_query, holds_query)
+        res = await session.execute(appointments_query)
+        for row in res.all():
+            busy_by_barber.setdefault(row.barber_id, []).append((row.starts_at, row.ends_at))
+
+    for d in missing:
+        day_start_utc = to_utc(combine_date_time(d, time(0, 0)))
+        day_end_utc = to_utc(combine_date_time(d, time(23, 59, 59)))
+        resources = []
+        for hours in calendar[d]:
+            busy = merge_intervals([
+                (starts_at, ends_at) for starts_at, ends_at in busy_by_barber.get(hours.barber_id, [])
+                if ends_at > day_start_utc and starts_at < day_end_utc
+            ])
+            resources.append(ResourceDay(
+                hours.barber_id,
+                hours.start_time, hours.end_time,
+                hours.break_start, hours.break_end,
+                busy,
+                hours.service_ids
+            ))
+        snap = DaySnapshot(resources)
+        availability_index.put_day(d, snap, generations[d])
+        result[d] = snap
+
+    return result
+
+async def load_day_snapshot(session: AsyncSession, target_date: date) -> DaySnapshot:
+    """Kun jadvali va band oraliqlarni indeksdan yoki DB dan oladi."""
+    snaps = await load_day_snapshots(session, target_date, 1)
+    return snaps[target_date]
+
+def merge_intervals(intervals: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """Band oraliqlarni boshlanishi bo'yicha saralab, kesishganlarini birlashtiradi."""
+    merged: List[Tuple[datetime, datetime]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def mark_taken(slot_bounds: List[Tuple[datetime, datetime]], busy: List[Tuple[datetime, datetime]]) -> List[bool]:
+    """
+    Saralangan slotlar va birlashtirilgan band oraliqlar ustidan bitta o'tish (sweep).
+    Ikkala ro'yxat ham vaqt bo'yicha o'sib boradi, shuning uchun ko'rsatkich faqat oldinga suriladi.
+    """
+    taken: List[bool] = []
+    j = 0
+    n = len(busy)
+    for slot_start, slot_end in slot_bounds:
+        while j < n and busy[j][1] <= slot_start:
+            j += 1
+        taken.append(j < n and busy[j][0] < slot_end)
+    return taken
+
+def _working_window(hours, target_date: date, current_time: datetime):
+    """
+    Ish oynasi: (mahalliy boshlanish, UTC boshlanish, UTC tugash, UTC tanaffus yoki None).
+    Bugun uchun boshlanish hozirgi vaqtdan keyingi chorakka suriladi.
+    """
+    start_dt = combine_date_time(target_date, hours.start_time)
+    end_dt = combine_date_time(target_date, hours.end_time)
     
-    current_time = now()
     if target_date == current_time.date():
         if start_dt < current_time:
             next_quarter = (current_time.minute // 15 + 1) * 15
             start_dt = current_time.replace(minute=0, second=0, microsecond=0) + timedelta(minutes=next_quarter)
 
-    current_slot = start_dt
+    # Chegaralar kun uchun bir marta UTC ga o'tkaziladi, keyin faqat qo'shish amallari
+    break_bounds = None
+    if hours.break_start and hours.break_end:
+        break_bounds = (
+            to_utc(combine_date_time(target_date, hours.break_start)),
+            to_utc(combine_date_time(target_date, hours.break_end)),
+        )
+    return start_dt, to_utc(start_dt), to_utc(end_dt), break_bounds
+
+def _resource_slots(res: ResourceDay, target_date: date, duration: timedelta, current_time: datetime) -> List[Tuple[datetime, datetime, bool]]:
+    """Bitta sartarosh uchun (UTC boshlanish, mahalliy boshlanish, bo'shmi) ro'yxati."""
+    start_dt, start_utc, end_utc, break_bounds = _working_window(res, target_date, current_time)
+
     # Jadval qadamini xizmat davomiyligiga qarab belgilaymiz
-    step = total_duration
-    
-    while current_slot + timedelta(minutes=total_duration) <= end_dt:
-        in_break = False
-        if schedule.break_start and schedule.break_end:
-            break_start_dt = combine_date_time(target_date, schedule.break_start)
-            break_end_dt = combine_date_time(target_date, schedule.break_end)
-            slot_end = current_slot + timedelta(minutes=total_duration)
-            if (current_slot < break_end_dt) and (slot_end > break_start_dt):
-                in_break = True
-        
-        if not in_break:
-            slots.append(current_slot)
-        
-        current_slot += timedelta(minutes=step)
-
-    if not slots:
+    step = duration
+
+    slot_bounds: List[Tuple[datetime, datetime]] = []
+    local_starts: List[datetime] = []
+    current_slot = start_utc
+    current_local = start_dt
+    while current_slot + duration <= end_utc:
+        slot_end = current_slot + duration
+        if not break_bounds or not (current_slot < break_bounds[1] and slot_end > break_bounds[0]):
+            slot_bounds.append((current_slot, slot_end))
+            local_starts.append(current_local)
+        current_slot += step
+        current_local += step
+
+    taken = mark_taken(slot_bounds, res.busy)
+    return [
+        (slot_utc, local, not is_taken)
+        for (slot_utc, _), local, is_taken in zip(slot_bounds, local_starts, taken)
+    ]
+
+def build_slots(snap: DaySnapshot, target_date: date, total_duration: int, service_id: Optional[int] = None) -> List[dict]:
+    """
+    Xotiradagi kun ma'lumotidan slotlar ro'yxatini hisoblaydi (DB ga murojaat yo'q).
+    Slot bo'sh - agar xizmatni bajara oladigan kamida bitta sartarosh bo'sh bo'lsa.
+    """
+    resources = [r for r in snap.resources if service_id is None or r.can_serve(service_id)]
+    if not resources:
         return []
 
-    day_start_utc = to_utc(combine_date_time(target_date, time(0, 0)))
-    day_end_utc = to_utc(combine_date_time(target_date, time(23, 59, 59)))
-
-    # Fetch appointments that overlap the day window
-    # Correct overlap logic: App.ends > Window.start AND App.starts < Window.end
-    appointments_query = select(Appointment).where(
-        and_(
-            Appointment.ends_at > day_start_utc,
-            Appointment.starts_at < day_end_utc,
-            Appointment.status.in_([
-                AppointmentStatus.PENDING.value, 
-                AppointmentStatus.CONFIRMED.value,
-                AppointmentStatus.COMPLETED.value
-            ])
-        )
-    )
-    res = await session.execute(appointments_query)
-    appointments = res.scalars().all()
+    duration = timedelta(minutes=total_duration)
+    current_time = now()
 
-    from utils.time import format_date_uz
-    all_slots = []
-    for slot in slots:
-        slot_end = slot + timedelta(minutes=total_duration)
-        slot_utc = to_utc(slot)
-        slot_end_utc = to_utc(slot_end)
+    # slot_utc -> [mahalliy vaqt, bo'shmi]
+    merged: Dict[datetime, list] = {}
+    for res in resources:
+        for slot_utc, local, available in _resource_slots(res, target_date, duration, current_time):
+            entry = merged.get(slot_utc)
+            if entry is None:
+                merged[slot_utc] = [local, available]
+            elif available:
+                entry[1] = True
 
-        is_taken = False
-        for app in appointments:
-            if (slot_utc < app.ends_at) and (slot_end_utc > app.starts_at):
-                is_taken = True
-                break
+    if not merged:
+        return []
+
+    from utils.time import format_date_uz
+    date_label = format_date_uz(target_date)
 
+    all_slots = []
+    for slot_utc in sorted(merged):
+        slot, available = merged[slot_utc]
         # Add formatted date label for UI
         all_slots.append({
             "time": slot,
-            "available": not is_taken,
-            "label": f"{format_date_uz(slot.date())} {slot.strftime('%H:%M')}"
+            "available": available,
+            "label": f"{date_label} {slot.strftime('%H:%M')}"
         })
 
     return all_slots
+
+def free_barbers(snap: DaySnapshot, service_id: int, start_utc: datetime, end_utc: datetime, only_free: bool = False) -> List[int]:
+    """
+    Berilgan oraliqqa bron qilish uchun nomzod sartaroshlar: avval bo'shlari
+    (kuni eng kam band bo'lganidan boshlab), keyin (only_free bo'lmasa) qolgan malakali sartaroshlar.
+    """
+    free, rest = [], []
+    for res in snap.resources:
+        if not res.can_serve(service_id):
+            continue
+        is_taken = mark_taken([(start_utc, end_utc)], res.busy)[0]
+        load = sum((e - s for s, e in res.busy), timedelta())
+        (rest if is_taken else free).append((load, res.barber_id))
+    if only_free:
+        return [barber_id for _, barber_id in sorted(free)]
+    return [barber_id for _, barber_id in sorted(free)] + [barber_id for _, barber_id in sorted(rest)]
+
+def _day_slots(snap: DaySnapshot, target_date: date, service_id: int, total_duration: int) -> List[dict]:
+    # Bugungi kun uchun slot to'ri hozirgi vaqtga bog'liq, shuning uchun faqat
+    # kunning ma'lumoti keshlanadi, slotlar esa har safar xotirada hisoblanadi
+    is_today = target_date == get_today()
+    key = (service_id, total_duration)
+    if not is_today:
+        cached = snap.slots.get(key)
+        if cached is not None:
+            return list(cached)
+
+    all_slots = build_slots(snap, target_date, total_duration, service_id)
+
+    if not is_today:
+        availability_index.put_slots(target_date, snap, key, all_slots)
+    return list(all_slots)
+
+async def get_slots(session: AsyncSession, service_id: int, target_date: date) -> List[dict]:
+    """Returns a list of slots with their availability: [{'time': datetime, 'available': bool}]"""
+    service = await service_catalog.get(session, service_id)
+    if not service or not service.is_active:
+        return []
+    
+    total_duration = service.total_duration
+    snap = await load_day_snapshot(session, target_date)
+    return _day_slots(snap, target_date, service_id, total_duration)
+
+async def get_slots_range(session: AsyncSession, service_id: int, start_date: date, days: int) -> Dict[date, List[dict]]:
+    """Bir nechta kun uchun slotlar: {sana: [slot, ...]}. Barcha bronlar bitta so'rovda o'qiladi."""
+    service = await service_catalog.get(session, service_id)
+    if not service or not service.is_active:
+        return {start_date + timedelta(days=i): [] for i in range(days)}
+
+    total_duration = service.total_duration
+    snaps = await load_day_snapshots(session, start_date, days)
+    return {d: _day_slots(snap, d, service_id, total_duration) for d, snap in snaps.items()}
+
+async def get_free_slot_counts(session: AsyncSession, service_id: int, start_date: date, days: int) -> Dict[date, int]:
+    """Sana tanlash klaviaturasi uchun har kundagi bo'sh slotlar soni."""
+    slots_by_day = await get_slots_range(session, service_id, start_date, days)
+    return {d: sum(1 for s in slots if s["available"]) for d, slots in slots_by_day.items()}
+
+async def find_next_available(
+    session: AsyncSession,
+    service_id: int,
+    after: Optional[datetime] = None,
+    limit: int = 5,
+    horizon_days: int = NEXT_AVAILABLE_HORIZON_DAYS
+) -> List[dict]:
+    """
+    Eng yaqin bo'sh slotlar (bir necha hafta oldinga ham) - bitta SQL so'rov bilan.
+    Ish oynalari keshlangan kalendardan olinadi, bo'sh joylar esa Postgres ichida hisoblanadi.
+    """
+    service = await service_catalog.get(session, service_id)
+    if not service or not service.is_active:
+        return []
+
+    duration = timedelta(minutes=service.total_duration)
+    current_time = from_utc(to_utc(after)) if after else now()
+    start_date = current_time.date()
+    calendar = await effective_calendar.get(session, start_date, horizon_days)
+
+    barber_ids, window_starts, window_ends, break_starts, break_ends = [], [], [], [], []
+    for d, day_hours in calendar.items():
+        for hours in day_hours:
+            if hours.service_ids is not None and service_id not in hours.service_ids:
+                continue
+            _, start_utc, end_utc, break_bounds = _working_window(hours, d, current_time)
+            if start_utc + duration > end_utc:
+                continue
+            barber_ids.append(hours.barber_id)
+            window_starts.append(start_utc)
+            window_ends.append(end_utc)
+            break_starts.append(break_bounds[0] if break_bounds else None)
+            break_ends.append(break_bounds[1] if break_bounds else None)
+
+    if not barber_ids:
+        return []
+
+    res = await session.execute(NEXT_AVAILABLE_SQL, {
+        "barber_ids": barber_ids,
+        "window_starts": window_starts,
+        "window_ends": window_ends,
+        "break_starts": break_starts,
+        "break_ends": break_ends,
+        "search_start": min(window_starts),
+        "search_end": max(window_ends),
+        "duration": duration,
+        "limit": limit,
+    })
+
+    from utils.time import format_date_uz
+    result = []
+    for row in res.all():
+        slot = from_utc(row.slot_start)
+        result.append({
+            "time": slot,
+            "available": True,
+            "barber_id": row.barber_id,
+            "label": f"{format_date_uz(slot.date())} {slot.strftime('%H:%M')}"
+        })
+    return result
@@ -1,58 +1,104 @@
 # services/scheduler.py
 import logging
-from datetime import datetime, timedelta
+import time as _time
+from typing import Optional
+from datetime import datetime
+import pytz
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from db.models import Appointment, User, AppointmentStatus
+from core.metrics import job_seconds, job_errors_total
 from db.session import async_session
+from services.booking import expire_holds, expire_pending_bookings, complete_past_bookings, get_pending_timeout
+from services import reminders, outbox
+from services.broadcast import resume_campaigns
+from services.leader import LeaderElection
+from services.waitlist import notify_waitlist
 from utils.time import from_utc
 from aiogram import Bot
+from aiogram.fsm.storage.base import BaseStorage
 
 logger = logging.getLogger(__name__)
 
-async def send_reminders(bot: Bot):
-    """Navbatga 1 soat qolganda eslatma yuborish"""
+async def expire_slot_holds():
+    """Muddati o'tgan vaqtinchalik band qilishlarni tozalaydi"""
     async with async_session() as session:
-        # Hozirgi vaqtdan 1 soat keyingi vaqtni hisoblaymiz
-        target_time = datetime.now() + timedelta(hours=1)
-        
-        # 1 soatdan kam vaqt qolgan, tasdiqlangan va eslatma yuborilmaganlarni qidiramiz
-        stmt = (
-            select(Appointment)
-            .where(
-                Appointment.status == AppointmentStatus.CONFIRMED.value,
-                Appointment.starts_at <= target_time,
-                Appointment.reminder_sent == False
-            )
-        )
-        res = await session.execute(stmt)
-        appointments = res.scalars().all()
-        
-        for app in appointments:
-            try:
-                user_stmt = select(User).where(User.id == app.user_id)
-                user = (await session.execute(user_stmt)).scalar_one()
-                
-                local_time = from_utc(app.starts_at)
-                msg = (
-                    f"⏰ **Eslatma!**\n"
-                    f"Sizning bookingingizga 1 soatdan kam vaqt qoldi.\n"
-                    f"Vaqt: {local_time.strftime('%H:%M')}\nXizmat: {app.service.name if app.service else ''}"
-                )
-                
-                await bot.send_message(user.telegram_user_id, msg, parse_mode="Markdown")
-                app.reminder_sent = True
-                logger.info(f"Reminder sent to user {user.telegram_user_id} for appointment {app.id}")
-            except Exception as e:
-                logger.error(f"Error sending reminder for app {app.id}: {e}")
-        
-        await session.commit()
-
-def setup_scheduler(bot: Bot):
+        expired = await expire_holds(session)
+        if expired:
+            logger.info(f"Expired {expired} slot holds")
+
+async def close_stale_bookings():
+    """Tasdiqlanmagan PENDING bronlarni bekor qiladi, o'tgan CONFIRMED bronlarni yakunlaydi"""
+    async with async_session() as session:
+        timeout = await get_pending_timeout(session)
+        expired = await expire_pending_bookings(session, timeout, notify=lambda b: [outbox.to_user(
+            b.user_id,
+            f"⌛ Sizning {from_utc(b.starts_at).strftime('%m-%d %H:%M')} vaqtidagi bookingingiz "
+            f"o'z vaqtida tasdiqlanmagani uchun bekor qilindi."
+        )])
+        completed = await complete_past_bookings(session, notify=lambda b: [outbox.to_user(
+            b.user_id, f"✅ Buyurtmangiz yakunlandi. Tashrifingiz uchun rahmat! 😊"
+        )])
+        if expired or completed:
+            logger.info(f"Expired {len(expired)} pending, completed {len(completed)} past bookings")
+
+        # Kelajakdagi bo'shagan vaqtlar haqida navbatdagilarga xabar beramiz
+        now_utc = datetime.now(pytz.UTC)
+        for b in expired:
+            if b.starts_at > now_utc:
+                await notify_waitlist(session, b.starts_at, b.ends_at)
+
+async def sweep_fsm_states(storage: BaseStorage):
+    """Tashlab ketilgan FSM holatlarini tozalaydi (faqat doimiy storage uchun)"""
+    swept = await storage.sweep()
+    if swept:
+        logger.info(f"Swept {swept} FSM states")
+
+def track_job_metrics(scheduler: AsyncIOScheduler):
+    """Har bir job bajarilish vaqti va xatolari (job id bo'yicha)."""
+    started = {}
+
+    def on_event(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            for run_time in event.scheduled_run_times:
+                started[(event.job_id, run_time)] = _time.perf_counter()
+            return
+        started_at = started.pop((event.job_id, event.scheduled_run_time), None)
+        if started_at is not None:
+            job_seconds.observe(_time.perf_counter() - started_at, event.job_id)
+        if event.code == EVENT_JOB_ERROR:
+            job_errors_total.inc(event.job_id)
+
+    scheduler.add_listener(on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+def setup_scheduler(bot: Bot, fsm_storage: Optional[BaseStorage] = None) -> LeaderElection:
+    """
+    Joblar faqat yetakchi nusxada ishlaydi. Ikki yetakchi qisqa vaqt ustma-ust tushsa ham
+    xavfsiz: eslatma va outbox SKIP LOCKED bilan oladi, holat o'zgarishlari shartli UPDATE.
+    """
     scheduler = AsyncIOScheduler()
-    # Har 15 daqiqada tekshirib turadi
-    scheduler.add_job(send_reminders, "interval", minutes=15, args=[bot])
-    scheduler.start()
-    logger.info("Scheduler started.")
-    return scheduler
+    # Eslatmalar har bir bron uchun aniq vaqtga qo'yiladi (services/reminders.py);
+    # boshqa replikadagi bronlar NOTIFY bilan keladi - davriy so'rov kerak emas
+    reminders.attach(scheduler)
+    track_job_metrics(scheduler)
+    scheduler.add_job(expire_slot_holds, "interval", minutes=1, id="expire_slot_holds")
+    scheduler.add_job(close_stale_bookings, "interval", minutes=5, id="close_stale_bookings")
+    # To'xtab qolgan kampaniyalar uchun
+    scheduler.add_job(resume_campaigns, "interval", minutes=1, args=[bot], id="resume_campaigns")
+    if hasattr(fsm_storage, "sweep"):
+        scheduler.add_job(sweep_fsm_states, "interval", minutes=30, args=[fsm_storage], id="sweep_fsm_states")
+
+    async def on_elected():
+        if scheduler.running:
+            scheduler.resume()
+        else:
+            scheduler.start()
+        logger.info("Scheduler started.")
+        await reminders.restore_reminders()
+        await resume_campaigns(bot)
+
+    async def on_demoted():
+        if scheduler.running:
+            scheduler.pause()
+        logger.info("Scheduler paused.")
+
+    return LeaderElection(on_elected, on_demoted)
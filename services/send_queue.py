@@ -0,0 +1,238 @@
+# services/send_queue.py
+import asyncio
+import logging
+import time as _time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+# Telegram cheklovlari: bot bo'yicha ~30 xabar/soniya, bitta chatga ~1 xabar/soniya
+GLOBAL_RATE_PER_SEC = 30
+PER_CHAT_RATE_PER_SEC = 1
+SEND_WORKERS = 4
+MAX_QUEUE_SIZE = 10000
+MAX_ATTEMPTS = 5
+
+
+class TokenBucket:
+    """
+    Token bucket: rate token/soniya, capacity gacha to'planadi.
+    reserve() tokenni darhol band qiladi va u qachon tayyor bo'lishini qaytaradi,
+    shuning uchun navbatdagi so'rovlar tartibi saqlanadi.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = _time.monotonic()
+
+    def _refill(self):
+        now = _time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def is_idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class SendJob:
+    method: str
+    chat_id: int
+    kwargs: Dict[str, Any]
+    enqueued_at: float = field(default_factory=_time.monotonic)
+    attempt: int = 0
+    # Chat tokeni oldindan band qilingan (kechiktirilgan qayta navbat)
+    chat_reserved: bool = False
+
+
+@dataclass
+class SendStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    dropped: int = 0
+    latency_sum: float = 0.0
+    latency_max: float = 0.0
+
+    @property
+    def latency_avg(self) -> float:
+        return self.latency_sum / self.sent if self.sent else 0.0
+
+
+class SendQueue:
+    """
+    Barcha fon xabarlari (admin xabarnomalari, eslatmalar, navbat) shu navbat orqali yuboriladi.
+    Handlerlar faqat navbatga qo'yadi va darhol qaytadi; yuborishni ishchilar bajaradi.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE_PER_SEC,
+        per_chat_rate: float = PER_CHAT_RATE_PER_SEC,
+        workers: int = SEND_WORKERS,
+        maxsize: int = MAX_QUEUE_SIZE
+    ):
+        self.per_chat_rate = per_chat_rate
+        self.workers = workers
+        self.stats = SendStats()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._paused_until = 0.0
+        self._deferred = 0
+        self._tasks = []
+        self._bot: Optional[Bot] = None
+
+    @property
+    def depth(self) -> int:
+        # Kechiktirilgan (limit yoki qayta urinish kutayotgan) xabarlar ham hisobga olinadi
+        return self._queue.qsize() + self._deferred
+
+    def start(self, bot: Bot):
+        self._bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Send queue started with {self.workers} workers.")
+
+    async def stop(self, timeout: float = 10):
+        # Navbatdagi xabarlarni yuborib ulgurishga vaqt beramiz
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Send queue stopped with {self.depth} pending messages")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _put(self, job: SendJob):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            logger.error(f"Send queue full, dropped {job.method} to {job.chat_id}")
+
+    def send_message(self, chat_id: int, text: str, **kwargs):
+        self._put(SendJob("send_message", chat_id, {"text": text, **kwargs}))
+
+    def send_photo(self, chat_id: int, photo: str, **kwargs):
+        self._put(SendJob("send_photo", chat_id, {"photo": photo, **kwargs}))
+
+    async def send_now(self, method: str, chat_id: int, **kwargs):
+        """
+        Navbatni chetlab, shu limitlarga rioya qilgan holda yuboradi (outbox dispatcher uchun).
+        Xatolar chaqiruvchiga qaytadi - qayta urinishni u boshqaradi.
+        """
+        pause = self._paused_until - _time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        await self._global.acquire()
+
+        started_at = _time.monotonic()
+        try:
+            await getattr(self._bot, method)(chat_id, **kwargs)
+        except TelegramRetryAfter as e:
+            self._paused_until = max(self._paused_until, _time.monotonic() + e.retry_after)
+            self.stats.retried += 1
+            raise
+        except TelegramAPIError:
+            self.stats.failed += 1
+            raise
+        latency = _time.monotonic() - started_at
+        self.stats.sent += 1
+        self.stats.latency_sum += latency
+        self.stats.latency_max = max(self.stats.latency_max, latency)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > MAX_QUEUE_SIZE:
+                # To'lib turgan (bo'sh) bucketlar holatsiz - ularni tashlab yuboramiz
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_idle()}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._deliver(job)
+            except Exception as e:
+                logger.error(f"Unexpected send queue error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, job: SendJob):
+        pause = self._paused_until - _time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        if not job.chat_reserved:
+            # Chat limiti ishchini band qilmaydi - xabar o'z vaqtida navbatga qaytadi
+            delay = self._chat_bucket(job.chat_id).reserve()
+            if delay:
+                job.chat_reserved = True
+                self._defer(job, delay)
+                return
+        job.chat_reserved = False
+        await self._global.acquire()
+
+        job.attempt += 1
+        try:
+            await getattr(self._bot, job.method)(job.chat_id, **job.kwargs)
+        except TelegramRetryAfter as e:
+            # 429 bot bo'yicha amal qiladi - barcha ishchilarni to'xtatib turamiz
+            self._paused_until = max(self._paused_until, _time.monotonic() + e.retry_after)
+            self._retry(job, f"retry after {e.retry_after}s")
+            return
+        except TelegramNetworkError as e:
+            self._retry(job, str(e), delay=2 ** job.attempt)
+            return
+        except TelegramAPIError as e:
+            # Bloklangan bot, noto'g'ri chat va h.k. - qayta urinish foyda bermaydi
+            self.stats.failed += 1
+            logger.error(f"Failed to {job.method} to {job.chat_id}: {e}")
+            return
+
+        latency = _time.monotonic() - job.enqueued_at
+        self.stats.sent += 1
+        self.stats.latency_sum += latency
+        self.stats.latency_max = max(self.stats.latency_max, latency)
+
+    def _retry(self, job: SendJob, reason: str, delay: float = 0):
+        if job.attempt >= MAX_ATTEMPTS:
+            self.stats.failed += 1
+            logger.error(f"Giving up {job.method} to {job.chat_id} after {job.attempt} attempts: {reason}")
+            return
+        self.stats.retried += 1
+        self._defer(job, delay)
+
+    def _defer(self, job: SendJob, delay: float):
+        if delay:
+            self._deferred += 1
+            asyncio.get_running_loop().call_later(delay, self._resume, job)
+        else:
+            self._put(job)
+
+    def _resume(self, job: SendJob):
+        self._deferred -= 1
+        self._put(job)
+
+
+send_queue = SendQueue()
@@ -0,0 +1,63 @@
+# services/settings_cache.py
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Settings
+from db.session import async_session
+from services.invalidation import subscribe
+
+# set_setting shu kanalga kalitni yuboradi; barcha replikalar keshni yangilaydi
+SETTINGS_CHANNEL = "settings_changed"
+
+
+class SettingsCache:
+    """
+    settings jadvali process ichida to'liq saqlanadi (bir necha o'nlab qator, juda kam o'zgaradi).
+    set_setting yozgandan keyin qiymatni o'zi yangilaydi, boshqa replikalar esa
+    LISTEN/NOTIFY orqali invalidate() qiladi.
+    """
+
+    def __init__(self):
+        self._values: Optional[Dict[str, str]] = None
+        self._generation = 0
+
+    def invalidate(self):
+        self._values = None
+        self._generation += 1
+
+    def set_local(self, key: str, value: str):
+        if self._values is not None:
+            self._values[key] = value
+
+    async def _load(self, session: AsyncSession) -> Dict[str, str]:
+        if self._values is not None:
+            return self._values
+
+        generation = self._generation
+        rows = (await session.execute(select(Settings.key, Settings.value))).all()
+        values = {key: value for key, value in rows}
+        # Yuklash paytida o'zgarish xabari kelgan bo'lsa, saqlamaymiz
+        if generation == self._generation:
+            self._values = values
+        return values
+
+    async def load(self, session: AsyncSession):
+        await self._load(session)
+
+    async def get(self, session: AsyncSession, key: str, default: Optional[str] = None) -> Optional[str]:
+        return (await self._load(session)).get(key, default)
+
+    async def get_many(self, session: AsyncSession, defaults: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        values = await self._load(session)
+        return {key: values.get(key, default) for key, default in defaults.items()}
+
+
+settings_cache = SettingsCache()
+
+
+async def _reload():
+    settings_cache.invalidate()
+    async with async_session() as session:
+        await settings_cache.load(session)
+
+subscribe(SETTINGS_CHANNEL, lambda key: settings_cache.invalidate(), _reload)
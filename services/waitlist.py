@@ -0,0 +1,164 @@
+# services/waitlist.py
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import WaitlistEntry, Service, User
+from services.booking import place_hold
+from services.schedule import load_day_snapshot, build_slots
+from services.send_queue import send_queue
+from utils.time import from_utc, to_utc, combine_date_time, format_date_uz
+
+logger = logging.getLogger(__name__)
+
+# Birinchi mos mijoz uchun qisqa band qilish
+WAITLIST_HOLD_MINUTES = 5
+# Bitta bo'shagan oraliq uchun xabar yuboriladigan mijozlar soni
+WAITLIST_FANOUT = 5
+
+@dataclass
+class WaitlistMatch:
+    entry_id: int
+    telegram_user_id: int
+    service_name: str
+    start: datetime
+
+async def add_to_waitlist(
+    session: AsyncSession,
+    user_id: int,
+    service_id: int,
+    day: date,
+    window_start: time,
+    window_end: time
+) -> WaitlistEntry:
+    """Mijozni navbatga yozadi; shu kun va xizmat uchun faol yozuv bo'lsa, oynasini yangilaydi."""
+    query = select(WaitlistEntry).where(
+        WaitlistEntry.user_id == user_id,
+        WaitlistEntry.service_id == service_id,
+        WaitlistEntry.day == day,
+        WaitlistEntry.is_active == True
+    )
+    entry = (await session.execute(query)).scalar_one_or_none()
+    if entry is None:
+        entry = WaitlistEntry(user_id=user_id, service_id=service_id, day=day)
+        session.add(entry)
+    entry.window_start = window_start
+    entry.window_end = window_end
+    await session.commit()
+    return entry
+
+async def close_waitlist_entry(session: AsyncSession, entry_id: int, user_id: int):
+    """Mijoz navbatdan bron qilganda yozuv yopiladi."""
+    await session.execute(
+        update(WaitlistEntry)
+        .where(WaitlistEntry.id == entry_id, WaitlistEntry.user_id == user_id)
+        .values(is_active=False)
+    )
+    await session.commit()
+
+async def match_freed_interval(
+    session: AsyncSession,
+    starts_at: datetime,
+    ends_at: datetime
+) -> List[WaitlistMatch]:
+    """
+    Bo'shagan [starts_at, ends_at) oraliqqa mos navbatdagilarni yozilgan tartibida qaytaradi.
+    Faqat shu sananing oynasi kesishadigan faol yozuvlari o'qiladi (qisman indeks bo'yicha).
+    Har bir mos mijozga WAITLIST_HOLD_MINUTES ga band qilish qo'yiladi; band qilib
+    bo'lmaganlar (vaqtni oldingi mijoz oldi) qaytarilmaydi va xabar olmaydi.
+    """
+    local_start = from_utc(starts_at)
+    local_end = from_utc(ends_at)
+    day = local_start.date()
+    end_time = local_end.time() if local_end.date() == day else time.max
+
+    query = (
+        select(WaitlistEntry, User.telegram_user_id, Service)
+        .join(User, User.id == WaitlistEntry.user_id)
+        .join(Service, Service.id == WaitlistEntry.service_id)
+        .where(
+            WaitlistEntry.is_active == True,
+            WaitlistEntry.day == day,
+            WaitlistEntry.window_start < end_time,
+            WaitlistEntry.window_end > local_start.time(),
+            Service.is_active == True
+        )
+        .order_by(WaitlistEntry.created_at, WaitlistEntry.id)
+    )
+    rows = (await session.execute(query)).all()
+
+    matches = []
+    snap = None
+    # (service_id, davomiylik) -> kun slotlari; xizmatlar bir necha mijozda takrorlanadi
+    day_slots = {}
+    for entry, telegram_user_id, service in rows:
+        if len(matches) >= WAITLIST_FANOUT:
+            break
+        if snap is None:
+            snap = await load_day_snapshot(session, day)
+        total = service.duration_min + service.buffer_min
+        if (service.id, total) not in day_slots:
+            day_slots[(service.id, total)] = build_slots(snap, day, total, service.id)
+        duration = timedelta(minutes=total)
+        window_start = combine_date_time(day, entry.window_start)
+        window_end = combine_date_time(day, entry.window_end)
+        # Kun jadvalidagi bo'sh slotlar (ish vaqti, tanaffus, qadam) - bo'shagan oraliq va mijoz oynasi bilan kesishmasi
+        starts = [
+            slot["time"] for slot in day_slots[(service.id, total)]
+            if slot["available"]
+            and slot["time"] < local_end and slot["time"] + duration > local_start
+            and window_start <= slot["time"] and slot["time"] + duration <= window_end
+        ]
+
+        # Oldingi mijoz olgan vaqtni band qilib bo'lmaydi - keyingi mos slotni sinaymiz
+        hold = None
+        for start in starts:
+            # Mijozning boshqa band qilishlari (boshlangan bron) saqlanadi
+            hold = await place_hold(
+                session, telegram_user_id, service.id, start.replace(tzinfo=None),
+                ttl_minutes=WAITLIST_HOLD_MINUTES, keep_other_holds=True
+            )
+            if hold is not None:
+                break
+        if hold is None:
+            continue
+        matches.append(WaitlistMatch(entry.id, telegram_user_id, service.name, start))
+
+    if matches:
+        await session.execute(
+            update(WaitlistEntry)
+            .where(WaitlistEntry.id.in_([m.entry_id for m in matches]))
+            .values(notified_at=func.now())
+        )
+        await session.commit()
+    return matches
+
+async def notify_waitlist(
+    session: AsyncSession,
+    starts_at: Optional[datetime],
+    ends_at: Optional[datetime]
+):
+    """Bekor qilish yoki ko'chirishdan keyin bo'shagan oraliq haqida navbatdagilarga xabar beradi."""
+    if starts_at is None or ends_at is None:
+        return
+    try:
+        matches = await match_freed_interval(session, starts_at, ends_at)
+    except Exception as e:
+        logger.error(f"Waitlist matching failed: {e}")
+        return
+
+    for match in matches:
+        time_str = match.start.strftime('%H:%M')
+        text = (
+            f"🔔 Vaqt bo'shadi!\n"
+            f"Xizmat: {match.service_name}\n"
+            f"Sana: {format_date_uz(match.start.date())} {time_str}\n"
+            f"Bu vaqt siz uchun {WAITLIST_HOLD_MINUTES} daqiqaga band qilindi."
+        )
+        kb = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="✂️ Band qilish", callback_data=f"wlbook_{match.entry_id}_{time_str}")
+        ]])
+        send_queue.send_message(match.telegram_user_id, text, reply_markup=kb)
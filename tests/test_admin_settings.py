@@ -0,0 +1,76 @@
+# tests/test_admin_settings.py
+from sqlalchemy import select
+from db.models import ScheduleOverride, Settings, User
+from bot.states import AdminState
+from services.booking import PENDING_TIMEOUT_KEY, get_pending_timeout
+from services.reminders import REMINDER_STAGES_KEY
+
+async def make_admin(session, telegram_user_id: int) -> User:
+    user = User(telegram_user_id=telegram_user_id, first_name="Admin", admin_type="full")
+    session.add(user)
+    await session.commit()
+    return user
+
+async def stored(session, key: str):
+    return await session.scalar(select(Settings.value).where(Settings.key == key))
+
+async def test_client_cannot_open_reminder_settings(session, driver, make_user):
+    await make_user(501)
+    await driver.callback(501, "set_reminder_stages")
+    assert await driver.state(501).get_state() is None
+
+async def test_client_in_settings_state_cannot_save(session, driver, make_user):
+    await make_user(502)
+    # Eski holat yoki qo'lda yasalgan update - himoya handler ichida bo'lishi kerak
+    for state, text, key in [
+        (AdminState.edit_reminder_stages, "5", REMINDER_STAGES_KEY),
+        (AdminState.edit_card_number, "8600000000000000", "card_number"),
+        (AdminState.edit_barber_phone, "+998000000000", "barber_phone"),
+    ]:
+        await driver.state(502).set_state(state)
+        await driver.message(502, text)
+        assert await stored(session, key) is None
+
+async def test_client_cannot_toggle_deposit(session, driver, make_user):
+    await make_user(503)
+    await driver.callback(503, "toggle_deposit")
+    assert await stored(session, "deposit_enabled") is None
+
+async def test_admin_saves_reminder_stages(session, driver):
+    await make_admin(session, 504)
+    await driver.callback(504, "set_reminder_stages")
+    assert await driver.state(504).get_state() == AdminState.edit_reminder_stages.state
+    await driver.message(504, "120,15")
+    assert await stored(session, REMINDER_STAGES_KEY) == "120,15"
+
+async def test_client_cannot_set_pending_timeout(session, driver, make_user):
+    await make_user(505)
+    await driver.callback(505, "set_pending_timeout")
+    assert await driver.state(505).get_state() is None
+
+    await driver.state(505).set_state(AdminState.edit_pending_timeout)
+    await driver.message(505, "60")
+    assert await stored(session, PENDING_TIMEOUT_KEY) is None
+
+async def test_pending_timeout_range(session, driver):
+    await make_admin(session, 506)
+    await driver.callback(506, "set_pending_timeout")
+    for value in ["0", "3", "99999999999999999999", "²", "-5", "1.5"]:
+        await driver.message(506, value)
+        assert await stored(session, PENDING_TIMEOUT_KEY) is None
+    assert await driver.state(506).get_state() == AdminState.edit_pending_timeout.state
+
+    await driver.message(506, " 90 ")
+    assert await stored(session, PENDING_TIMEOUT_KEY) == "90"
+    assert await get_pending_timeout(session) == 90
+
+async def test_client_in_override_state_cannot_add_override(session, driver, make_user, work_day):
+    await make_user(507)
+    await driver.state(507).set_state(AdminState.add_override_date)
+    await driver.message(507, work_day.isoformat())
+    assert await driver.state(507).get_data() == {}
+
+    await driver.state(507).set_state(AdminState.add_override_hours)
+    await driver.state(507).update_data(override_day=work_day.isoformat())
+    await driver.message(507, "dam")
+    assert await session.scalar(select(ScheduleOverride.id)) is None
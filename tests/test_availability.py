@@ -0,0 +1,87 @@
+# tests/test_availability.py
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta
+from db.models import ScheduleOverride, WorkSchedule
+from db.session import engine
+from services.admin import set_schedule_override
+from services.availability import AVAILABILITY_CHANNEL, DaySnapshot, availability_index
+from services.booking import cancel_booking, create_booking
+from services.calendar import CALENDAR_CHANNEL, effective_calendar, resolve_day
+from services.invalidation import _channels
+
+@asynccontextmanager
+async def listening(*channels):
+    received = asyncio.Queue()
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        for channel in channels:
+            await raw.add_listener(channel, lambda conn, pid, channel, payload: received.put_nowait((channel, payload)))
+        yield received
+
+async def next_message(received):
+    return await asyncio.wait_for(received.get(), timeout=5)
+
+def cached(d: date):
+    snap = DaySnapshot([])
+    availability_index.put_day(d, snap, availability_index.generation(d))
+    return availability_index.get_day(d) is not None
+
+async def test_booking_changes_are_announced(session, shop, work_day, make_user):
+    _, service = shop
+    user = await make_user(4301)
+
+    async with listening(AVAILABILITY_CHANNEL) as received:
+        booking = await create_booking(
+            session, user.id, service.id, datetime.combine(work_day, time(10)), "+998900000001", "Mijoz"
+        )
+        assert await next_message(received) == (AVAILABILITY_CHANNEL, work_day.isoformat())
+        await cancel_booking(session, booking.id)
+        assert await next_message(received) == (AVAILABILITY_CHANNEL, work_day.isoformat())
+
+async def test_override_is_announced(session, work_day):
+    async with listening(AVAILABILITY_CHANNEL, CALENDAR_CHANNEL) as received:
+        await set_schedule_override(session, work_day, is_day_off=True)
+        messages = {await next_message(received), await next_message(received)}
+    assert messages == {(CALENDAR_CHANNEL, ""), (AVAILABILITY_CHANNEL, work_day.isoformat())}
+
+async def test_other_replica_drops_announced_days(work_day):
+    # Boshqa replikadan kelgan xabar: faqat shu kunlar eskiradi
+    other_day = work_day + timedelta(days=1)
+    on_message, on_reconnect = _channels[AVAILABILITY_CHANNEL]
+    assert cached(work_day) and cached(other_day)
+    on_message(work_day.isoformat())
+    assert availability_index.get_day(work_day) is None
+    assert availability_index.get_day(other_day) is not None
+
+    # Hafta kuni jadvali o'zgarsa - shu hafta kunidagi barcha kunlar
+    on_message(f"weekday:{other_day.weekday()}")
+    assert availability_index.get_day(other_day) is None
+
+    # Uzilishdan keyin hammasi tashlanadi
+    assert cached(work_day)
+    await on_reconnect()
+    assert availability_index.get_day(work_day) is None
+
+async def test_other_replica_reloads_calendar(session, work_day):
+    await effective_calendar.get(session, work_day, 1)
+    assert effective_calendar.covers(work_day, 1)
+    _channels[CALENDAR_CHANNEL][0]("")
+    assert not effective_calendar.covers(work_day, 1)
+
+def test_override_hours_replace_the_weekly_break(work_day):
+    weekly = {(1, work_day.weekday()): WorkSchedule(
+        barber_id=1, weekday=work_day.weekday(), is_day_off=False,
+        start_time=time(9), end_time=time(18), break_start=time(13), break_end=time(14)
+    )}
+    # Qisqa kun tanaffussiz
+    short = ScheduleOverride(day=work_day, is_day_off=False, start_time=time(10), end_time=time(15))
+    [hours] = resolve_day(work_day, [(1, None)], weekly, short)
+    assert (hours.start_time, hours.end_time, hours.break_start, hours.break_end) == (time(10), time(15), None, None)
+
+    moved = ScheduleOverride(
+        day=work_day, is_day_off=False, start_time=time(10), end_time=time(18),
+        break_start=time(12), break_end=time(12, 30)
+    )
+    [hours] = resolve_day(work_day, [(1, None)], weekly, moved)
+    assert (hours.break_start, hours.break_end) == (time(12), time(12, 30))
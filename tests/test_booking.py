@@ -0,0 +1,139 @@
+# tests/test_booking.py
+from datetime import datetime, time
+import pytest
+from sqlalchemy import func, select
+from bot.handlers.common import BOOKING_CLOSED_TEXT
+from db.models import Appointment, OutboxMessage, User
+from db.session import async_session
+from db.stats import track_queries
+from services.booking import (
+    SlotOccupiedError, cancel_booking, confirm_booking, create_booking, place_hold, reschedule_booking
+)
+from services.reminders import get_stages
+from services.schedule import get_slots
+from utils.time import to_utc
+
+def statements(stats) -> str:
+    return "\n".join(f"{count}x {statement}" for statement, count in stats.statements.items())
+
+async def test_create_booking_is_a_single_statement(session, shop, work_day, make_user):
+    _, service = shop
+    user = await make_user(4001)
+    # Katalog, kalendar va kun snapshoti keshga tushadi - barqaror holat
+    await get_slots(session, service.id, work_day)
+    # Har bir update yangi sessiya oladi - identity map'dagi obyektlarga tayanmaymiz
+    session.expunge_all()
+
+    with track_queries(statements=True) as stats:
+        result = await create_booking(
+            session, user.id, service.id, datetime.combine(work_day, time(10)), "+998900000001", "Mijoz"
+        )
+    assert result.id
+    assert stats.queries == 1, statements(stats)
+
+async def test_get_slots_reads_only_the_day_after_a_write(session, shop, work_day, make_user):
+    _, service = shop
+    user = await make_user(4001)
+    session.expunge_all()
+    with track_queries(statements=True) as cold:
+        await get_slots(session, service.id, work_day)
+    # Katalog (1), kalendar (3), kun bronlari va band qilishlari (1)
+    assert cold.queries == 5, statements(cold)
+
+    with track_queries(statements=True) as warm:
+        slots = await get_slots(session, service.id, work_day)
+    assert warm.queries == 0, statements(warm)
+    assert [s["available"] for s in slots] == [True, True]
+
+    await create_booking(session, user.id, service.id, datetime.combine(work_day, time(10)), "+998900000001", "Mijoz")
+    # Yozuv faqat o'sha kunni eskirtiradi: bitta so'rov bilan qayta o'qiladi
+    with track_queries(statements=True) as after_write:
+        slots = await get_slots(session, service.id, work_day)
+    assert after_write.queries == 1, statements(after_write)
+    assert [s["available"] for s in slots] == [False, True]
+
+async def test_reschedule_reads_service_from_catalog(session, shop, work_day, make_user):
+    _, service = shop
+    user = await make_user(4001)
+    booking = await create_booking(
+        session, user.id, service.id, datetime.combine(work_day, time(10)), "+998900000001", "Mijoz"
+    )
+    await get_slots(session, service.id, work_day)
+    await get_stages(session)
+    session.expunge_all()
+
+    with track_queries(statements=True) as stats:
+        moved = await reschedule_booking(session, booking.id, datetime.combine(work_day, time(11)))
+    assert moved.starts_at == to_utc(datetime.combine(work_day, time(11)))
+    # Bron, UPDATE, refresh va replikalarga pg_notify; xizmat katalogdan, bo'sh sartarosh kun snapshotidan
+    assert stats.queries == 4, statements(stats)
+    assert "FROM services" not in statements(stats)
+
+async def test_hold_is_refused_over_a_booking_the_snapshot_missed(session, shop, work_day, make_user):
+    barber, service = shop
+    user = await make_user(4002)
+    other = await make_user(4003)
+    assert [s["available"] for s in await get_slots(session, service.id, work_day)] == [True, True]
+
+    # Boshqa replikada yozilgan bron - bu nusxaning snapshoti hali bilmaydi
+    async with async_session() as replica:
+        replica.add(Appointment(
+            user_id=other.id, service_id=service.id, barber_id=barber.id,
+            starts_at=to_utc(datetime.combine(work_day, time(10))),
+            ends_at=to_utc(datetime.combine(work_day, time(11))),
+            customer_phone="+998900000002", customer_name="Mijoz", created_by="client"
+        ))
+        await replica.commit()
+
+    assert await place_hold(session, 4002, service.id, datetime.combine(work_day, time(10))) is None
+
+async def test_reschedule_respects_other_clients_holds(session, shop, work_day, make_user):
+    _, service = shop
+    user = await make_user(4004)
+    other = await make_user(4005)
+    booking = await create_booking(
+        session, user.id, service.id, datetime.combine(work_day, time(10)), "+998900000001", "Mijoz"
+    )
+    eleven = datetime.combine(work_day, time(11))
+    hold = await place_hold(session, 4005, service.id, eleven)
+    assert hold is not None
+
+    with pytest.raises(SlotOccupiedError):
+        await reschedule_booking(session, booking.id, eleven)
+
+    # Mijozning o'z band qilishi ko'chirishga to'sqinlik qilmaydi
+    await session.delete(await session.get(type(hold), hold.id))
+    await session.commit()
+    assert await place_hold(session, 4004, service.id, eleven) is not None
+    moved = await reschedule_booking(session, booking.id, eleven)
+    assert moved.starts_at == to_utc(eleven)
+
+async def test_closed_booking_is_not_reopened(session, shop, work_day, make_user):
+    _, service = shop
+    user = await make_user(4006)
+    other = await make_user(4007)
+    ten = datetime.combine(work_day, time(10))
+    booking = await create_booking(session, user.id, service.id, ten, "+998900000001", "Mijoz")
+    staged = []
+    assert await cancel_booking(session, booking.id, notify=lambda b: staged.append(b) or []) is not None
+
+    # Ikkinchi bekor qilish ham, bo'shagan vaqtga boshqa bron tushgandan keyin tasdiqlash ham - hech narsa
+    await create_booking(session, other.id, service.id, ten, "+998900000002", "Mijoz")
+    assert await cancel_booking(session, booking.id, notify=lambda b: staged.append(b) or []) is None
+    assert await confirm_booking(session, booking.id, notify=lambda b: staged.append(b) or []) is None
+    assert len(staged) == 1
+    assert (await session.get(Appointment, booking.id)).status == "cancelled"
+
+async def test_double_cancel_tap_notifies_admins_once(session, shop, work_day, make_user, driver):
+    _, service = shop
+    user = await make_user(4008)
+    session.add(User(telegram_user_id=4009, first_name="Admin", admin_type="full"))
+    await session.commit()
+    booking = await create_booking(
+        session, user.id, service.id, datetime.combine(work_day, time(10)), "+998900000001", "Mijoz"
+    )
+
+    await driver.callback(4008, f"cancel_me_{booking.id}")
+    await driver.callback(4008, f"cancel_me_{booking.id}")
+    assert await session.scalar(select(func.count()).select_from(OutboxMessage)) == 1
+    assert driver.api.texts()[-1] == BOOKING_CLOSED_TEXT
@@ -0,0 +1,85 @@
+# tests/test_broadcast.py
+from sqlalchemy import select, text
+from bot.states import AdminState
+from db.models import Campaign, CampaignDelivery, User
+from db.session import async_session, engine
+from services import broadcast
+from services.broadcast import CAMPAIGN_CHUNK_SIZE, create_campaign, run_campaign
+from services.send_queue import send_queue
+
+async def make_users(session, count: int):
+    session.add_all([User(telegram_user_id=10_000 + i, first_name="Mijoz") for i in range(count)])
+    await session.commit()
+
+async def idle_in_transaction() -> list:
+    # Alohida ulanish: kampaniya sessiyalari tranzaksiya ochib qo'yganmi
+    async with engine.connect() as conn:
+        return (await conn.execute(text(
+            "SELECT query FROM pg_stat_activity "
+            "WHERE datname = current_database() AND state LIKE 'idle in transaction%'"
+        ))).scalars().all()
+
+async def test_campaign_pages_without_open_transaction(session, driver, monkeypatch):
+    total = CAMPAIGN_CHUNK_SIZE * 2 + 50
+    await make_users(session, total)
+    campaign = await create_campaign(session, "Salom", 1, 1, 1)
+
+    sent, idle = [], []
+
+    async def send_now(method, chat_id, **kwargs):
+        sent.append(chat_id)
+        if len(sent) == 1:
+            idle.append(await idle_in_transaction())
+
+    monkeypatch.setattr(send_queue, "send_now", send_now)
+    await run_campaign(driver.bot, campaign.id)
+
+    assert sorted(sent) == [10_000 + i for i in range(total)]
+    assert idle == [[]]
+
+    async with async_session() as check:
+        done = await check.get(Campaign, campaign.id)
+        deliveries = (await check.execute(select(CampaignDelivery.user_id))).scalars().all()
+    assert done.status == "done"
+    assert done.sent == total
+    assert len(deliveries) == total
+
+async def test_resumed_campaign_skips_delivered_users(session, driver, monkeypatch):
+    await make_users(session, 30)
+    campaign = await create_campaign(session, "Salom", 1, 1, 1)
+    first = (await session.execute(select(User.id).order_by(User.id).limit(10))).scalars().all()
+    session.add_all([CampaignDelivery(campaign_id=campaign.id, user_id=user_id, status="sent") for user_id in first])
+    await session.commit()
+
+    sent = []
+
+    async def send_now(method, chat_id, **kwargs):
+        sent.append(chat_id)
+
+    monkeypatch.setattr(send_queue, "send_now", send_now)
+    await run_campaign(driver.bot, campaign.id)
+
+    assert sorted(sent) == [10_000 + i for i in range(10, 30)]
+
+async def test_double_tap_creates_one_campaign(session, driver, monkeypatch):
+    session.add(User(telegram_user_id=900, first_name="Admin", is_superadmin=True))
+    await session.commit()
+
+    started = []
+    monkeypatch.setattr("bot.handlers.admin.start_campaign", lambda bot, campaign_id: started.append(campaign_id))
+
+    # Ikkinchi bosish boshqa nusxaga holat hali tozalanmasdan yetib kelgan
+    for _ in range(2):
+        await driver.state(900).update_data(broadcast_text="Yangilik")
+        await driver.callback(900, "adm_bc_send", message_id=77)
+
+    campaigns = (await session.execute(select(Campaign))).scalars().all()
+    assert len(campaigns) == 1
+    assert started == [campaigns[0].id]
+
+async def test_client_in_broadcast_state_cannot_stage_text(session, driver, make_user):
+    await make_user(901)
+    await driver.state(901).set_state(AdminState.broadcast_text)
+    await driver.message(901, "Reklama")
+    assert await driver.state(901).get_data() == {}
+    assert driver.api.texts() == []
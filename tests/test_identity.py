@@ -0,0 +1,33 @@
+# tests/test_identity.py
+import asyncio
+from db.session import engine
+from bot.handlers.common import NOT_REGISTERED_TEXT
+from bot.states import BookingState
+from services.admin import ensure_user
+from services.identity import IDENTITY_CHANNEL, identity_cache
+
+async def test_new_user_is_announced_to_other_replicas(session):
+    # Boshqa replika bu foydalanuvchini "yo'q" deb keshlagan
+    assert await identity_cache.get(session, 4201) is None
+
+    received = asyncio.Queue()
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.add_listener(IDENTITY_CHANNEL, lambda *args: received.put_nowait(args[-1]))
+        await ensure_user(session, 4201, "Mijoz")
+        payload = await asyncio.wait_for(received.get(), timeout=5)
+
+    assert payload == "4201"
+    assert (await identity_cache.get(session, 4201)).telegram_user_id == 4201
+
+async def test_unregistered_user_is_asked_to_start(driver):
+    await driver.message(4202, "📅 Mening buyurtmalarim")
+    assert driver.api.texts() == [NOT_REGISTERED_TEXT]
+
+async def test_unregistered_user_cannot_finalize_booking(driver):
+    state = driver.state(4203)
+    await state.set_state(BookingState.confirming)
+    await state.update_data(service_id=1, selected_date="2030-01-01", selected_time="10:00", phone="+998900000001")
+
+    await driver.callback(4203, "confirm_booking")
+    assert driver.api.texts() == [NOT_REGISTERED_TEXT]
@@ -0,0 +1,84 @@
+# tests/test_outbox.py
+import asyncio
+from datetime import datetime
+import pytest
+import pytz
+from sqlalchemy import select, text
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from db.models import OutboxMessage
+from db.session import async_session
+from services import outbox
+from services.send_queue import send_queue
+
+async def queue_messages(session, *texts):
+    session.add_all([outbox.message(5000 + i, t) for i, t in enumerate(texts)])
+    await session.commit()
+
+async def rows(session):
+    session.expunge_all()
+    return (await session.execute(select(OutboxMessage).order_by(OutboxMessage.id))).scalars().all()
+
+def fake_send(monkeypatch, failures):
+    """failures: matn -> xato; qolganlari yuborilgan hisoblanadi."""
+    sent = []
+
+    async def send_now(method, chat_id, **kwargs):
+        error = failures.get(kwargs["text"])
+        if error is not None:
+            raise error
+        sent.append(kwargs["text"])
+
+    monkeypatch.setattr(send_queue, "send_now", send_now)
+    return sent
+
+async def test_unexpected_error_does_not_resend_delivered_messages(session, monkeypatch):
+    await queue_messages(session, "a", "b", "c")
+    sent = fake_send(monkeypatch, {"b": asyncio.TimeoutError()})
+
+    assert await outbox.dispatch_batch(session) == 3
+    assert await outbox.dispatch_batch(session) == 0
+
+    assert sent == ["a", "c"]
+    a, b, c = await rows(session)
+    assert a.delivered_at and c.delivered_at
+    assert b.delivered_at is None and b.attempts == 1 and "TimeoutError" in b.last_error
+    assert b.next_attempt_at > datetime.now(pytz.UTC)
+
+async def test_permanent_errors_stop_retries(session, monkeypatch):
+    await queue_messages(session, "blocked")
+    blocked = TelegramForbiddenError(method=SendMessage(chat_id=5000, text="blocked"), message="bot was blocked by the user")
+    fake_send(monkeypatch, {"blocked": blocked})
+
+    await outbox.dispatch_batch(session)
+
+    (msg,) = await rows(session)
+    assert msg.delivered_at is None and msg.attempts == outbox.OUTBOX_MAX_ATTEMPTS
+
+async def test_cancellation_keeps_earlier_deliveries(session, monkeypatch):
+    await queue_messages(session, "a", "b")
+    sent = fake_send(monkeypatch, {"b": asyncio.CancelledError()})
+
+    with pytest.raises(asyncio.CancelledError):
+        await outbox.dispatch_batch(session)
+    await session.rollback()
+
+    a, b = await rows(session)
+    assert a.delivered_at is not None
+    # Ijarada qoladi - muddati tugagach boshqa nusxa qayta oladi
+    assert b.delivered_at is None and b.next_attempt_at > datetime.now(pytz.UTC)
+    assert sent == ["a"]
+
+async def test_rows_are_not_locked_while_sending(session, monkeypatch):
+    await queue_messages(session, "a")
+    locked = []
+
+    async def send_now(method, chat_id, **kwargs):
+        async with async_session() as other:
+            query = text("SELECT id FROM outbox FOR UPDATE NOWAIT")
+            locked.append(len((await other.execute(query)).all()))
+            await other.rollback()
+
+    monkeypatch.setattr(send_queue, "send_now", send_now)
+    await outbox.dispatch_batch(session)
+    assert locked == [1]
@@ -0,0 +1,125 @@
+# tests/test_query_budget.py
+from datetime import datetime, time
+import pytest
+from sqlalchemy import select
+from aiogram.methods import SendMessage
+from db.models import Appointment, User
+from db.stats import QueryBudgetExceeded, REPEATED_STATEMENT_THRESHOLD, query_budget, track_queries
+from bot.middlewares.db_session import QUERY_BUDGETS
+from core.config import settings
+from bot.states import BookingState
+from services.booking import create_booking
+from services.reminders import get_stages
+from services.schedule import get_slots
+from services.send_queue import send_queue
+from utils.time import to_utc
+
+CLIENT = 4301
+
+# Byudjet testlarida handler ichidagi tekshiruv ham yoqiq
+pytestmark = pytest.mark.usefixtures("strict_query_budgets")
+
+async def warm_caches(session, service_id, day):
+    # Byudjetlar iliq keshlar uchun: katalog, kalendar, kun snapshoti va sozlamalar
+    await get_slots(session, service_id, day)
+    await get_stages(session)
+
+async def test_slot_list_within_budget(session, shop, work_day, make_user, driver, assert_max_queries):
+    _, service = shop
+    await make_user(CLIENT)
+    await warm_caches(session, service.id, work_day)
+    state = driver.state(CLIENT)
+    await state.set_state(BookingState.selecting_date)
+    await state.update_data(service_id=service.id)
+
+    with assert_max_queries(QUERY_BUDGETS["client_booking.date_selected"]):
+        await driver.callback(CLIENT, f"date_{work_day.isoformat()}")
+    assert await state.get_state() == BookingState.selecting_time.state
+
+async def test_booking_confirmation_within_budget(session, shop, work_day, make_user, driver, assert_max_queries, monkeypatch):
+    _, service = shop
+    queued = []
+    monkeypatch.setattr(send_queue, "send_message", lambda chat_id, text, **kwargs: queued.append((chat_id, text)))
+    session.add(User(telegram_user_id=4399, first_name="Admin", admin_type="full"))
+    client = await make_user(CLIENT)
+    await warm_caches(session, service.id, work_day)
+    # Identity keshi middleware orqali to'ladi
+    await driver.callback(CLIENT, "back_main")
+    state = driver.state(CLIENT)
+    await state.set_state(BookingState.confirming)
+    await state.update_data(
+        service_id=service.id, selected_date=work_day.isoformat(), selected_time="10:00", phone="+998900000001"
+    )
+
+    before = len(driver.api.requests)
+    with assert_max_queries(QUERY_BUDGETS["client_booking.finalize_booking"]):
+        await driver.callback(CLIENT, "confirm_booking")
+    booking = (await session.execute(select(Appointment).where(Appointment.user_id == client.id))).scalar_one()
+    assert booking.starts_at == to_utc(datetime.combine(work_day, time(10)))
+    # Chek va menyu navbatga qo'yiladi - handler faqat o'z xabarini tahrirlaydi
+    assert [chat_id for chat_id, _ in queued] == [CLIENT, CLIENT]
+    assert f"#{booking.id}" in queued[0][1]
+    assert not any(isinstance(m, SendMessage) for m in driver.api.requests[before:])
+
+async def test_my_bookings_within_budget(session, shop, work_day, make_user, driver, assert_max_queries):
+    _, service = shop
+    client = await make_user(CLIENT)
+    for hour in (10, 11):
+        await create_booking(
+            session, client.id, service.id, datetime.combine(work_day, time(hour)), "+998900000001", "Mijoz"
+        )
+    await driver.callback(CLIENT, "back_main")
+
+    with assert_max_queries(QUERY_BUDGETS["client_my_bookings.my_bookings"]):
+        await driver.message(CLIENT, "📅 Mening buyurtmalarim")
+    assert sum("🔹" in text for text in driver.api.texts()) == 2
+
+async def test_handler_over_budget_fails_the_update(session, make_user, driver, monkeypatch):
+    await make_user(CLIENT)
+    monkeypatch.setitem(QUERY_BUDGETS, "client_my_bookings.my_bookings", 0)
+    with pytest.raises(QueryBudgetExceeded, match="client_my_bookings.my_bookings: 1 queries, budget 0"):
+        await driver.message(CLIENT, "📅 Mening buyurtmalarim")
+
+async def test_handler_over_budget_only_warns_when_not_strict(session, make_user, driver, monkeypatch, caplog):
+    await make_user(CLIENT)
+    monkeypatch.setitem(QUERY_BUDGETS, "client_my_bookings.my_bookings", 0)
+    # Production rejimi: javob allaqachon yuborilgan, faqat ogohlantirish
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_STRICT", False)
+    await driver.message(CLIENT, "📅 Mening buyurtmalarim")
+    assert "client_my_bookings.my_bookings: 1 queries, budget 0" in caplog.text
+
+async def test_query_budget_reports_statements(session, make_user):
+    user = await make_user(CLIENT)
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with query_budget(1):
+            for _ in range(2):
+                await session.execute(select(User.first_name).where(User.id == user.id))
+    assert "2 queries, budget 1" in str(error.value)
+    assert "2x SELECT users.first_name" in str(error.value)
+
+    with query_budget(1) as stats:
+        await session.execute(select(User.first_name).where(User.id == user.id))
+    assert stats.queries == 1
+
+async def test_repeated_statements_are_detected(session, make_user):
+    users = [await make_user(CLIENT + i) for i in range(REPEATED_STATEMENT_THRESHOLD)]
+    with track_queries(statements=True) as stats:
+        # Sikl ichida bittadan o'qish - N+1
+        for user in users:
+            await session.execute(select(User.first_name).where(User.id == user.id))
+        await session.execute(select(User.id).where(User.telegram_user_id == CLIENT))
+
+    repeated = stats.repeated()
+    assert len(repeated) == 1
+    statement, count = repeated[0]
+    assert "users.first_name" in statement and count == REPEATED_STATEMENT_THRESHOLD
+
+async def test_nested_tracking_counts_in_outer(session, make_user):
+    user = await make_user(CLIENT)
+    with track_queries(statements=True) as outer:
+        with track_queries(statements=True) as inner:
+            await session.execute(select(User.first_name).where(User.id == user.id))
+        await session.execute(select(User.id).where(User.id == user.id))
+    assert inner.queries == 1
+    assert outer.queries == 2
+    assert len(outer.statements) == 2
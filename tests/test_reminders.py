@@ -0,0 +1,63 @@
+# tests/test_reminders.py
+import asyncio
+from datetime import datetime, time, timedelta
+import pytest
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from db.session import engine
+from services import reminders
+from services.booking import confirm_booking, create_booking
+from services.invalidation import _channels
+from services.reminders import DISPATCH_JOB_ID, REMINDER_CHANNEL, wake_at
+
+@pytest.fixture
+def scheduler():
+    scheduler = AsyncIOScheduler()
+    reminders.attach(scheduler)
+    yield scheduler
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    reminders.attach(None)
+
+def wake_time(scheduler):
+    job = scheduler.get_job(DISPATCH_JOB_ID)
+    return job.next_run_time if job is not None else None
+
+async def test_wake_is_ignored_until_elected(scheduler):
+    # Yetakchi bo'lmagan nusxa: scheduler ishga tushmagan, xato ham, kutilayotgan job ham yo'q
+    soon = datetime.now(pytz.UTC) + timedelta(hours=1)
+    wake_at(soon)
+    wake_at(soon - timedelta(minutes=5))
+    assert scheduler.get_jobs() == []
+
+async def test_wake_keeps_the_earliest_time(scheduler):
+    scheduler.start(paused=True)
+    soon = datetime.now(pytz.UTC) + timedelta(hours=1)
+    wake_at(soon)
+    wake_at(soon + timedelta(minutes=30))
+    assert wake_time(scheduler) == soon
+    wake_at(soon - timedelta(minutes=30))
+    assert wake_time(scheduler) == soon - timedelta(minutes=30)
+
+async def test_confirm_notifies_the_leader(session, shop, work_day, make_user, scheduler):
+    _, service = shop
+    user = await make_user(4101)
+    booking = await create_booking(
+        session, user.id, service.id, datetime.combine(work_day, time(11)), "+998900000001", "Mijoz"
+    )
+
+    received = asyncio.Queue()
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.add_listener(REMINDER_CHANNEL, lambda *args: received.put_nowait(args[-1]))
+        confirmed = await confirm_booking(session, booking.id)
+        payload = await asyncio.wait_for(received.get(), timeout=5)
+
+    assert confirmed.next_reminder_at is not None
+    assert datetime.fromisoformat(payload) == confirmed.next_reminder_at
+
+    # Boshqa replikadagi yetakchi: tinglovchi dispatcherni shu vaqtga qo'yadi
+    scheduler.start(paused=True)
+    on_message, _ = _channels[REMINDER_CHANNEL]
+    on_message(payload)
+    assert wake_time(scheduler) == confirmed.next_reminder_at
@@ -0,0 +1,122 @@
+# tests/test_waitlist.py
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, func
+from db.models import Appointment, AppointmentStatus, SlotHold, WaitlistEntry, Service
+from bot.states import BookingState
+from services.booking import create_booking, cancel_booking, confirm_booking, place_hold
+from services.send_queue import send_queue
+from services.waitlist import add_to_waitlist, notify_waitlist
+
+WAITER = 3003
+
+async def full_day(session, shop, work_day, make_user):
+    """10:00 va 11:00 band - bitta sartaroshli kun to'la."""
+    _, service = shop
+    bookings = []
+    for i, hour in enumerate((10, 11)):
+        user = await make_user(3001 + i)
+        bookings.append(await create_booking(
+            session, user.id, service.id, datetime.combine(work_day, time(hour)), f"+99890000000{i}", user.first_name
+        ))
+    return bookings
+
+def capture_sends(monkeypatch):
+    sent = []
+    monkeypatch.setattr(send_queue, "send_message", lambda chat_id, text, **kwargs: sent.append((chat_id, text, kwargs)))
+    return sent
+
+async def test_waitlist_offer_books_held_slot_with_one_barber(session, shop, work_day, make_user, driver, monkeypatch):
+    barber, service = shop
+    first, _ = await full_day(session, shop, work_day, make_user)
+    waiter = await make_user(WAITER)
+    entry = await add_to_waitlist(session, waiter.id, service.id, work_day, time(9), time(13))
+    sent = capture_sends(monkeypatch)
+
+    # notify: bo'shagan vaqt mijozga band qilinadi va tugma yuboriladi
+    await cancel_booking(session, first.id)
+    await notify_waitlist(session, first.starts_at, first.ends_at)
+    assert [chat_id for chat_id, _, _ in sent] == [WAITER]
+    button = sent[0][2]["reply_markup"].inline_keyboard[0][0]
+    assert button.callback_data == f"wlbook_{entry.id}_10:00"
+    held = (await session.execute(select(SlotHold).where(SlotHold.holder_telegram_id == WAITER))).scalar_one()
+    assert held.starts_at == first.starts_at
+
+    # wlbook: o'zining band qilishi qayta ishlatiladi, "band qilindi" demaydi
+    await driver.callback(WAITER, button.callback_data)
+    assert await driver.state(WAITER).get_state() == BookingState.confirming.state
+    assert not any("boshqa mijoz" in t for t in driver.api.texts())
+
+    await driver.message(WAITER, contact={"phone_number": "+998900000003", "first_name": "Mijoz", "user_id": WAITER})
+    await driver.callback(WAITER, "confirm_booking")
+
+    booking = (await session.execute(select(Appointment).where(Appointment.user_id == waiter.id))).scalar_one()
+    assert (booking.starts_at, booking.barber_id) == (first.starts_at, barber.id)
+    assert await session.scalar(select(func.count()).select_from(SlotHold)) == 0
+    assert await session.scalar(select(WaitlistEntry.is_active).where(WaitlistEntry.id == entry.id)) is False
+
+    confirmed = await confirm_booking(session, booking.id)
+    assert confirmed.status == AppointmentStatus.CONFIRMED
+
+async def test_service_longer_than_gap_is_not_offered(session, shop, work_day, make_user, monkeypatch):
+    _, service = shop
+    long_service = Service(name="Soch va soqol", duration_min=90, price=80000)
+    session.add(long_service)
+    await session.commit()
+    first, _ = await full_day(session, shop, work_day, make_user)
+    waiter = await make_user(WAITER)
+    await add_to_waitlist(session, waiter.id, long_service.id, work_day, time(9), time(13))
+    sent = capture_sends(monkeypatch)
+
+    await cancel_booking(session, first.id)
+    await notify_waitlist(session, first.starts_at, first.ends_at)
+
+    assert sent == []
+    assert await session.scalar(select(func.count()).select_from(SlotHold)) == 0
+
+async def test_offer_keeps_waiters_unrelated_hold(session, shop, work_day, make_user, monkeypatch):
+    _, service = shop
+    first, _ = await full_day(session, shop, work_day, make_user)
+    waiter = await make_user(WAITER)
+    await add_to_waitlist(session, waiter.id, service.id, work_day, time(9), time(13))
+    # Mijoz boshqa kunga bron qilish jarayonida
+    in_progress = await place_hold(session, WAITER, service.id, datetime.combine(work_day + timedelta(days=7), time(10)))
+    capture_sends(monkeypatch)
+
+    await cancel_booking(session, first.id)
+    await notify_waitlist(session, first.starts_at, first.ends_at)
+
+    holds = (await session.execute(
+        select(SlotHold.starts_at).where(SlotHold.holder_telegram_id == WAITER).order_by(SlotHold.starts_at)
+    )).scalars().all()
+    assert holds == [first.starts_at, in_progress.starts_at]
+
+async def test_only_first_waiter_is_notified_for_a_single_slot(session, shop, work_day, make_user, monkeypatch):
+    _, service = shop
+    first, _ = await full_day(session, shop, work_day, make_user)
+    for telegram_id in (WAITER, WAITER + 1):
+        user = await make_user(telegram_id)
+        await add_to_waitlist(session, user.id, service.id, work_day, time(9), time(13))
+    sent = capture_sends(monkeypatch)
+
+    await cancel_booking(session, first.id)
+    await notify_waitlist(session, first.starts_at, first.ends_at)
+
+    # Ikkinchisi band qila olmaydigan vaqt haqida xabar olmaydi
+    assert [chat_id for chat_id, _, _ in sent] == [WAITER]
+
+async def test_offer_starts_on_the_slot_grid(session, shop, work_day, make_user, monkeypatch):
+    _, service = shop
+    user = await make_user(3001)
+    first = await create_booking(
+        session, user.id, service.id, datetime.combine(work_day, time(10)), "+998900000000", user.first_name
+    )
+    waiter = await make_user(WAITER)
+    # Oyna 10:15 dan: bo'shagan 10:00 sig'maydi, 10:15 jadvaldagi slot emas, 11:00 esa avval ham bo'sh edi
+    await add_to_waitlist(session, waiter.id, service.id, work_day, time(10, 15), time(13))
+    sent = capture_sends(monkeypatch)
+
+    await cancel_booking(session, first.id)
+    await notify_waitlist(session, first.starts_at, first.ends_at)
+
+    assert sent == []
+    assert await session.scalar(select(func.count()).select_from(SlotHold)) == 0
@@ -1,4 +1,3 @@
-
 # utils/time.py
 from datetime import datetime, time, date, timedelta
 import pytz